@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+"""Offline analyzer of RDT3.0 packet traces
+
+Reads the binary trace files written after rdt_trace_init() - for instance
+the client's and the server's of one transfer, which are merged by time - and
+reports, for every peer of every traced process:
+  * packets sent, lost, corrupted and blocked in udt_send, and received
+  * round-trip times of DATA packets from their ACKs (Karn's rule: a
+    retransmitted packet gives no sample)
+  * the retransmission timeline
+  * idle gaps - stretches longer than --gap without any packet sent or received
+and can export the time-sequence plot (DATA sent and ACKs received against
+time) as CSV or, if matplotlib is installed, as an image.
+
+Usage:  python3 analyze-trace.py  TRACE [TRACE ...]  [--gap 0.05]  [--peer PORT]
+            [--tseq FILE.csv]  [--plot FILE.png]  [--json FILE]  [--timeline 20]
+"""
+
+import sys
+import csv
+import json
+import argparse
+import statistics
+
+import rdt3 as rdt
+
+EVENT_NAMES = {rdt.TRACE_SENT: 'sent', rdt.TRACE_LOST: 'lost', rdt.TRACE_CORRUPTED: 'corrupted',
+               rdt.TRACE_BLOCKED: 'blocked', rdt.TRACE_RECEIVED: 'received'}
+
+
+def read_trace(path):
+    """Read every record of a trace file.
+
+    Return  -> list of tuples in TRACE_FORMAT field order, with the name of
+    the file appended; exits if it is not a trace file
+    """
+    record = rdt._TRACE_RECORD
+    with open(path, 'rb') as fobj:
+        data = fobj.read()
+    if not data.startswith(rdt.TRACE_MAGIC):
+        print("%s is not an RDT trace file" % path)
+        sys.exit(1)
+    body = memoryview(data)[len(rdt.TRACE_MAGIC):]
+    usable = len(body) - len(body) % record.size  # A record cut short by a crash is skipped
+    return [fields + (path,) for fields in record.iter_unpack(body[:usable])]
+
+
+class PeerTrace:
+    """The packets one traced process exchanged with one peer port, in time order."""
+
+    def __init__(self, source, port):
+        self.source = source
+        self.port = port
+        self.records = []
+
+    def seq_modulo(self):
+        """Guess the sequence number space: 2 ** 32 for version 2 headers,
+        2 if only sequence numbers 0 and 1 were sent (stop-and-wait), otherwise 256."""
+        data = [rec for rec in self.records if rec[1] == rdt.TRACE_OUT and rec[4] == rdt.TYPE_DATA]
+        if any(rec[3] == rdt.VERSION_2 for rec in data):
+            return rdt.SEQ_SPACE_V2
+        return 2 if all(rec[6] < 2 for rec in data) else rdt.SEQ_SPACE
+
+    def analyze(self, timeline_limit):
+        """Count the events, take RTT samples and find the retransmissions.
+
+        Return  -> (report dictionary, time-sequence rows [time, seq, kind])
+        """
+        modulo = self.seq_modulo()
+        counts = {name: 0 for name in EVENT_NAMES.values()}
+        counts['received_corrupt'] = 0
+        top = None  # Highest (unwrapped) DATA sequence number sent so far
+        sends = {}  # {unwrapped seq: [first send time, last send time, sends]}
+        sampled = set()
+        rtts = []
+        retransmissions = []
+        tseq = []
+        for rec in self.records:
+            now, direction, event, _, msg_type, intact, seq_num = rec[:7]
+            name = EVENT_NAMES.get(event, 'unknown')
+            counts[name] = counts.get(name, 0) + 1
+            if direction == rdt.TRACE_IN and not intact:
+                counts['received_corrupt'] += 1
+                continue
+            if direction == rdt.TRACE_OUT and msg_type == rdt.TYPE_DATA:
+                # New data moves forward, a retransmission repeats a number at or below the top
+                if top is None:
+                    seq = seq_num
+                else:
+                    behind = (top - seq_num) % modulo
+                    seq = top - behind if behind < modulo // 2 else top + (seq_num - top) % modulo
+                if seq in sends:
+                    entry = sends[seq]
+                    entry[1] = now
+                    entry[2] += 1
+                    retransmissions.append({'time': now, 'seq': seq, 'attempt': entry[2],
+                                            'since_first': now - entry[0]})
+                    tseq.append([now, seq, 'retransmission'])
+                else:
+                    sends[seq] = [now, now, 1]
+                    tseq.append([now, seq, 'data'])
+                top = seq if top is None else max(top, seq)
+            elif direction == rdt.TRACE_IN and msg_type == rdt.TYPE_ACK and top is not None:
+                seq = top - (top - seq_num) % modulo
+                tseq.append([now, seq, 'ack'])
+                entry = sends.get(seq)
+                if entry is not None and seq not in sampled:
+                    sampled.add(seq)
+                    if entry[2] == 1:
+                        rtts.append(now - entry[1])
+
+        report = {'source': self.source, 'peer_port': self.port, 'seq_modulo': modulo, 'counts': counts,
+                  'data_packets': len(sends), 'retransmissions': len(retransmissions),
+                  'rtt': rtt_summary(rtts), 'retransmission_timeline': retransmissions[:timeline_limit]}
+        return report, tseq
+
+
+def rtt_summary(samples):
+    """Return count, min, mean, median, 95th percentile and max of RTT samples (seconds)."""
+    if not samples:
+        return {'samples': 0}
+    ordered = sorted(samples)
+    return {'samples': len(ordered), 'min': ordered[0], 'mean': statistics.mean(ordered),
+            'median': statistics.median(ordered), 'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            'max': ordered[-1]}
+
+
+def idle_gaps(records, threshold):
+    """Find the stretches longer than [threshold] seconds without any packet.
+
+    Return  -> list of {'start', 'duration'} in time order
+    """
+    gaps = []
+    for before, after in zip(records, records[1:]):
+        if after[0] - before[0] > threshold:
+            gaps.append({'start': before[0], 'duration': after[0] - before[0]})
+    return gaps
+
+
+def plot_tseq(rows, path):
+    """Draw the time-sequence plot with matplotlib, if it is installed."""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("Plot error: matplotlib is not installed - use --tseq to export the plot as CSV")
+        return
+    fig, axes = plt.subplots(figsize=(10, 6))
+    for kind, marker, colour in (('data', '.', 'tab:blue'), ('retransmission', 'x', 'tab:red'),
+                                 ('ack', '+', 'tab:green')):
+        points = [row for row in rows if row[3] == kind]
+        axes.scatter([row[0] for row in points], [row[2] for row in points], marker=marker, s=12,
+                     color=colour, label=kind)
+    axes.set_xlabel("time (s)")
+    axes.set_ylabel("sequence number (unwrapped)")
+    axes.legend()
+    fig.savefig(path)
+    print("Time-sequence plot written to", path)
+
+
+def print_report(report, start):
+    counts = report['counts']
+    print("\n%s -> peer port %d (sequence space %d)" % (report['source'], report['peer_port'], report['seq_modulo']))
+    print("  sent %d, lost %d, corrupted %d, blocked %d | received %d (%d corrupt)" % (
+        counts['sent'], counts['lost'], counts['corrupted'], counts['blocked'], counts['received'],
+        counts['received_corrupt']))
+    print("  DATA packets %d, retransmissions %d" % (report['data_packets'], report['retransmissions']))
+    rtt = report['rtt']
+    if rtt['samples']:
+        print("  RTT: %d samples  min %.2f  mean %.2f  median %.2f  p95 %.2f  max %.2f ms" % (
+            rtt['samples'], 1000 * rtt['min'], 1000 * rtt['mean'], 1000 * rtt['median'], 1000 * rtt['p95'],
+            1000 * rtt['max']))
+    else:
+        print("  RTT: no samples")
+    if report['retransmission_timeline']:
+        print("  %10s %10s %8s %12s" % ("time (s)", "seq", "attempt", "since first"))
+        for entry in report['retransmission_timeline']:
+            print("  %10.4f %10d %8d %10.1f ms" % (entry['time'] - start, entry['seq'], entry['attempt'],
+                                                 1000 * entry['since_first']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzer of RDT3.0 packet traces")
+    parser.add_argument('traces', nargs='+', help="trace files written after rdt_trace_init()")
+    parser.add_argument('--gap', type=float, default=0.05, help="report idle gaps longer than this (seconds)")
+    parser.add_argument('--peer', type=int, help="only analyze the packets exchanged with this peer port")
+    parser.add_argument('--timeline', type=int, default=20, help="retransmissions listed per peer")
+    parser.add_argument('--tseq', help="write the time-sequence plot data to this CSV file")
+    parser.add_argument('--plot', help="draw the time-sequence plot into this image file (needs matplotlib)")
+    parser.add_argument('--json', help="write the full report to this JSON file")
+    args = parser.parse_args()
+
+    records = sorted((rec for path in args.traces for rec in read_trace(path)), key=lambda rec: rec[0])
+    if args.peer is not None:
+        records = [rec for rec in records if rec[8] == args.peer]
+    if not records:
+        print("No packets in the trace")
+        return
+    start = records[0][0]
+
+    peers = {}
+    for rec in records:
+        key = (rec[9], rec[8])
+        if key not in peers:
+            peers[key] = PeerTrace(*key)
+        peers[key].records.append(rec)
+
+    reports = []
+    rows = []
+    print("%d packets over %.3f s" % (len(records), records[-1][0] - start))
+    for key in sorted(peers):
+        report, tseq = peers[key].analyze(args.timeline)
+        reports.append(report)
+        print_report(report, start)
+        rows.extend([now - start, key[1], seq, kind] for now, seq, kind in tseq)
+
+    # Idle gaps of each traced process, whichever peer it was talking to
+    gaps = {}
+    for source in sorted({rec[9] for rec in records}):
+        own = [rec for rec in records if rec[9] == source]
+        gaps[source] = idle_gaps(own, args.gap)
+        total = sum(gap['duration'] for gap in gaps[source])
+        print("\n%s: %d idle gaps over %g s, %.3f s in total" % (source, len(gaps[source]), args.gap, total))
+        for gap in sorted(gaps[source], key=lambda gap: -gap['duration'])[:args.timeline]:
+            print("  at %10.4f s  idle %8.1f ms" % (gap['start'] - start, 1000 * gap['duration']))
+
+    if args.tseq:
+        rows.sort()
+        with open(args.tseq, 'w', newline='') as fobj:
+            writer = csv.writer(fobj)
+            writer.writerow(['time', 'peer_port', 'seq', 'kind'])
+            writer.writerows(rows)
+    if args.plot:
+        plot_tseq(sorted(rows), args.plot)
+    if args.json:
+        with open(args.json, 'w') as fobj:
+            json.dump({'start': start, 'peers': reports, 'idle_gaps': gaps}, fobj, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/python3
+"""Throughput benchmark of the RDT3.0 layer
+
+Runs headless file transfers between a server and a client process on
+localhost over a matrix of drop rate, error rate, header version, payload size,
+file size, window size, mode and congestion control,
+repeating every point with a different (but fixed) seed. Results are written
+as JSON and/or CSV, and can be compared against a stored baseline so that a
+drop in goodput is caught.
+
+Usage:  python3 benchmark-throughput.py  [--drop 0,0.1] [--error 0,0.1]
+            [--version 1] [--payload 1000] [--size 100000] [--window 1] [--mode SR] [--congestion reno]
+            [--repeat 3] [--seed 1] [--json FILE] [--csv FILE]
+            [--baseline FILE] [--save-baseline FILE] [--tolerance 0.25]
+
+Exits with status 1 if any transfer fails or any point is slower than the
+baseline by more than the tolerance. A baseline stores the settings of each
+point, which are matched axis by axis; a baseline file of an older layout is
+refused rather than matching nothing.
+"""
+
+import sys
+import os
+import csv
+import json
+import time
+import random
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+CSV_FIELDS = ['drop', 'error', 'version', 'payload', 'size', 'window', 'mode', 'congestion', 'repeat', 'seed', 'ok',
+              'goodput', 'elapsed', 'wall_time', 'data_sent', 'retransmissions', 'timeouts',
+              'corrupt_drops', 'stale_acks']
+AXES = ('drop', 'error', 'version', 'payload', 'size', 'window', 'mode', 'congestion')  # Matrix axes of a point
+BASELINE_FORMAT = 2  # Layout of the baseline file - files of any other layout are refused
+
+
+def free_port():
+    """Return a UDP port number that is currently free on localhost."""
+    sockd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sockd.bind(('localhost', 0))
+    port = sockd.getsockname()[1]
+    sockd.close()
+    return port
+
+
+def setup_rdt(args, seed):
+    """Configure the RDT layer of a worker process and return the module."""
+    import rdt3 as rdt
+    rdt.rdt_network_init(args.drop, args.error, seed)
+    if rdt.rdt_packet_init(args.version, args.payload) == -1 or rdt.rdt_window_init(args.window, args.mode) == -1 \
+            or rdt.rdt_congestion_init(args.congestion) == -1:
+        sys.exit(1)
+    return rdt
+
+
+def open_socket(rdt, port, peer_port):
+    """Create, bind and point an RDT socket at the peer, or exit."""
+    sockfd = rdt.rdt_socket()
+    if sockfd is None or rdt.rdt_bind(sockfd, port) == -1 or rdt.rdt_peer('localhost', peer_port) == -1:
+        sys.exit(1)
+    return sockfd
+
+
+def run_server(args):
+    """Worker: receive one file into [args.dir] and report on stdout."""
+    rdt = setup_rdt(args, args.seed + 1)
+    sockfd = open_socket(rdt, args.port, args.peer_port)
+    print("READY", flush=True)
+    path = rdt.rdt_recvfile(sockfd, args.dir)
+    rdt.rdt_close(sockfd)
+    print("RESULT " + json.dumps({'path': path}), flush=True)
+
+
+def run_client(args):
+    """Worker: send [args.file] and report timing and statistics on stdout."""
+    rdt = setup_rdt(args, args.seed)
+    sockfd = open_socket(rdt, args.port, args.peer_port)
+    starttime = time.monotonic()
+    sent = rdt.rdt_sendfile(sockfd, args.file)
+    elapsed = time.monotonic() - starttime
+    stats = rdt.rdt_stats(sockfd)
+    rdt.rdt_close(sockfd)
+    print("RESULT " + json.dumps({'sent': sent, 'elapsed': elapsed, 'stats': stats}), flush=True)
+
+
+def read_result(proc, timeout):
+    """Wait for a worker and return the dictionary it reported, None if it failed."""
+    try:
+        out, _ = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        return None
+    for line in out.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[7:])
+    return None
+
+
+def run_trial(point, repeat, seed, workdir, timeout):
+    """Transfer one file with the settings of [point] and return the measurements."""
+    size = point['size']
+    src = os.path.join(workdir, 'src-%d.bin' % size)
+    if not os.path.exists(src):
+        # Same content for every run with the same seed
+        with open(src, 'wb') as fobj:
+            fobj.write(random.Random(size).randbytes(size))
+    store = tempfile.mkdtemp(dir=workdir)
+
+    cport, sport = free_port(), free_port()
+    common = [sys.executable, os.path.abspath(__file__),
+              '--drop', str(point['drop']), '--error', str(point['error']),
+              '--version', str(point['version']), '--payload', str(point['payload']), '--window', str(point['window']),
+              '--mode', point['mode'], '--congestion', point['congestion'], '--seed', str(seed)]
+    wall_start = time.monotonic()
+    server = subprocess.Popen(common + ['--role', 'server', '--port', str(sport), '--peer-port', str(cport),
+                                        '--dir', store],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    # Start the client only when the server is listening
+    while server.poll() is None and server.stdout.readline().strip() != "READY":
+        pass
+    client = subprocess.Popen(common + ['--role', 'client', '--port', str(cport), '--peer-port', str(sport),
+                                        '--file', src],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    sent = read_result(client, timeout)
+    stored = read_result(server, timeout)
+    wall_time = time.monotonic() - wall_start
+
+    row = dict(point, repeat=repeat, seed=seed, wall_time=wall_time, ok=False)
+    if sent is None or stored is None or sent['sent'] != size or stored['path'] is None:
+        return row
+    with open(src, 'rb') as fa, open(stored['path'], 'rb') as fb:
+        row['ok'] = fa.read() == fb.read()
+    os.remove(stored['path'])
+    stats = sent['stats']
+    row.update(goodput=size / sent['elapsed'] if sent['elapsed'] > 0 else 0.0, elapsed=sent['elapsed'],
+               **{name: stats[name] for name in ('data_sent', 'retransmissions', 'timeouts',
+                                                 'corrupt_drops', 'stale_acks')})
+    return row
+
+
+def point_key(point):
+    return "drop=%g error=%g v%d payload=%d size=%d window=%d mode=%s cc=%s" % (
+        point['drop'], point['error'], point['version'], point['payload'], point['size'], point['window'],
+        point['mode'], point['congestion'])
+
+
+def point_axes(point):
+    """Return the settings of [point] along every axis, for matching against a baseline."""
+    return tuple(point[axis] for axis in AXES)
+
+
+def summarise(rows):
+    """Group the trials by matrix point and average them."""
+    points = {}
+    for row in rows:
+        points.setdefault(point_key(row), []).append(row)
+    summary = {}
+    for key, trials in points.items():
+        good = [row for row in trials if row['ok']]
+        goodputs = [row['goodput'] for row in good]
+        summary[key] = {
+            'point': {axis: trials[0][axis] for axis in AXES},
+            'runs': len(trials),
+            'failures': len(trials) - len(good),
+            'goodput_mean': statistics.mean(goodputs) if goodputs else 0.0,
+            'goodput_min': min(goodputs, default=0.0),
+            'goodput_max': max(goodputs, default=0.0),
+            'retransmissions_mean': statistics.mean(row['retransmissions'] for row in good) if good else 0.0,
+            'wall_time_mean': statistics.mean(row['wall_time'] for row in trials),
+        }
+    return summary
+
+
+def load_baseline(path):
+    """Read a baseline stored with --save-baseline.
+
+    Return  -> its summary, None if the file has another layout (a stale
+    baseline, whose points would silently match nothing)
+    """
+    with open(path) as fobj:
+        baseline = json.load(fobj)
+    if not isinstance(baseline, dict) or baseline.get('format') != BASELINE_FORMAT:
+        return None
+    return baseline['summary']
+
+
+def compare(summary, baseline, tolerance):
+    """Print the change of every point against the baseline.
+
+    Points are matched by their settings along every axis; a point the
+    baseline does not have is shown as new.
+    Return  -> number of points slower than the baseline by more than the tolerance
+    """
+    before_points = {point_axes(entry['point']): entry for entry in baseline.values()}
+    regressions = 0
+    print("\n%-76s %12s %12s %8s" % ("point", "baseline B/s", "now B/s", "change"))
+    for key, now in summary.items():
+        before = before_points.get(point_axes(now['point']))
+        if before is None or before['goodput_mean'] == 0:
+            print("%-76s %12s %12.0f %8s" % (key, "-", now['goodput_mean'], "new"))
+            continue
+        change = now['goodput_mean'] / before['goodput_mean'] - 1
+        flag = ""
+        if change < -tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print("%-76s %12.0f %12.0f %+7.1f%%%s" % (key, before['goodput_mean'], now['goodput_mean'],
+                                                  100 * change, flag))
+    return regressions
+
+
+def parse_list(text, kind):
+    return [kind(item) for item in text.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark of the RDT3.0 layer")
+    parser.add_argument('--drop', default='0,0.1', help="comma-separated drop rates")
+    parser.add_argument('--error', default='0,0.1', help="comma-separated error rates")
+    parser.add_argument('--version', default='1', help="comma-separated header versions (1, 2)")
+    parser.add_argument('--payload', default='1000', help="comma-separated payload sizes (bytes)")
+    parser.add_argument('--size', default='100000', help="comma-separated file sizes (bytes)")
+    parser.add_argument('--window', default='1', help="comma-separated window sizes")
+    parser.add_argument('--mode', default='SR', help="comma-separated modes (GBN, SR)")
+    parser.add_argument('--congestion', default='reno', help="comma-separated congestion controls (reno, cubic, none)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per matrix point")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the first run")
+    parser.add_argument('--timeout', type=float, default=300, help="max seconds per transfer")
+    parser.add_argument('--json', help="write all runs and the summary to this JSON file")
+    parser.add_argument('--csv', help="write all runs to this CSV file")
+    parser.add_argument('--baseline', help="compare against this summary JSON file")
+    parser.add_argument('--save-baseline', help="store the summary as a baseline in this file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed goodput drop (fraction)")
+    # Worker process arguments
+    parser.add_argument('--role', choices=('server', 'client'), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--peer-port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role:
+        args.drop, args.error = float(args.drop), float(args.error)
+        args.version, args.payload, args.window = int(args.version), int(args.payload), int(args.window)
+        run_server(args) if args.role == 'server' else run_client(args)
+        return
+
+    points = [{'drop': drop, 'error': error, 'version': version, 'payload': payload, 'size': size,
+               'window': window, 'mode': mode, 'congestion': congestion}
+              for drop in parse_list(args.drop, float) for error in parse_list(args.error, float)
+              for version in parse_list(args.version, int)
+              for payload in parse_list(args.payload, int) for size in parse_list(args.size, int)
+              for window in parse_list(args.window, int) for mode in parse_list(args.mode, str)
+              for congestion in parse_list(args.congestion, str)]
+
+    rows = []
+    print("%-76s %3s %10s %8s %8s %6s" % ("point", "run", "goodput", "elapsed", "wall", "retx"))
+    with tempfile.TemporaryDirectory() as workdir:
+        for point in points:
+            for repeat in range(args.repeat):
+                row = run_trial(point, repeat, args.seed + 2 * repeat, workdir, args.timeout)
+                rows.append(row)
+                if row['ok']:
+                    print("%-76s %3d %10.0f %8.3f %8.3f %6d" % (point_key(point), repeat, row['goodput'],
+                                                               row['elapsed'], row['wall_time'],
+                                                               row['retransmissions']))
+                else:
+                    print("%-76s %3d     FAILED" % (point_key(point), repeat))
+    summary = summarise(rows)
+
+    if args.json:
+        with open(args.json, 'w') as fobj:
+            json.dump({'runs': rows, 'summary': summary}, fobj, indent=1)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as fobj:
+            writer = csv.DictWriter(fobj, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as fobj:
+            json.dump({'format': BASELINE_FORMAT, 'summary': summary}, fobj, indent=1)
+
+    failed = sum(1 for row in rows if not row['ok'])
+    regressions = 0
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print("\n%s is not a baseline of this benchmark's format %d - store a new one with --save-baseline"
+                  % (args.baseline, BASELINE_FORMAT))
+            sys.exit(1)
+        regressions = compare(summary, baseline, args.tolerance)
+    if failed or regressions:
+        print("\n%d failed transfer(s), %d regression(s)" % (failed, regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,37 @@
 #!/usr/bin/python3
 """Implementation of RDT3.0
 
-functions: rdt_network_init(), rdt_socket(), rdt_bind(), rdt_peer()
-           rdt_send(), rdt_recv(), rdt_close()
+functions: rdt_network_init(), rdt_window_init(), rdt_congestion_init()
+           rdt_packet_init(), rdt_buffer_init(), rdt_compress_init(), rdt_log_init(), rdt_stats_init()
+           rdt_trace_init(), rdt_clock_init(), rdt_pacing_init()
+           rdt_socket(), rdt_bind(), rdt_peer(), rdt_probe()
+           rdt_send(), rdt_recv(), rdt_sendmsg(), rdt_recvmsg(), rdt_sendfile(), rdt_recvfile()
+           rdt_close(), rdt_rtt(), rdt_stats(), show_progress()
+classes:   RdtListener  - demultiplexes one UDP socket into per-peer connections
+           RdtSocket    - one RDT connection with its own sequence state and buffers
+           RttEstimator - adaptive retransmission timeout of a connection
+           RenoControl, CubicControl - congestion window of a connection
+           RdtStats     - counters, RTT histogram and goodput of a connection
+           ReorderBuffer - received payloads of a connection, by sequence number, within a byte budget
+
+Transmission modes: stop-and-wait (window size 1, the alternating-bit protocol),
+Go-Back-N and Selective Repeat (window size > 1), selected by rdt_window_init().
+Packets use the original 6-byte header or the extended 10-byte one (32-bit
+sequence numbers, network byte order), selected by rdt_packet_init() along
+with the payload size; rdt_probe() finds the largest payload the path carries.
+rdt_send() carries one packet; rdt_sendmsg() and rdt_recvmsg() carry messages
+of any size, fragmented into pipelined packets and reassembled whole.
+rdt_sendfile() and rdt_recvfile() resume an interrupted transfer from the
+receiver's last checkpoint and compress files chosen by rdt_compress_init().
+rdt_close() ends a conversation with a FIN / FIN-ACK exchange in each direction.
+Receivers advertise in their version 2 ACKs how much more data they can take,
+and senders keep within it; pipelined senders pace their packets over the
+round trip instead of sending a window in one burst (rdt_pacing_init()).
+The rdt_*() functions drive a single default connection to the peer set by rdt_peer().
+Protocol events are logged to the 'rdt3' logger, silent unless rdt_log_init() is called;
+rdt_trace_init() records every packet in a binary trace for analyze-trace.py.
+rdt_clock_init() puts the timers on another clock, such as the virtual clock
+of rdt3_channel, which runs simulated transfers faster than real time.
 
 Student name: ZHOU Jingran
 Student No. : 3035232468
@@ -11,91 +40,330 @@ Development platform: Developed on macOS High Sierra (Version 10.13.3); Tested o
 Python version: Python 3.6.3
 """
 
+import atexit
 import socket
 import random
 import struct
 import select
+import selectors
+import time
+import bisect
+import json
+import logging
+import os
+import sys
+import errno
+import mmap
+import hashlib
+import zlib
+import lzma
+from collections import deque
 
 # some constants
-PAYLOAD = 1000  # size of data payload of the RDT layer
+PAYLOAD = 1000  # default size of data payload of the RDT layer (per connection, see connect())
 CPORT = 100  # Client port number - Change to your port number
 SPORT = 200  # Server port number - Change to your port number
-TIMEOUT = 0.05  # retransmission timeout duration
-TWAIT = 10 * TIMEOUT  # TimeWait duration
+TIMEOUT = 0.05  # initial retransmission timeout duration, before any RTT is measured
+MIN_RTO = 0.01  # lower bound of the adaptive retransmission timeout
+MAX_RTO = 3.0  # upper bound of the adaptive retransmission timeout (after backoff)
+MAX_BACKOFF = 3  # the timeout doubles at most this many times in a row
+TWAIT_RTO = 10  # TimeWait lasts this many retransmission timeouts
+TWAIT = TWAIT_RTO * TIMEOUT  # Minimum TimeWait duration
 TYPE_DATA = 12  # 12 means data
 TYPE_ACK = 11  # 11 means ACK
-MSG_FORMAT = 'B?HH'  # Format string for header structure
+TYPE_PROBE = 13  # Path probe, padded to the payload size under test (version 2 only)
+TYPE_PROBE_ACK = 14  # Answer to a probe, carrying the payload size received (version 2 only)
+TYPE_FIN = 15  # The sender has no more DATA; its sequence number is the next one it would have used
+TYPE_FIN_ACK = 16  # Answer to a FIN, echoing its sequence number
+VERSION_1 = 1  # Original header: 1-byte sequence number
+VERSION_2 = 2  # Extended header: 32-bit sequence number, all fields in network byte order
+MSG_FORMAT = '<BBHH'  # Format string for header structure - little-endian checksum field
 HEADER_SIZE = 6  # 6 bytes
+MSG_FORMAT_V2 = '!BBHIH'  # Version 2 header structure
+HEADER_SIZE_V2 = 10  # 10 bytes
+SEQ_SPACE = 256  # Size of the sequence number space (1-byte field)
+SEQ_SPACE_V2 = 2 ** 32  # Size of the sequence number space of version 2 (4-byte field)
+MAX_DATAGRAM = 65507  # Largest UDP payload over IPv4
+MAX_PAYLOAD = MAX_DATAGRAM - HEADER_SIZE_V2  # Largest RDT payload of either header version
+MIN_PAYLOAD = 512  # Smallest payload a path probe settles for
+FLAG_ACK = 0x01  # Version 2 DATA flag: the payload starts with a piggybacked ACK
+FLAG_WINDOW = 0x02  # Version 2 flag: the sender reads advertised windows, and its ACK (or piggybacked ACK) starts with one
+DELAYED_ACK = 0.005  # Max time an ACK waits for outgoing DATA to ride on (version 2 only, 0 = never)
+PROBE_RESOLUTION = 16  # A path probe stops when the largest payload is known to within this many bytes
+PROBE_TRIES = 2  # Probes of each size before it is taken as too large
+FIN_TRIES = 4  # FINs sent before the peer is taken as one that does not answer them
+FIN_LINGER_RTO = 3  # After the last FIN-ACK, close() listens this many retransmission timeouts for a repeated FIN
+REFUSE_QUIET = 2 * MAX_RTO  # A dropped peer is refused until it has been quiet this long (seconds)
+GO_BACK_N = 'GBN'  # Pipelined mode: cumulative ACK, resend whole window on timeout
+SELECTIVE_REPEAT = 'SR'  # Pipelined mode: individual ACK, resend only the timed-out packet
+DUPACK_THRESHOLD = 3  # Duplicate ACKs that trigger a fast retransmit (pipelined modes)
+INITIAL_CWND = 4  # Congestion window at the start, in packets
+SLOW_START = 'slow start'  # Congestion control phases
+CONGESTION_AVOIDANCE = 'congestion avoidance'
+FAST_RECOVERY = 'fast recovery'
+GOODPUT_INTERVAL = 1.0  # Goodput is reported per interval of this many seconds
+PACING_GAIN = 1.25  # The pacer spreads a window of packets over 1 / PACING_GAIN round trips
+PACING_GAIN_SLOW_START = 2.0  # ... while congestion control is in slow start
+PACING_BURST = 4  # Packets the pacer lets go back to back
+RCVBUF_OVERHEAD = 2  # The kernel charges a datagram about twice its size against SO_RCVBUF
+DRAIN_LIMIT = 64  # Max datagrams read per wakeup before timers are serviced
+SOCK_BUFFER = 4 * 1024 * 1024  # Default SO_RCVBUF and SO_SNDBUF request (the system may cap it)
+RECV_BUDGET = 16 * 1024 * 1024  # Default max payload bytes a connection holds for the application
+RESUME_BLOCK = 1024 * 1024  # recvfile() checks the stored prefix of a resumed file in blocks of this size
+CHECKPOINT_BYTES = 8 * RESUME_BLOCK  # recvfile() records its progress every time this much more has arrived
+CHECKPOINT_SUFFIX = '.part'  # The progress record of <file> is kept as <file>.part until it is complete
+DIGEST_SIZE = 32  # Size of a block digest (SHA-256)
+CHUNK_RAW = 0  # First byte of a file chunk sent as is
+CHUNK_COMPRESSED = 1  # First byte of a file chunk compressed with the negotiated codec
+MAX_RATIO = 32  # A compressed chunk holds at most this many payloads of file data
+MAX_SKIP = 64  # After chunks that did not shrink, at most this many are sent raw before compressing again
+MESSAGE_MARK = b'M'  # First byte of a message sent by sendmsg()
+MESSAGE_FORMAT = '!cQ'  # Message header, in front of its first fragment: mark and message length
+TRACE_MAGIC = b'RDTTRC\x00\x01'  # First bytes of a packet trace file
+TRACE_FORMAT = '<dBBBBBIHH'  # Trace record: time, direction, event, header version, type, checksum verdict,
+#                              seq num, payload length, peer port
+TRACE_OUT = 0  # Trace directions
+TRACE_IN = 1
+TRACE_SENT = 0  # Trace events - handed to the socket intact
+TRACE_LOST = 1  # dropped by the simulated loss of udt_send
+TRACE_CORRUPTED = 2  # damaged by the simulated corruption of udt_send, then handed to the socket
+TRACE_BLOCKED = 3  # dropped because the socket send buffer was full
+TRACE_RECEIVED = 4  # read from the socket
+
+# Steps the protocol procedures of RdtSocket yield to the loop that runs them (see RdtSocket._run())
+_STEP_SEND = 0  # (_STEP_SEND, message) -> what send() returns
+_STEP_RECV = 1  # (_STEP_RECV,) -> what recv() returns
+_STEP_WAIT = 2  # (_STEP_WAIT, max waiting time or None) -> True if a packet for the connection arrived
+_STEP_CALL = 3  # (_STEP_CALL, function, arguments) -> what the function returns (awaited by rdt3_async)
+
+# Precompiled header layouts
+_HEADER = struct.Struct(MSG_FORMAT)
+_TRACE_RECORD = struct.Struct(TRACE_FORMAT)
+_HEADER_V2 = struct.Struct(MSG_FORMAT_V2)
+_MESSAGE_HEADER = struct.Struct(MESSAGE_FORMAT)
+_CHKSUM_FIELD = struct.Struct('<H')
+_CHKSUM_OFFSET = 2  # Checksum follows type and seq num (version 2: type and flags)
+
+# Linux values of the socket options Python does not export
+_IP_MTU_DISCOVER = 10 if sys.platform.startswith('linux') else None
+_IP_PMTUDISC_DO = 2
 
 # store peer address info
-__peeraddr = ()  # set by rdt_peer()
+_peeraddr = ()  # set by rdt_peer()
 
 # define the error rates
-__LOSS_RATE = 0.0  # set by rdt_network_init()
-__ERR_RATE = 0.0
+_LOSS_RATE = 0.0  # set by rdt_network_init()
+_ERR_RATE = 0.0
 
-# Data buffer
-__data_buffer = []
+# Window configuration for new connections - set by rdt_window_init()
+_window_size = 1  # 1 means stop-and-wait (alternating-bit)
+_arq_mode = SELECTIVE_REPEAT
+_cc_algorithm = 'reno'  # Congestion control of pipelined connections - set by rdt_congestion_init()
+_header_version = VERSION_1  # Header of the connections we open - set by rdt_packet_init()
+_rcvbuf = SOCK_BUFFER  # Socket buffer sizes of listeners - set by rdt_buffer_init()
+_sndbuf = SOCK_BUFFER
+_recv_budget = RECV_BUDGET  # Receive buffer budget of new connections - set by rdt_buffer_init()
+_codecs = ()  # Compression codecs sendfile() offers and recvfile() accepts - set by rdt_compress_init()
 
-# Packet sequence number
-__send_seq_num = 0
-__recv_seq_num = 0
+# Connection used by the rdt_*() functions
+_default_conn = None
 
-# Last ACK number
-__last_ack_no = None
+# Random source of the simulated packet loss and corruption - seeded by rdt_network_init()
+_rng = random.Random()
+
+# Clock of the protocol's timers, statistics and traces - set by rdt_clock_init()
+_clock = time.monotonic
+
+# Pipelined senders pace their packets over the round trip - set by rdt_pacing_init()
+_pacing = True
+
+# Statistics of each connection are appended to this file on close - set by rdt_stats_init()
+_stats_path = None
+
+# Packet trace recorder - set by rdt_trace_init(), None when tracing is off
+_tracer = None
+
+# Protocol event log - per-packet events at DEBUG, timeouts and connections at INFO
+_log = logging.getLogger('rdt3')
+_log.addHandler(logging.NullHandler())
 
 
 # internal functions - being called within the module
-def __udt_send(sockd, peer_addr, byte_msg):
+def _udt_send(sockd, peer_addr, byte_msg):
     """This function is for simulating packet loss or corruption in an unreliable channel.
 
     Input arguments: Unix socket object, peer address 2-tuple and the message
     Return  -> size of data sent, -1 on error
     Note: it does not catch any exception
     """
-    global __LOSS_RATE, __ERR_RATE
+    global _LOSS_RATE, _ERR_RATE
     if peer_addr == ():
         print("Socket send error: Peer address not set yet")
         return -1
     else:
         # Simulate packet loss
-        drop = random.random()
-        if drop < __LOSS_RATE:
+        drop = _rng.random()
+        if drop < _LOSS_RATE:
             # simulate packet loss of unreliable send
-            print("WARNING: udt_send: Packet lost in unreliable layer!!")
+            _log.debug("udt_send: Packet lost in unreliable layer!!")
+            if _tracer is not None:
+                _tracer.sent(byte_msg, peer_addr, TRACE_LOST)
             return len(byte_msg)
 
         # Simulate packet corruption
-        corrupt = random.random()
-        if corrupt < __ERR_RATE:
-            err_bytearr = bytearray(byte_msg)
-            pos = random.randint(0, len(byte_msg) - 1)
-            val = err_bytearr[pos]
-            if val > 1:
-                err_bytearr[pos] -= 2
-            else:
-                err_bytearr[pos] = 254
-            err_msg = bytes(err_bytearr)
-            print("WARNING: udt_send: Packet corrupted in unreliable layer!!")
-            return sockd.sendto(err_msg, peer_addr)
+        original, event = byte_msg, TRACE_SENT
+        corrupt = _rng.random()
+        if corrupt < _ERR_RATE:
+            _log.debug("udt_send: Packet corrupted in unreliable layer!!")
+            byte_msg = _corrupt(byte_msg, _rng)
+            event = TRACE_CORRUPTED
+        try:
+            nbytes = sockd.sendto(byte_msg, peer_addr)
+        except BlockingIOError:
+            # Send buffer full - the datagram is dropped as a congested link would
+            _log.debug("udt_send: Send buffer full, packet dropped")
+            nbytes, event = len(byte_msg), TRACE_BLOCKED
+        if _tracer is not None:
+            _tracer.sent(original, peer_addr, event)
+        return nbytes
+
+
+class _Tracer:
+    """Append a fixed-size binary record (TRACE_FORMAT) for every datagram sent
+    or received to a trace file, for analyze-trace.py.
+
+    A record holds the monotonic time, direction, event, the header version,
+    type, sequence number and payload length of the packet, whether its
+    checksum is intact and the peer's port. The file starts with TRACE_MAGIC;
+    records of later runs are appended to it.
+    """
+
+    def __init__(self, path):
+        self.fobj = open(path, 'ab')
+        if self.fobj.tell() == 0:
+            self.fobj.write(TRACE_MAGIC)
+        atexit.register(self.close)  # Flush the buffered records
+
+    def sent(self, byte_msg, peer_addr, event):
+        """Record a datagram passed to udt_send, as it was before any simulated corruption."""
+        if len(byte_msg) >= HEADER_SIZE_V2 and byte_msg[0] >> 5 == VERSION_2:
+            first, _, _, seq_num, length = _HEADER_V2.unpack_from(byte_msg)
+            version, msg_type = VERSION_2, first & 0x1F
         else:
-            return sockd.sendto(byte_msg, peer_addr)
+            msg_type, seq_num, _, length = _HEADER.unpack_from(byte_msg)
+            version, length = VERSION_1, socket.ntohs(length)
+        self.fobj.write(_TRACE_RECORD.pack(_clock(), TRACE_OUT, event, version, msg_type,
+                                           event != TRACE_CORRUPTED, seq_num, length, peer_addr[1]))
+
+    def received(self, pkt, peer_addr):
+        """Record a datagram read from the socket, as dissected by _parse()."""
+        self.fobj.write(_TRACE_RECORD.pack(
+            _clock(), TRACE_IN, TRACE_RECEIVED, pkt.version,
+            0xFF if pkt.msg_type is None else pkt.msg_type, not pkt.corrupt,
+            pkt.seq_num or 0, pkt.length or 0, peer_addr[1]))
+
+    def close(self):
+        atexit.unregister(self.close)
+        self.fobj.close()
+
 
+def _corrupt(byte_msg, rng):
+    """Damage one byte of a message.
+
+    Input arguments: the message and the random.Random object picking the byte
+    Return  -> a corrupted copy of the message
+    """
+    err_bytearr = bytearray(byte_msg)
+    pos = rng.randint(0, len(byte_msg) - 1)
+    val = err_bytearr[pos]
+    if val > 1:
+        err_bytearr[pos] -= 2
+    else:
+        err_bytearr[pos] = 254
+    return bytes(err_bytearr)
 
-def __udt_recv(sockd, length):
+
+def _udt_recv(sockd, buf):
     """Retrieve message from underlying layer
 
-    Input arguments: Unix socket object and the max amount of data to be received
-    Return  -> the received bytes message object
-    Note: it does not catch any exception
+    Input arguments: Unix socket object and the bytearray to receive into
+    (its size is the max amount of data to be received)
+    Return  -> size of the received message and the sender's address 2-tuple
+    Note: it does not catch any exception - a non-blocking socket with
+    nothing queued raises BlockingIOError
+    """
+    (nbytes, peer) = sockd.recvfrom_into(buf)
+    return nbytes, peer
+
+
+def _wait_readable(sockd, timeout):
+    """Wait until a datagram can be received.
+
+    Input arguments: socket object and the max waiting time (None = no limit)
+    Return  -> True if a datagram is ready, False on timeout
+    Note: sockets that are not backed by a file descriptor, such as the
+    in-memory endpoints of rdt3_channel, provide their own wait_readable().
+    It does not catch any exception.
+    """
+    wait = getattr(sockd, 'wait_readable', None)
+    if wait is not None:
+        return wait(timeout)
+    r, _, _ = select.select([sockd], [], [], timeout)
+    return bool(r)
+
+
+def _set_buffers(sockd, rcvbuf, sndbuf):
+    """Request kernel buffer sizes for a UDP socket.
+
+    Input arguments: socket object, SO_RCVBUF and SO_SNDBUF sizes in bytes
+    (None or 0 = leave the system default)
+    Return  -> the receive buffer size granted
+    Note: the system may grant less than requested (on Linux at most
+    net.core.rmem_max / wmem_max); the sizes granted are logged.
+    It does not catch any exception.
     """
-    (rmsg, peer) = sockd.recvfrom(length)
-    return rmsg
+    for option, size in ((socket.SO_RCVBUF, rcvbuf), (socket.SO_SNDBUF, sndbuf)):
+        if size:
+            sockd.setsockopt(socket.SOL_SOCKET, option, size)
+    granted = sockd.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    _log.info("rdt: Socket buffers %d bytes receive, %d bytes send",
+              granted, sockd.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF))
+    return granted
 
 
-def __int_chksum(byte_msg):
+def _int_chksum(byte_msg):
     """Implement the Internet Checksum algorithm
 
+    Input argument: the bytes message object
+    Return  -> 16-bit checksum value
+
+    Note: 2^16 = 1 (mod 0xFFFF), so reading the whole message as one
+    little-endian integer and reducing it modulo 0xFFFF gives the same
+    ones' complement sum as adding it up 16 bits at a time, but the work
+    is done by int.from_bytes() in C instead of a Python loop.
+    """
+    total = int.from_bytes(byte_msg, 'little')
+    folded = total % 0xFFFF
+    if folded == 0 and total != 0:
+        folded = 0xFFFF  # ones' complement sum of non-zero data is never +0
+    return ~folded & 0xFFFF
+
+
+def _chksum_ok(byte_msg):
+    """Verify a packet in one pass over its bytes, checksum field included.
+
+    Input argument: the received packet
+    Return  -> True if the ones' complement sum of the whole packet is 0xFFFF
+    Note: the checksum field must be stored little-endian (see MSG_FORMAT)
+    """
+    total = int.from_bytes(byte_msg, 'little')
+    return total % 0xFFFF == 0 and total != 0
+
+
+def _int_chksum_reference(byte_msg):
+    """Implement the Internet Checksum algorithm one 16-bit word at a time
+
+    The original implementation, kept as a reference for _int_chksum().
     Input argument: the bytes message object
     Return  -> 16-bit checksum value
     Note: it does not check whether the input object is a bytes object
@@ -119,298 +387,2749 @@ def __int_chksum(byte_msg):
     return total & 0xFFFF
 
 
-# These are the functions used by application
+def _make_packet(msg_type, seq_num, payload, version=VERSION_1, buf=None, ack=b'', flags=0):
+    """Assemble a packet.
 
-def rdt_network_init(drop_rate, err_rate):
-    """Application calls this function to set properties of underlying network.
+    Input arguments: packet type, sequence number, payload (any bytes-like
+    object), header version, an optional bytearray of exactly the packet
+    size to build the packet in (reused by the caller), an optional
+    piggybacked ACK made by _make_ack_block() (version 2 DATA only) and
+    the flags besides FLAG_ACK (version 2 only)
+    Return  -> assembled packet, a bytearray the payload is copied into once
+    """
+    # Version 1 header
+    # {
+    # __Type        (1 byte: 11, 12, 15 or 16)
+    # __Seq num     (1 byte)
+    # __Checksum    (2 bytes)
+    # __Payload len (2 bytes, through htons())
+    # }
+    # Version 2 header - every field in network byte order
+    # {
+    # __Version and type (1 byte: version << 5 | type, never 11 or 12)
+    # __Flags            (1 byte: FLAG_ACK, FLAG_WINDOW, other bits reserved - 0)
+    # __Checksum         (2 bytes)
+    # __Seq num          (4 bytes)
+    # __Payload len      (2 bytes)
+    # }
+    # The Internet checksum does not depend on byte order (RFC 1071), so its
+    # bytes on the wire are the same whichever host computes it.
+    if version == VERSION_2:
+        header_size = HEADER_SIZE_V2
+    else:
+        header_size = HEADER_SIZE
+    if buf is None:
+        buf = bytearray(header_size + len(ack) + len(payload))
+
+    # Make initial message with checksum set to 0
+    if version == VERSION_2:
+        _HEADER_V2.pack_into(buf, 0, VERSION_2 << 5 | msg_type, flags | (FLAG_ACK if ack else 0), 0, seq_num,
+                             len(ack) + len(payload))
+    else:
+        _HEADER.pack_into(buf, 0, msg_type, seq_num, 0, socket.htons(len(payload)))
+    if ack:
+        buf[header_size:header_size + len(ack)] = ack
+        header_size += len(ack)
+    buf[header_size:] = payload
 
-    Input arguments: packet drop probability and packet corruption probability
+    # Fill in the checksum
+    _CHKSUM_FIELD.pack_into(buf, _CHKSUM_OFFSET, _int_chksum(buf))
+    return buf
+
+
+def _make_data(seq_num, data, version=VERSION_1, ack=b'', flags=0):
+    """Make DATA [seq_num].
+
+    Input arguments: sequence number, data (any bytes-like object), header
+    version, an optional piggybacked ACK made by _make_ack_block() and the
+    flags besides FLAG_ACK (version 2 only)
+    Return  -> assembled packet, a bytearray the payload is copied into once
     """
-    random.seed()
-    global __LOSS_RATE, __ERR_RATE
-    __LOSS_RATE = float(drop_rate)
-    __ERR_RATE = float(err_rate)
-    print("Drop rate:", __LOSS_RATE, "\tError rate:", __ERR_RATE)
+    return _make_packet(TYPE_DATA, seq_num, data, version, ack=ack, flags=flags)
 
 
-def rdt_socket():
-    """Application calls this function to create the RDT socket.
+def _make_ack_block(ack_num, sack=b'', window=None):
+    """Make the ACK that a version 2 DATA packet with FLAG_ACK carries ahead of its data.
 
-    Null input.
-    Return the Unix socket object on success, None on error
+    Input arguments: the acknowledged sequence number, the optional
+    selective acknowledgement made by _make_sack() and the optional
+    advertised receive window (the packet must then have FLAG_WINDOW)
+    Return  -> the block as bytes
+    """
+    # {
+    # __Window      (4 bytes, with FLAG_WINDOW only: receive window in bytes)
+    # __ACK num     (4 bytes)
+    # __SACK length (1 byte)
+    # __SACK        (as in an ACK packet)
+    # }
+    block = ack_num.to_bytes(4, 'big') + bytes((len(sack),)) + sack
+    return block if window is None else _window_field(window) + block
 
-    Note: Catch any known error and report to the user.
+
+def _make_ack(seq_num, buf=None, sack=b'', version=VERSION_1, window=None):
+    """Make ACK [seq_num].
+
+    Input arguments: sequence number, an optional bytearray of the packet
+    size to build the packet in (reused by the caller), the optional
+    selective acknowledgement made by _make_sack(), the header version and
+    the optional advertised receive window (version 2 only)
+    Return  -> assembled ACK packet
     """
-    # Your implementation
+    # Payload (pipelined modes only - peers that do not know it only read the header)
+    # {
+    # __Window         (4 bytes, version 2 with FLAG_WINDOW only: receive window in bytes)
+    # __Cumulative ACK (1 byte, 4 bytes in version 2: every sequence number before it has arrived)
+    # __SACK bitmap    (bit i set: cumulative ACK + 1 + i has arrived, LSB first)
+    # }
+    if window is None:
+        return _make_packet(TYPE_ACK, seq_num, sack, version, buf)
+    return _make_packet(TYPE_ACK, seq_num, _window_field(window) + sack, version, buf, flags=FLAG_WINDOW)
+
+
+def _window_field(window):
+    """Return an advertised receive window as its 4-byte field, capped at the field's range."""
+    return min(window, 0xFFFFFFFF).to_bytes(4, 'big')
+
+
+def _make_sack(cum_ack, held, bitmap_len, seq_modulo):
+    """Make the selective acknowledgement payload of an ACK.
+
+    Input arguments: cumulative ACK (the next sequence number expected), the
+    sequence numbers received beyond it, the bitmap size in bytes and the
+    size of the sequence number space
+    Return  -> SACK payload bytes
+    """
+    bitmap = bytearray(bitmap_len)
+    for seq_num in held:
+        offset = (seq_num - cum_ack - 1) % seq_modulo
+        if offset < 8 * bitmap_len:
+            bitmap[offset >> 3] |= 1 << (offset & 7)
+    return cum_ack.to_bytes(_seq_bytes(seq_modulo), 'big') + bitmap
+
+
+def _seq_bytes(seq_modulo):
+    """Return the size of a sequence number field for a sequence number space."""
+    return 1 if seq_modulo <= SEQ_SPACE else 4
+
+
+def _parse_sack(payload, seq_modulo):
+    """Read the selective acknowledgement payload of an ACK.
+
+    Input arguments: the ACK payload and the size of the sequence number space
+    Return  -> (cumulative ACK, list of sequence numbers received beyond it),
+    (None, []) for an ACK without the payload
+    """
+    width = _seq_bytes(seq_modulo)
+    if len(payload) < width:
+        return None, []
+    cum_ack = int.from_bytes(payload[:width], 'big')
+    held = [(cum_ack + 1 + 8 * i + bit) % seq_modulo
+            for i, byte in enumerate(payload[width:]) if byte
+            for bit in range(8) if byte >> bit & 1]
+    return cum_ack, held
+
+
+class _Packet:
+    """A received packet, dissected once by _parse().
+
+    payload is a memoryview into the receive buffer: copy it before the
+    buffer is reused for the next datagram. A DATA packet with a piggybacked
+    ACK has it split off into ack: (ACK num, SACK memoryview); otherwise ack is None.
+    The receive window advertised by an ACK or a piggybacked ACK is split
+    off into window; otherwise window is None.
+    """
+    __slots__ = ('msg_type', 'seq_num', 'length', 'payload', 'corrupt', 'version', 'ack', 'flags', 'window')
+
+    def __init__(self, msg_type, seq_num, length, payload, corrupt, version=VERSION_1, ack=None, flags=0,
+                 window=None):
+        self.msg_type = msg_type
+        self.seq_num = seq_num
+        self.length = length
+        self.payload = payload
+        self.corrupt = corrupt
+        self.version = version
+        self.ack = ack
+        self.flags = flags
+        self.window = window
+
+    def __repr__(self):
+        return "v%s(%s, %s, %s)%s" % (self.version, self.msg_type, self.seq_num, self.length,
+                                      " corrupt" if self.corrupt else "")
+
+
+def _parse(recv_pkt):
+    """Dissect a received packet and check it for corruption.
+
+    Input argument: the packet (bytes, bytearray or memoryview)
+    Return  -> _Packet record
+    """
+    # A truncated packet cannot even be dissected
+    if len(recv_pkt) < HEADER_SIZE:
+        return _Packet(None, None, None, memoryview(b''), True)
+
+    # Version 1 types are below 32, so their version bits read 0
+    version = recv_pkt[0] >> 5
+    if version == VERSION_2:
+        if len(recv_pkt) < HEADER_SIZE_V2:
+            return _Packet(None, None, None, memoryview(b''), True, VERSION_2)
+        first, flags, _, seq_num, payload_len = _HEADER_V2.unpack_from(recv_pkt)
+        msg_type = first & 0x1F
+        payload = memoryview(recv_pkt)[HEADER_SIZE_V2:]
+    else:
+        version = VERSION_1
+        flags = 0
+        msg_type, seq_num, _, payload_len = _HEADER.unpack_from(recv_pkt)
+        payload_len = socket.ntohs(payload_len)  # Byte order conversion
+        payload = memoryview(recv_pkt)[HEADER_SIZE:]
+
+    # Sum the packet with its checksum field instead of rebuilding it
+    corrupt = len(payload) != payload_len or not _chksum_ok(recv_pkt)
+    ack = None
+    window = None
+    if flags & FLAG_WINDOW and (msg_type == TYPE_ACK or flags & FLAG_ACK) and not corrupt:
+        # Split the advertised window off the ACK
+        if len(payload) < 4:
+            return _Packet(msg_type, seq_num, payload_len, payload, True, version)
+        window = int.from_bytes(payload[:4], 'big')
+        payload = payload[4:]
+    if flags & FLAG_ACK and not corrupt:
+        # Split the piggybacked ACK off the data
+        end = 5 + payload[4] if len(payload) >= 5 else None
+        if end is None or end > len(payload):
+            return _Packet(msg_type, seq_num, payload_len, payload, True, version)
+        ack = (int.from_bytes(payload[:4], 'big'), payload[5:end])
+        payload = payload[end:]
+    return _Packet(msg_type, seq_num, payload_len, payload, corrupt, version, ack, flags, window)
+
+
+def _is_corrupt(recv_pkt):
+    """Check if the received packet is corrupted.
+
+    Input arguments: received packet
+    Return  -> True if corrupted, False if not corrupted.
+    """
+    return _parse(recv_pkt).corrupt
+
+
+def _cut_msg(byte_msg, payload=None):
+    """Ensure data is not longer than max PAYLOAD.
+    Input argument: message and the payload size of the connection (default PAYLOAD)
+    Return  -> Re-sized message (if necessary)"""
+    limit = PAYLOAD if payload is None else payload
+    if len(byte_msg) > limit:
+        msg = byte_msg[0:limit]
+    else:
+        msg = byte_msg
+    return msg
+
+
+def _message_start(view, payload):
+    """Make the first fragment of a message sent by sendmsg(): the message
+    header, followed by as much of the message as fits in [payload] bytes.
+
+    Input arguments: memoryview of the message and the payload size
+    Return  -> (first fragment, number of message bytes it carries)
+    """
+    carried = min(len(view), payload - _MESSAGE_HEADER.size)
+    return _MESSAGE_HEADER.pack(MESSAGE_MARK, len(view)) + view[:carried], carried
+
+
+class _Message:
+    """A message being reassembled by recvmsg().
+
+    The first fragment tells the length of the message, so the whole buffer
+    is allocated at once and every fragment is copied into its place with a
+    single slice assignment. While recvmsg() waits for the rest, the
+    connection's _handle_data() copies in-order fragments straight from the
+    listener's datagram buffer into the message; only fragments that arrive
+    before recvmsg() asks for them go through the receive buffer first. A
+    message longer than [limit] is read to its end and dropped, so that the
+    next one is still found.
+    """
+
+    def __init__(self, first, limit):
+        """Start a message from its first fragment.
+
+        Note: it raises ValueError if [first] does not start a message
+        """
+        if len(first) < _MESSAGE_HEADER.size:
+            raise ValueError("fragment too short for a message header")
+        mark, self.length = _MESSAGE_HEADER.unpack_from(first)
+        if mark != MESSAGE_MARK:
+            raise ValueError("fragment does not start a message")
+        self.limit = limit
+        self.data = bytearray(self.length if self.length <= limit else 0)
+        self._view = memoryview(self.data)
+        self.received = 0
+        self.add(memoryview(first)[_MESSAGE_HEADER.size:])
+
+    def add(self, fragment):
+        """Copy the next fragment into the message.
+
+        Note: it raises ValueError if the fragment runs past the end of the message
+        """
+        end = self.received + len(fragment)
+        if end > self.length:
+            raise ValueError("fragment runs past the end of the message")
+        if self.data:
+            self._view[self.received:end] = fragment
+        self.received = end
+
+    def takes(self, nbytes):
+        """Check if a fragment of [nbytes] bytes belongs to what is still missing."""
+        return 0 < nbytes <= self.length - self.received
+
+    def complete(self):
+        return self.received == self.length
+
+    def result(self):
+        """Return the complete message as a bytearray.
+
+        Note: it raises ValueError if the message is longer than the limit
+        """
+        if self.length > self.limit:
+            raise ValueError("message of %d bytes exceeds the limit of %d" % (self.length, self.limit))
+        self._view.release()  # Lets the application resize the buffer
+        return self.data
+
+
+def _map_file(fobj, size):
+    """Memory-map an open file for reading.
+
+    Input arguments: file object opened for reading and its size
+    Return  -> (mmap object or None for an empty file, memoryview of the contents)
+    Note: it does not catch any exception
+    """
+    if size == 0:  # An empty file cannot be mapped
+        return None, memoryview(b'')
+    mapped = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped, memoryview(mapped)
+
+
+def _unmap_file(mapped, view):
+    """Release a mapping made by _map_file()."""
+    view.release()
+    if mapped is not None:
+        mapped.close()
+
+
+def _open_target(directory, filename, size):
+    """Create a file of [size] bytes to receive into.
+
+    Input arguments: target directory, file name sent by the peer and file size
+    Return  -> (file object opened for writing, path of the file)
+    Note: only the base name of [filename] is used, so the peer cannot write
+    outside [directory]. It does not catch any exception.
+    """
+    path = os.path.join(directory, os.path.basename(filename))
+    fobj = open(path, 'wb')
+    # Reserve the space up front, so the disk cannot fill up mid-transfer
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    except socket.error as err_msg:
-        print("Socket creation error: ", err_msg)
+        if size > 0:
+            os.posix_fallocate(fobj.fileno(), 0, size)
+    except (AttributeError, OSError):  # Not supported by the platform or file system
+        fobj.truncate(size)
+    return fobj, path
+
+
+class _Checkpoint:
+    """Progress record of a file being received by recvfile(), so that an
+    interrupted transfer can resume.
+
+    It is kept next to the file as <file>.part and holds the file size, the
+    block size and the offset up to which the file is known to be on disk -
+    a whole number of blocks, saved only after the file has been fsync-ed.
+    """
+
+    def __init__(self, path, size):
+        self.path = path + CHECKPOINT_SUFFIX
+        self.size = size
+        self.offset = 0  # Bytes of the file safely stored
+
+    def load(self):
+        """Read the record left by an earlier transfer of a file of the same size.
+
+        Return  -> the offset it records, 0 if there is none or it does not fit
+        """
+        try:
+            with open(self.path) as fobj:
+                record = json.load(fobj)
+            offset = record['offset']
+            if record['size'] != self.size or record['block'] != RESUME_BLOCK \
+                    or not 0 <= offset <= self.size or offset % RESUME_BLOCK:
+                return 0
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0
+        self.offset = offset
+        return offset
+
+    def due(self, received):
+        """Return the offset to record once another CHECKPOINT_BYTES have been
+        received, None before that."""
+        if received - self.offset >= CHECKPOINT_BYTES:
+            return received - received % RESUME_BLOCK
         return None
-    return sock
 
+    def update(self, fobj, received):
+        """Save the record once another CHECKPOINT_BYTES have been written to [fobj].
+
+        Note: it does not catch any exception
+        """
+        offset = self.due(received)
+        if offset is not None:
+            self.save(fobj, offset)
+
+    def save(self, fobj, offset):
+        """Flush [fobj] to disk, then record [offset] as stored.
+
+        Note: it does not catch any exception
+        """
+        fobj.flush()
+        os.fsync(fobj.fileno())
+        # Replace the record in one step, so a crash leaves the old or the new one
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as record:
+            json.dump({'size': self.size, 'block': RESUME_BLOCK, 'offset': offset}, record)
+            record.flush()
+            os.fsync(record.fileno())
+        os.replace(temp, self.path)
+        self.offset = offset
+
+    def remove(self):
+        """Delete the record once the file is complete."""
+        try:
+            os.remove(self.path)
+        except OSError:  # A stale record only costs the next transfer a check of the blocks
+            pass
 
-def rdt_bind(sockd, port):
-    """Application calls this function to specify the port number
-    used by itself and assigns them to the RDT socket.
 
-    Input arguments: RDT socket object and port number
-    Return	-> 0 on success, -1 on error
+def _open_resumable(directory, filename, size):
+    """Open the target of recvfile(), keeping what an interrupted transfer of
+    the same file stored.
 
-    Note: Catch any known error and report to the user.
+    Input arguments: target directory, file name sent by the peer and file size
+    Return  -> (file object opened for writing, path of the file, its _Checkpoint)
+    - the checkpoint's offset is 0 if the file starts afresh
+    Note: it does not catch any exception
     """
-    # Your implementation
+    path = os.path.join(directory, os.path.basename(filename))
+    checkpoint = _Checkpoint(path, size)
+    if checkpoint.load():
+        try:
+            fobj = open(path, 'r+b')
+        except OSError:
+            fobj = None
+        if fobj is not None:
+            if os.fstat(fobj.fileno()).st_size == size:
+                return fobj, path, checkpoint
+            fobj.close()
+        checkpoint.offset = 0
+    fobj, path = _open_target(directory, filename, size)
+    return fobj, path, checkpoint
+
+
+def _file_digests(fobj, length, block=RESUME_BLOCK):
+    """Return the SHA-256 digests of the first [length] bytes of a file, block by block, concatenated.
+
+    Note: it does not catch any exception
+    """
+    digests = bytearray()
+    for offset in range(0, length, block):
+        digests += hashlib.sha256(os.pread(fobj.fileno(), min(block, length - offset), offset)).digest()
+    return bytes(digests)
+
+
+def _verified_prefix(view, digests, block):
+    """Compare the blocks of a file with the peer's digests of its copy.
+
+    Input arguments: memoryview of the file, concatenated block digests and block size
+    Return  -> length of the prefix whose blocks all match
+    """
+    for index in range(len(digests) // DIGEST_SIZE):
+        offset = index * block
+        if hashlib.sha256(view[offset:offset + block]).digest() != digests[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]:
+            return offset
+    return len(digests) // DIGEST_SIZE * block
+
+
+def _parse_answer(rmsg, filelength, offer):
+    """Parse the receiver's answer to the file size and name sent by sendfile():
+    OKAY [codec] or RESUME <offset> <block size> [codec].
+
+    Input arguments: the answer, file size and the codecs offered
+    Return  -> (offset to resume at - 0 for OKAY, block size, codec or None),
+    None if the receiver refuses the file or the answer is not valid
+    """
+    fields = rmsg.split()
+    if fields[:1] == [b'OKAY'] and len(fields) in (1, 2):
+        offset, block = 0, RESUME_BLOCK
+    elif fields[:1] == [b'RESUME'] and len(fields) in (3, 4):
+        try:
+            offset, block = int(fields[1]), int(fields[2])
+        except ValueError:
+            return None
+        if block <= 0 or not 0 < offset <= filelength or offset % block:
+            return None
+    else:
+        return None
+    codec = None
+    if len(fields) in (2, 4):
+        codec = fields[-1].decode('ascii', 'replace')
+        if codec not in offer:
+            return None
+    return offset, block, codec
+
+
+def _parse_start(rmsg, offset):
+    """Parse the sender's answer FROM <start> to a resume offer of [offset].
+
+    Return  -> the start offset, None if it is not valid
+    """
+    fields = rmsg.split()
+    if len(fields) != 2 or fields[0] != b'FROM':
+        return None
     try:
-        sockd.bind(("", port))
-    except socket.error as err_msg:
-        print("Socket bind error: ", err_msg)
-        return -1
-    return 0
+        start = int(fields[1])
+    except ValueError:
+        return None
+    if not 0 <= start <= offset or start % RESUME_BLOCK:
+        return None
+    return start
 
 
-def rdt_peer(peer_ip, port):
-    """Application calls this function to specify the IP address
-    and port number used by remote peer process.
+# Compression of file chunks - raw DEFLATE and LZMA2 streams, without container headers
+_LZMA_FILTERS = [{'id': lzma.FILTER_LZMA2, 'preset': 6, 'dict_size': 64 * 1024}]
 
-    Input arguments: peer's IP address and port number
+
+def _zlib_compress(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _zlib_decompress(data):
+    return zlib.decompress(data, -15)
+
+
+def _lzma_compress(data):
+    return lzma.compress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+
+
+def _lzma_decompress(data):
+    return lzma.decompress(data, format=lzma.FORMAT_RAW, filters=_LZMA_FILTERS)
+
+
+# Compression codecs by name, for rdt_compress_init() - (compress, decompress)
+COMPRESSORS = {'zlib': (_zlib_compress, _zlib_decompress), 'lzma': (_lzma_compress, _lzma_decompress)}
+
+
+class _Compressor:
+    """Cut a file into chunks of at most [payload] bytes, each compressed on its own.
+
+    A chunk is one byte, CHUNK_COMPRESSED or CHUNK_RAW, followed by the
+    compressed or the original data. How much file data goes into a chunk
+    follows the compression ratio of the chunks before it. A chunk that does
+    not shrink is sent raw, and so are the next ones - 1, 2, 4, ... up to
+    MAX_SKIP of them - so an incompressible file costs little CPU time.
     """
-    # Your implementation
-    global __peeraddr
-    __peeraddr = (peer_ip, port)
+
+    def __init__(self, codec, payload, stats):
+        self.compress = COMPRESSORS[codec][0]
+        self.limit = payload - 1  # Room for the data after the chunk's first byte
+        self.stats = stats
+        self.ratio = 2.0  # Expected compression ratio of the next chunk
+        self.skip = 0  # Chunks still to send raw
+        self.backoff = 1  # Chunks to send raw after the next one that does not shrink
+
+    def chunk(self, view, offset):
+        """Make the chunk that starts at [offset] of the file.
+
+        Input arguments: memoryview of the file and offset of the chunk
+        Return  -> (chunk, bytes of the file it carries)
+        """
+        cputime = time.thread_time()
+        chunk, size = self._chunk(view, offset)
+        self.stats.codec_cpu += time.thread_time() - cputime
+        self.stats.raw_bytes += size
+        self.stats.coded_bytes += len(chunk)
+        if chunk[0] == CHUNK_RAW:
+            self.stats.raw_chunks += 1
+        return chunk, size
+
+    def _chunk(self, view, offset):
+        if self.skip:
+            self.skip -= 1
+            return self._raw(view, offset)
+        size = max(self.limit, int(self.limit * self.ratio * 0.9))
+        while True:
+            data = view[offset:offset + size]
+            coded = self.compress(data)
+            if len(coded) < len(data) and len(coded) <= self.limit:
+                self.ratio = min(len(data) / len(coded), MAX_RATIO)
+                self.backoff = 1
+                return bytes((CHUNK_COMPRESSED,)) + coded, len(data)
+            if len(coded) >= len(data) or size <= self.limit:
+                break
+            # Too much for one packet - try as much as the ratio just seen fits
+            size = max(self.limit, min(int(size * self.limit / len(coded) * 0.9), size - 1))
+        # The data does not shrink - stop trying for a while
+        self.ratio = 1.0
+        self.skip = self.backoff
+        self.backoff = min(2 * self.backoff, MAX_SKIP)
+        return self._raw(view, offset)
+
+    def _raw(self, view, offset):
+        data = view[offset:offset + self.limit]
+        return bytes((CHUNK_RAW,)) + data, len(data)
+
+
+def _decompress_chunk(codec, chunk, stats):
+    """Restore the file data of a chunk made by _Compressor.
+
+    Return  -> the file data, None if the chunk is damaged
+    """
+    cputime = time.thread_time()
+    try:
+        if chunk[0] == CHUNK_RAW:
+            data = bytes(chunk[1:])
+        elif chunk[0] == CHUNK_COMPRESSED:
+            data = COMPRESSORS[codec][1](chunk[1:])
+        else:
+            return None
+    except (zlib.error, lzma.LZMAError, IndexError):
+        return None
+    stats.codec_cpu += time.thread_time() - cputime
+    stats.raw_bytes += len(data)
+    stats.coded_bytes += len(chunk)
+    if chunk[0] == CHUNK_RAW:
+        stats.raw_chunks += 1
+    return data
 
 
-def __make_data(seq_num, data):
-    """Make DATA [seq_num].
+def _make_offer(filelength, offer):
+    """Return the first message of sendfile(): <file size> [codec,codec,...]."""
+    if not offer:
+        return str(filelength).encode('ascii')
+    return ('%d %s' % (filelength, ','.join(offer))).encode('ascii')
 
-    Input arguments: sequence number, data, checksum
-    Return  -> assembled packet
+
+def _parse_offer(rmsg):
+    """Parse the sender's first message: <file size> [codec,codec,...].
+
+    Return  -> (file size, the first codec offered that we accept or None),
+    None if it is not valid
     """
-    global TYPE_DATA, MSG_FORMAT
-    # print("__make_data() for data = " + data)
+    fields = rmsg.split()
+    if len(fields) not in (1, 2):
+        return None
+    try:
+        filelength = int(fields[0])
+    except ValueError:
+        return None
+    offer = fields[1].decode('ascii', 'replace').split(',') if len(fields) == 2 else []
+    codec = next((name for name in offer if name in _codecs), None)
+    return filelength, codec
 
-    # Header
-    # {
-    # __Type        (1 byte)
-    # __Seq num     (1 byte)
-    # __Checksum    (2 bytes)
-    # __Payload len (2 bytes)
-    # }
 
-    # Make initial message
-    msg_format = struct.Struct(MSG_FORMAT)
-    checksum = 0  # First set checksum to 0
-    init_msg = msg_format.pack(TYPE_DATA, seq_num, checksum, socket.htons(len(data))) + data
+def _check_window(window_size, mode):
+    """Validate a window configuration.
 
-    # Calculate checksum
-    checksum = __int_chksum(bytearray(init_msg))
-    # print("checksum = " + str(checksum))
+    Input arguments: window size and pipelining mode
+    Return  -> None if valid, otherwise a message describing the problem
+    """
+    if mode not in (GO_BACK_N, SELECTIVE_REPEAT):
+        return "unknown mode %s" % mode
+    # GBN needs window < sequence space, SR needs window <= half of it
+    max_window = SEQ_SPACE - 1 if mode == GO_BACK_N else SEQ_SPACE // 2
+    if not 1 <= window_size <= max_window:
+        return "window size must be between 1 and %d for %s" % (max_window, mode)
+    return None
 
-    # A complete msg with checksum
-    complete_msg = msg_format.pack(TYPE_DATA, seq_num, checksum, socket.htons(len(data))) + data
-    # print("__make_data() finished --> " + str(__unpack_helper(complete_msg)))
-    return complete_msg
 
+def _check_packet(version, payload):
+    """Validate a packet configuration.
 
-def __unpack_helper(msg):
-    """Helper function to unpack msg."""
-    global MSG_FORMAT
-    size = struct.calcsize(MSG_FORMAT)
-    (msg_type, seq_num, recv_checksum, payload_len), payload = struct.unpack(MSG_FORMAT, msg[:size]), msg[size:]
-    return (msg_type, seq_num, recv_checksum, socket.ntohs(payload_len)), payload  # Byte order conversion
+    Input arguments: header version and payload size (None = keep the default)
+    Return  -> None if valid, otherwise a message describing the problem
+    """
+    if version is not None and version not in (VERSION_1, VERSION_2):
+        return "unknown header version %s" % version
+    if payload is not None and not 1 <= payload <= MAX_PAYLOAD:
+        return "payload size must be between 1 and %d" % MAX_PAYLOAD
+    return None
 
 
-def __is_corrupt(recv_pkt):
-    """Check if the received packet is corrupted.
+def _resolve_addr(peer_ip, port):
+    """Turn a host name or IP address and a port number into the address
+    2-tuple that recvfrom() reports for datagrams from that peer.
 
-    Input arguments: received packet
-    Return  -> True if corrupted, False if not corrupted.
+    Note: it does not catch any exception
     """
-    global MSG_FORMAT
+    return socket.gethostbyname(peer_ip), int(port)
 
-    # Header
-    # {
-    # __Type        (1 byte)
-    # __Seq num     (1 byte)
-    # __Checksum    (2 bytes)
-    # __Payload len (2 bytes)
-    # __Payload
-    # }
 
-    # print("is_corrupt() checking msg -> " + str(__unpack_helper(recv_pkt)))
+class _Pacer:
+    """Token bucket that spreads a sender's DATA packets over time.
 
-    # Dissect received packet
-    (msg_type, seq_num, recv_checksum, payload_len), payload = __unpack_helper(recv_pkt)
-    # print("           : received checksum = ", recv_checksum)
+    The bucket fills at the pacing rate up to a burst; a packet may go out
+    once the bucket holds its size, and sending takes its size out.
+    """
+    __slots__ = ('tokens', 'updated')
 
-    # Reconstruct initial message
-    init_msg = struct.Struct(MSG_FORMAT).pack(msg_type, seq_num, 0, socket.htons(payload_len)) + payload
+    def __init__(self):
+        self.tokens = None  # Bytes in the bucket, None until first paced - then it starts full
+        self.updated = None  # When the bucket was last filled
 
-    # Calculate checksum
-    calc_checksum = __int_chksum(bytearray(init_msg))
-    # print("           : calc checksum = ", calc_checksum)
+    def delay(self, nbytes, rate, burst):
+        """Return how long a packet of [nbytes] must wait at [rate] bytes/s, 0 to send it now."""
+        now = _clock()
+        if self.tokens is None:
+            self.tokens = burst
+        else:
+            self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        deficit = nbytes - self.tokens
+        return deficit / rate if deficit >= 1 else 0.0  # Less than a byte short is rounding
+
+    def consume(self, nbytes):
+        """Take a packet sent out of the bucket."""
+        if self.tokens is not None:
+            self.tokens -= nbytes
+
+
+class RttEstimator:
+    """Retransmission timeout (RTO) computed from measured round-trip times.
+
+    Follows RFC 6298: smoothed RTT and RTT variance are updated from each
+    sample, RTO = SRTT + 4 * RTTVAR, doubled on every timeout (at most
+    MAX_BACKOFF times, so a closing peer's TWAIT still spans several
+    retransmissions) and clamped to [MIN_RTO, MAX_RTO]. Samples of retransmitted packets must not be fed
+    in, as their ACK cannot be matched to one transmission (Karn's rule).
+    The backoff ends with the next sample or ACK of new data, whichever
+    comes first; on a lossy path a window may go by without a clean sample.
+    """
+
+    ALPHA = 1 / 8  # gain of the smoothed RTT
+    BETA = 1 / 4  # gain of the RTT variance
+    K = 4  # variance multiplier
+
+    def __init__(self, initial_rto=TIMEOUT, min_rto=MIN_RTO, max_rto=MAX_RTO):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None  # smoothed round-trip time, None until the first sample
+        self.rttvar = None  # round-trip time variance
+        self.base_rto = self._clamp(initial_rto)  # RTO before backoff
+        self.backoff = 0  # number of consecutive timeouts
+        self.samples = 0  # number of RTT samples taken
+        self.timeouts = 0  # number of timeouts seen
+
+    @property
+    def rto(self):
+        """The current retransmission timeout, including backoff."""
+        return self._clamp(self.base_rto * (2 ** self.backoff))
+
+    def sample(self, rtt):
+        """Feed in the round-trip time of a packet sent only once."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.base_rto = self._clamp(self.srtt + self.K * self.rttvar)
+        self.backoff = 0  # a fresh measurement ends the backoff
+        self.samples += 1
+
+    def on_timeout(self):
+        """Double the RTO after a retransmission timeout."""
+        self.timeouts += 1
+        if self.backoff < MAX_BACKOFF and self.rto < self.max_rto:
+            self.backoff += 1
+
+    def on_progress(self):
+        """End the backoff when the peer acknowledges new data."""
+        self.backoff = 0
+
+    def info(self):
+        """Return the estimator state as a dictionary."""
+        return {'srtt': self.srtt, 'rttvar': self.rttvar, 'rto': self.rto, 'base_rto': self.base_rto,
+                'backoff': self.backoff, 'samples': self.samples, 'timeouts': self.timeouts}
+
+    def _clamp(self, rto):
+        return min(max(rto, self.min_rto), self.max_rto)
+
+
+class RenoControl:
+    """Reno-style congestion window of a sender: slow start, then additive
+    increase by one packet per round trip, multiplicative decrease on loss.
+
+    The window is counted in packets and never exceeds the configured window
+    size. A fast retransmit halves it and enters fast recovery, which ends when
+    a window's worth of packets has been acknowledged; a timeout restarts slow
+    start from one packet. Every phase change is logged at INFO level and kept
+    in [transitions].
+    """
+
+    name = 'reno'
+    BETA = 0.5  # Multiplicative decrease factor on loss
+    MAX_TRANSITIONS = 1000  # Phase changes kept for info()
+
+    def __init__(self, max_window):
+        self.max_window = max_window
+        self.cwnd = float(min(INITIAL_CWND, max_window))
+        self.ssthresh = float(max_window)
+        self.phase = SLOW_START
+        self.losses = 0
+        self.transitions = []  # [(time since start, new phase, cwnd, ssthresh), ...]
+        self._start = _clock()
+        self._recovery_left = 0  # Packets to acknowledge before fast recovery ends
+
+    def window(self):
+        """Return the number of packets that may be in flight."""
+        return max(1, min(self.max_window, int(self.cwnd)))
+
+    def on_ack(self, acked, srtt):
+        """Grow the window for [acked] newly acknowledged packets.
+
+        Input arguments: number of packets and the smoothed RTT (None if unknown)
+        """
+        if self.phase == FAST_RECOVERY:
+            self._recovery_left -= acked
+            if self._recovery_left > 0:
+                return
+            self._set_phase(CONGESTION_AVOIDANCE)
+            return
+        if self.phase == SLOW_START:
+            self.cwnd += acked
+            if self.cwnd >= self.ssthresh:
+                self.cwnd = max(self.ssthresh, 1.0)
+                self._set_phase(CONGESTION_AVOIDANCE)
+        else:
+            self._increase(acked, srtt)
+        self.cwnd = min(self.cwnd, float(self.max_window))
+
+    def on_fast_retransmit(self, in_flight):
+        """Shrink the window after duplicate ACKs signalled a loss.
+
+        Input argument: number of packets in flight
+        """
+        if self.phase == FAST_RECOVERY:  # One decrease per window of data
+            return
+        self.losses += 1
+        self._decrease()
+        self._recovery_left = in_flight
+        self._set_phase(FAST_RECOVERY)
+
+    def on_timeout(self):
+        """Restart slow start after a retransmission timeout."""
+        self.losses += 1
+        self._decrease()
+        self.cwnd = 1.0
+        self._set_phase(SLOW_START)
+
+    def info(self):
+        """Return the congestion state as a dictionary."""
+        return {'algorithm': self.name, 'cwnd': self.cwnd, 'ssthresh': self.ssthresh,
+                'phase': self.phase, 'losses': self.losses, 'transitions': list(self.transitions)}
+
+    def _increase(self, acked, srtt):
+        """Congestion avoidance: one packet per window of acknowledged packets."""
+        self.cwnd += acked / self.cwnd
+
+    def _decrease(self):
+        """Set the slow start threshold and window after a loss."""
+        self.ssthresh = max(self.cwnd * self.BETA, 2.0)
+        self.cwnd = self.ssthresh
+
+    def _set_phase(self, phase):
+        if phase == self.phase and phase != SLOW_START:
+            return
+        _log.info("cc: %s -> %s | cwnd %.1f ssthresh %.1f", self.phase, phase, self.cwnd, self.ssthresh)
+        self.phase = phase
+        if len(self.transitions) < self.MAX_TRANSITIONS:
+            self.transitions.append((_clock() - self._start, phase, self.cwnd, self.ssthresh))
+
+
+class CubicControl(RenoControl):
+    """CUBIC-style congestion window (RFC 8312).
+
+    After a loss the window follows W(t) = C (t - K)^3 + W_max, where W_max is
+    the window before the loss and t the time since: it climbs back quickly,
+    flattens out around W_max and then probes beyond it. It never grows slower
+    than Reno would (the TCP-friendly region). Slow start and timeouts are as
+    in RenoControl.
+    """
 
-    result = recv_checksum != calc_checksum
-    # print("corrupt -> " + str(result))
+    name = 'cubic'
+    BETA = 0.7
+    C = 0.4
+
+    def __init__(self, max_window):
+        super().__init__(max_window)
+        self._w_max = 0.0  # Window before the last loss
+        self._epoch = None  # When the current growth curve started
+        self._k = 0.0  # Time the curve takes to get back to _w_max
+        self._origin = 0.0  # Window the curve flattens out at
+        self._w_est = 0.0  # Window Reno would have reached
+
+    def _increase(self, acked, srtt):
+        now = _clock()
+        if self._epoch is None:
+            self._epoch = now
+            if self.cwnd < self._w_max:
+                self._k = ((self._w_max - self.cwnd) / self.C) ** (1 / 3)
+                self._origin = self._w_max
+            else:
+                self._k = 0.0
+                self._origin = self.cwnd
+            self._w_est = self.cwnd
+        rtt = srtt or TIMEOUT
+        t = now - self._epoch + rtt
+        target = self.C * (t - self._k) ** 3 + self._origin
+        # Reno's growth over the same time, for the TCP-friendly region
+        self._w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * acked / self.cwnd
+        target = max(target, self._w_est)
+        if target > self.cwnd:
+            self.cwnd += (target - self.cwnd) / self.cwnd * acked
+        else:
+            self.cwnd += 0.01 * acked / self.cwnd
+
+    def _decrease(self):
+        # Fast convergence: give up bandwidth sooner if the window is shrinking
+        if self.cwnd < self._w_max:
+            self._w_max = self.cwnd * (1 + self.BETA) / 2
+        else:
+            self._w_max = self.cwnd
+        self._epoch = None
+        super()._decrease()
 
-    return result
 
+# Congestion control algorithms by name, for rdt_congestion_init() - None turns it off
+CONGESTION_CONTROLS = {'reno': RenoControl, 'cubic': CubicControl, 'none': None}
 
-def __is_ack(recv_pkt, seq_num):
-    """Check if the received packet is ACK 0/1.
 
-    Input arguments: received packet, sequence number
-    Return  -> True if received ACK [seq_num]
+class ReorderBuffer:
+    """Receive buffer of one connection: payloads that arrived out of order,
+    keyed by sequence number, and in-order payloads waiting for recv().
+
+    Storing, duplicate detection and handing out the next in-order payload
+    take O(1). Every payload held counts against a byte budget; a payload
+    that does not fit is refused, so the connection drops its DATA
+    unacknowledged and the sender retransmits it later.
     """
-    global TYPE_ACK
 
-    # Dissect the received packet
-    (msg_type, recv_seq_num, _, _), _ = __unpack_helper(recv_pkt)
-    return msg_type == TYPE_ACK and recv_seq_num == seq_num
-    # if msg_type == TYPE_ACK:
-    #     print("is ack")
-    #     if recv_seq_num == seq_num:
-    #         print("seq num same")
-    #         return True
-    #     else:
-    #         print("seq num DIFF!")
-    #         return False
-    # else:
-    #     print("NOT ack!")
-    #     return False
+    def __init__(self, budget=RECV_BUDGET):
+        self.budget = budget
+        self.used = 0  # Payload bytes held, in order or not
+        self.peak = 0  # Most payload bytes ever held
+        self._held = {}  # Out of order - {seq_num: payload}
+        self._ready = deque()  # In order, oldest first
+
+    def __len__(self):
+        """Return the number of in-order payloads waiting for recv()."""
+        return len(self._ready)
+
+    def __contains__(self, seq_num):
+        """Check if DATA [seq_num] is held out of order."""
+        return seq_num in self._held
+
+    def held(self):
+        """Return the sequence numbers held out of order."""
+        return self._held.keys()
+
+    def has_room(self, nbytes):
+        """Check if [nbytes] more payload bytes fit in the budget."""
+        return self.used + nbytes <= self.budget
+
+    def hold(self, seq_num, payload):
+        """Keep an out-of-order payload until the gap before it is filled."""
+        self._held[seq_num] = payload
+        self._grow(len(payload))
+
+    def push(self, payload):
+        """Queue an in-order payload for recv()."""
+        self._ready.append(payload)
+        self._grow(len(payload))
+
+    def release(self, seq_num, seq_modulo):
+        """Queue the held payloads that follow on from [seq_num] for recv().
+
+        Input arguments: the next sequence number expected and the size of the sequence number space
+        Return  -> (the next sequence number expected afterwards, list of the payloads released)
+        """
+        released = []
+        while seq_num in self._held:
+            payload = self._held.pop(seq_num)
+            self._ready.append(payload)
+            released.append(payload)
+            seq_num = (seq_num + 1) % seq_modulo
+        return seq_num, released
+
+    def pop(self, nbytes=None):
+        """Take the oldest in-order payload, or only its first [nbytes] bytes
+        if it is longer, leaving the rest of it to be taken next."""
+        payload = self._ready[0]
+        if nbytes is not None and nbytes < len(payload):
+            self._ready[0] = payload[nbytes:]
+            payload = payload[:nbytes]
+        else:
+            self._ready.popleft()
+        self.used -= len(payload)
+        return payload
+
+    def info(self):
+        """Return the occupancy as a dictionary."""
+        return {'budget': self.budget, 'used': self.used, 'peak': self.peak,
+                'held': len(self._held), 'ready': len(self._ready)}
 
+    def _grow(self, nbytes):
+        self.used += nbytes
+        if self.used > self.peak:
+            self.peak = self.used
 
-def __has_seq(recv_msg, seq_num):
-    """Check if the received packet has sequence number [seq_num]
 
-    Input arguments: received packet, sequence number
-    Return True if received packet of sequence number [seq_num] and False otherwise
+class RdtStats:
+    """Counters, ACK round-trip histogram and goodput of one connection.
+
+    Goodput is payload bytes acknowledged (sent) or delivered in order
+    (received) per GOODPUT_INTERVAL, counted from when the connection opened.
+    With a compressed file transfer, raw_bytes counts the file data and
+    coded_bytes the chunks that carried it; their quotient is the compression ratio.
     """
-    # Dissect the received packet
-    (msg_type, recv_seq_num, _, _), _ = __unpack_helper(recv_msg)
-    return recv_seq_num == seq_num
 
+    # Upper bounds (seconds) of the ACK round-trip histogram buckets
+    RTT_BUCKETS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+                   0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+    COUNTERS = ('data_sent', 'bytes_sent', 'retransmissions', 'timeouts',
+                'fast_retransmissions', 'packets_received', 'corrupt_drops',
+                'acks_sent', 'acks_coalesced', 'acks_piggybacked', 'acks_received', 'stale_acks', 'duplicate_acks', 'sacked',
+                'data_received', 'bytes_delivered', 'duplicate_data', 'buffered_data', 'discarded_data',
+                'budget_drops', 'raw_bytes', 'coded_bytes', 'raw_chunks',
+                'window_updates', 'window_limited', 'paced_packets')
+
+    def __init__(self):
+        self.start = _clock()
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.rtt_histogram = [0] * (len(self.RTT_BUCKETS) + 1)  # last bucket: above the largest bound
+        self.codec_cpu = 0.0  # Seconds of CPU time spent compressing or decompressing file chunks
+        self._acked_bytes = {}  # {interval index: payload bytes acknowledged}
+        self._delivered_bytes = {}  # {interval index: payload bytes delivered}
+
+    def record_rtt(self, rtt):
+        """Count an ACK round-trip time sample in the histogram."""
+        self.rtt_histogram[bisect.bisect_left(self.RTT_BUCKETS, rtt)] += 1
+
+    def record_acked(self, nbytes):
+        """Count payload bytes the peer has acknowledged."""
+        interval = int((_clock() - self.start) / GOODPUT_INTERVAL)
+        self._acked_bytes[interval] = self._acked_bytes.get(interval, 0) + nbytes
+
+    def record_delivered(self, nbytes):
+        """Count payload bytes received in order."""
+        self.bytes_delivered += nbytes
+        interval = int((_clock() - self.start) / GOODPUT_INTERVAL)
+        self._delivered_bytes[interval] = self._delivered_bytes.get(interval, 0) + nbytes
+
+    def to_dict(self):
+        """Return all statistics as a JSON-serialisable dictionary."""
+        elapsed = _clock() - self.start
+        info = {name: getattr(self, name) for name in self.COUNTERS}
+        info['elapsed'] = elapsed
+        info['rtt_histogram'] = [{'le': bound, 'count': count}
+                                 for bound, count in zip(self.RTT_BUCKETS + (None,), self.rtt_histogram)]
+        info['goodput_interval'] = GOODPUT_INTERVAL
+        info['send_goodput'] = self._series(self._acked_bytes)
+        info['recv_goodput'] = self._series(self._delivered_bytes)
+        acked = sum(self._acked_bytes.values())
+        info['avg_send_goodput'] = acked / elapsed if elapsed > 0 else 0.0
+        info['avg_recv_goodput'] = self.bytes_delivered / elapsed if elapsed > 0 else 0.0
+        info['compression_ratio'] = self.raw_bytes / self.coded_bytes if self.coded_bytes else None
+        info['codec_cpu'] = self.codec_cpu
+        return info
+
+    @staticmethod
+    def _series(buckets):
+        """Turn {interval index: bytes} into [[start time, bytes per second], ...]."""
+        if not buckets:
+            return []
+        return [[i * GOODPUT_INTERVAL, buckets.get(i, 0) / GOODPUT_INTERVAL] for i in range(max(buckets) + 1)]
+
+
+class _Pending:
+    """A sent DATA packet waiting for its ACK."""
+    __slots__ = ('packet', 'deadline', 'sent_at', 'retransmitted')
+
+    def __init__(self, packet, sent_at, rto):
+        self.packet = packet
+        self.sent_at = sent_at
+        self.deadline = sent_at + rto
+        self.retransmitted = False
+
+
+class RdtSocket:
+    """One RDT connection to a remote peer.
+
+    A connection owns its sequence numbers, send and receive windows and data
+    buffer. It does not own the UDP socket: datagrams are read by its
+    RdtListener, which may serve many connections on the same port. Create
+    connections with RdtListener.connect() or RdtListener.accept().
+    """
 
-def __cut_msg(byte_msg):
-    """Ensure data is not longer than max PAYLOAD.
-    Input argument: message
-    Return  -> Re-sized message (if necessary)"""
-    global PAYLOAD
-    if len(byte_msg) > PAYLOAD:
-        msg = byte_msg[0:PAYLOAD]
-    else:
-        msg = byte_msg
-    return msg
+    def __init__(self, listener, peer_addr, window_size=None, mode=None, congestion=None, version=None,
+                 payload=None):
+        self.listener = listener
+        self.peer_addr = peer_addr
+        self.window_size = _window_size if window_size is None else window_size
+        self.mode = _arq_mode if mode is None else mode
+        self.payload = PAYLOAD if payload is None else payload  # Max data per packet
+        self.closed = False
+        self.rtt = RttEstimator()  # Adaptive retransmission timeout
+        self.stats = RdtStats()
+        # Congestion window - stop-and-wait never has more than one packet in flight
+        algorithm = CONGESTION_CONTROLS[_cc_algorithm if congestion is None else congestion]
+        self.cc = algorithm(self.window_size) if algorithm is not None and self.window_size > 1 else None
+        self._cc_reduced_at = 0.0  # When the congestion window last shrank
+
+        # Sender side
+        self._send_seq_num = 0  # Next sequence number to use
+        self._send_base = 0  # Oldest unacknowledged sequence number
+        self._unacked = {}  # Sent but unacknowledged - {seq_num: _Pending}
+        self._gbn_deadline = None  # The single Go-Back-N retransmission timer
+        self._dupacks = 0  # ACKs in a row that did not move the send base
+        self._peer_window = None  # Receive window (bytes) the peer last advertised, None if it does not
+        self._pacer = _Pacer()  # Spreads pipelined DATA over the round trip
+
+        # Receiver side
+        self._recv_seq_num = 0  # Next sequence number expected
+        # Out-of-order payloads (Selective Repeat only) and in-order ones not yet collected by recv()
+        self._recv_buffer = ReorderBuffer(_recv_budget)
+        self._ack_due = None  # ACK held back for the end of a batch of datagrams or for outgoing DATA
+        self._ack_deadline = None  # When a delayed ACK must go out on its own
+        self._peer_flow = False  # The peer reads advertised windows (version 2 with FLAG_WINDOW)
+        self._adv_window = None  # Receive window (bytes) we last advertised
+        self._closing = False  # Set by close() - ACKs are no longer delayed
+        self._fin_acked = False  # Our FIN has been answered
+        self._peer_fin = False  # The peer has sent its FIN - no more DATA will come
+        self._message = None  # The _Message recvmsg() is waiting to complete
+
+        # Path probing
+        self._probe_id = 0  # Sequence number of the last probe sent
+        self._probe_acks = {}  # Answered probes - {probe id: payload size received}
+
+        self._set_version(_header_version if version is None else version)
+
+    def send(self, byte_msg):
+        """Transmit a message to the peer.
+
+        Input argument: the message bytes object
+        Return  -> size of data sent on success, -1 on error
+
+        Note: the message is cut to at most the connection's payload size. The
+        call returns once the send window has room for another message; in
+        stop-and-wait mode that is when the message has been acknowledged.
+        """
+        # Ensure data not longer than max payload
+        msg = _cut_msg(byte_msg, self.payload)
+
+        # Try to send packet, once the pacer lets it go
+        try:
+            delay = self._pacing_delay(len(msg))
+            if delay > 0:
+                self.stats.paced_packets += 1
+            while delay > 0:
+                self.listener._poll(delay)
+                delay = self._pacing_delay(len(msg))
+            if self._transmit(msg) < 0:
+                return -1
+        except socket.error as err_msg:
+            print("Socket send error: ", err_msg)
+            return -1
 
+        # Wait until the window can take another packet
+        try:
+            if self._window_used() >= self._send_window() and self._flow_limited():
+                self.stats.window_limited += 1
+            while self._window_used() >= self._send_window():
+                if self.listener.transport_lost:
+                    return -1
+                self.listener._poll(None)
+        except socket.error as err_msg:
+            print("rdt_send(): Socket error while waiting for ACK: ", err_msg)
+            return -1
+        return len(msg)
+
+    def recv(self, length):
+        """Wait for a message from the peer.
+
+        Input argument: the max size of the message to be received
+        Return  -> the received bytes message object on success, b'' on error
+        or once the peer has closed and every message has been collected
+        Note: each call returns one payload as the peer sent it. A payload
+        longer than [length] is returned in pieces of at most [length] bytes,
+        over as many calls, so nothing the peer sent is lost.
+        """
+        if length <= 0:
+            print("rdt_recv(): Invalid message size: ", length)
+            return b''
+        # Messages may already have arrived while sending
+        try:
+            while len(self._recv_buffer) == 0:
+                if self._peer_fin:
+                    return b''
+                if self._ack_due is not None:
+                    self._send_ack()  # No DATA is coming from us for it to ride on
+                self.listener._poll(None)
+        except socket.error as err_msg:
+            print("rdt_recv(): Socket receive error: " + str(err_msg))
+            return b''
+        # Pop data in a FIFO manner
+        payload = self._recv_buffer.pop(length)
+        try:
+            self._window_update()
+        except socket.error as err_msg:
+            print("rdt_recv(): Socket send error: ", err_msg)
+        return payload
+
+    def sendmsg(self, buf):
+        """Transmit a message of any size to the peer, which receives it whole with recvmsg().
+
+        Input argument: the message as a bytes-like object
+        Return  -> size of the message on success, -1 on error
+
+        Note: the message is cut into packets of the connection's payload size,
+        pipelined within the send window. The first one starts with the message
+        header (MESSAGE_FORMAT), which tells the receiver the message length.
+        """
+        return self._run(self._sendmsg_steps(buf))
+
+    def recvmsg(self, length):
+        """Wait for a whole message sent by the peer's sendmsg().
+
+        Input argument: the size of the largest message accepted
+        Return  -> the message as a bytearray on success, None on error or
+        once the peer has closed
+        Note: a longer message is received and dropped as an error. The
+        fragments are copied into the message as they arrive (see _Message).
+        """
+        return self._run(self._recvmsg_steps(length))
+
+    def close(self):
+        """Finish the conversation with the peer.
+
+        Waits for all pipelined packets to be acknowledged, then sends FIN until
+        the peer answers FIN-ACK and waits for the peer's own FIN (or for the
+        peer to be quiet for 2 * MAX_RTO), so both sides return as soon as
+        neither has DATA in flight. The side that answers the last FIN lingers
+        FIN_LINGER_RTO timeouts in case its FIN-ACK got lost.
+        A peer that never answers FIN gets the old linger instead: until it has
+        been quiet for TWAIT_RTO timeouts (at least TWAIT) so that retransmitted
+        DATA can still be ACK-ed; the wait doubles each time the peer retransmits.
+        The shared UDP socket is left open.
+        """
+        try:
+            self._run(self._close_steps())
+        except socket.error as err_msg:
+            print("rdt_close(): Socket error: ", err_msg)
+        self._finish()
+
+    def sendfile(self, path, callback=None):
+        """Transmit a file to the peer, which receives it with recvfile().
+
+        Input arguments: path of the file, optional progress callback
+        called as callback(bytes sent, file size) after every packet
+        Return  -> size of the file on success, -1 on error
+
+        Note: the file size - followed by the codecs set with rdt_compress_init(),
+        if any - and name are sent first and the peer answers OKAY, ERROR or -
+        if it holds part of the file from an interrupted transfer - RESUME
+        <offset> <block size> followed by the SHA-256 digest of every block
+        before the offset. The transfer then continues from the first block
+        that does not match, announced with FROM <start>. An answer ending with
+        a codec makes every DATA message a chunk of _Compressor. The file is
+        memory-mapped and every packet is sliced out of the mapping, so its
+        contents are only copied into the packets.
+        """
+        return self._run(self._sendfile_steps(path, callback))
+
+    def recvfile(self, directory, callback=None):
+        """Receive a file sent by the peer's sendfile() and store it in a directory.
+
+        Input arguments: target directory, optional progress callback
+        called as callback(bytes received, file size) after every packet
+        Return  -> path of the stored file on success, None on error
+        Note: the target file is allocated at its full size before any data
+        arrives. Progress is checkpointed to <file>.part every CHECKPOINT_BYTES,
+        and a later transfer of the same file resumes from the checkpoint once
+        the sender has checked the stored blocks against its own.
+        """
+        return self._run(self._recvfile_steps(directory, callback))
+
+    def info(self):
+        """Return the statistics and RTT estimate of this connection as a dictionary."""
+        info = self.stats.to_dict()
+        info['peer'] = list(self.peer_addr)
+        info['version'] = self.version
+        info['payload'] = self.payload
+        info['rtt'] = self.rtt.info()
+        info['congestion'] = self.cc.info() if self.cc is not None else None
+        info['recv_buffer'] = self._recv_buffer.info()
+        info['flow'] = {'peer_window': self._peer_window, 'advertised_window': self._adv_window,
+                        'pacing_rate': self._pacing_rate()}
+        return info
+
+    def probe_payload(self, max_payload=MAX_PAYLOAD):
+        """Find the largest payload the path to the peer delivers unfragmented and use it.
+
+        Input argument: the largest payload size to try
+        Return  -> the payload size of the connection afterwards
+
+        Note: padded PROBE packets are sent with fragmentation forbidden where
+        the system allows it (IP_MTU_DISCOVER), so a datagram larger than the
+        path MTU is refused or lost instead of being split. max_payload is
+        tried first, then the size is bisected down to MIN_PAYLOAD. Each size
+        gets PROBE_TRIES probes of one RTO each. If no probe is answered, as
+        with a peer that does not know probes, the payload size is unchanged.
+        Call it before sending any data.
+        """
+        return self._run(self._probe_payload_steps(max_payload))
+
+    def _send_probe(self, size):
+        """Send a PROBE padded to a payload of [size] bytes.
+
+        Return  -> the probe id to wait for, None if the system refused the
+        datagram as larger than the path MTU
+        Note: it does not catch any exception other than EMSGSIZE
+        """
+        self._probe_id = (self._probe_id + 1) % SEQ_SPACE_V2
+        try:
+            _udt_send(self.listener.sockd, self.peer_addr,
+                      _make_packet(TYPE_PROBE, self._probe_id, bytes(size), VERSION_2))
+        except OSError as err_msg:
+            if err_msg.errno != errno.EMSGSIZE:
+                raise
+            _log.debug("rdt: Probe of %d bytes refused by the system", size)
+            return None
+        _log.debug("rdt: Sent probe [%d] of %d bytes", self._probe_id, size)
+        return self._probe_id
+
+    def _forbid_fragmentation(self, setting=None):
+        """Forbid IP fragmentation on the UDP socket, or restore a previous setting.
+
+        Input argument: the setting returned by an earlier call, None to forbid
+        Return  -> the previous setting, None if the socket does not support it
+        """
+        sockd = self.listener.sockd
+        option = getattr(socket, 'IP_MTU_DISCOVER', _IP_MTU_DISCOVER)
+        if option is None or not hasattr(sockd, 'setsockopt'):
+            return None
+        try:
+            previous = sockd.getsockopt(socket.IPPROTO_IP, option)
+            sockd.setsockopt(socket.IPPROTO_IP, option,
+                             getattr(socket, 'IP_PMTUDISC_DO', _IP_PMTUDISC_DO) if setting is None else setting)
+        except OSError:
+            return None
+        return previous
+
+    def _set_version(self, version):
+        """Switch the connection to a header version and size what depends on it."""
+        self.version = version
+        self._header_size = HEADER_SIZE_V2 if version == VERSION_2 else HEADER_SIZE
+        # Sequence numbers in use: 2 for alternating-bit, SEQ_SPACE otherwise -
+        # the extended header always counts modulo 2^32
+        if version == VERSION_2:
+            self.seq_modulo = SEQ_SPACE_V2
+        else:
+            self.seq_modulo = 2 if self.window_size == 1 else SEQ_SPACE
+        # Pipelined modes report the cumulative ACK, Selective Repeat also a SACK bitmap
+        # of the rest of the receive window
+        self._sack_len = 0 if self.window_size == 1 else \
+            _seq_bytes(self.seq_modulo) + ((self.window_size - 1 + 7) // 8 if self.mode == SELECTIVE_REPEAT else 0)
+        self._ack_buf = bytearray(self._header_size + self._sack_len)  # Reused for every ACK sent
+        self._flow_ack_buf = bytearray(self._header_size + 4 + self._sack_len)  # ... that advertises a window
+
+    def _dump_stats(self, path):
+        """Append the statistics of this connection to [path] as one line of JSON."""
+        try:
+            with open(path, 'a') as fobj:
+                fobj.write(json.dumps(self.info()) + '\n')
+        except OSError as err_msg:
+            print("Stats dump error: ", err_msg)
+
+    def _transmit(self, msg):
+        """Send the next DATA packet carrying [msg] and start its timer.
+
+        Input argument: the message, at most the connection's payload size
+        Return  -> size of data sent, -1 on error
+        Note: it does not catch any exception
+        """
+        # Version 2 DATA tells the peer we read advertised windows
+        snd_pkt = _make_data(self._send_seq_num, msg, self.version, flags=FLAG_WINDOW)
+        wire_pkt = snd_pkt
+        if self._ack_due is not None:
+            if self.version == VERSION_2:
+                # Let the ACK ride on this packet - retransmissions go without it
+                wire_pkt = _make_data(self._send_seq_num, msg, VERSION_2, self._take_ack(),
+                                      FLAG_WINDOW if self._peer_flow else 0)
+            else:
+                self._send_ack()
+        sent_len = _udt_send(self.listener.sockd, self.peer_addr, wire_pkt)
+        if sent_len < 0:
+            return -1
+        self._pacer.consume(len(wire_pkt))
+        _log.debug("rdt_send(): Sent one message [%d] of size %d", self._send_seq_num, sent_len)
+        self.stats.data_sent += 1
+        self.stats.bytes_sent += len(msg)
+
+        # Keep packet until ACK-ed and start its timer
+        now = _clock()
+        self._unacked[self._send_seq_num] = _Pending(snd_pkt, now, self.rtt.rto)
+        if self.mode == GO_BACK_N and self._gbn_deadline is None:
+            self._gbn_deadline = now + self.rtt.rto
+        self._send_seq_num = (self._send_seq_num + 1) % self.seq_modulo
+        return sent_len
+
+    def _finish(self):
+        """Mark the connection closed, detach it from its listener and dump its statistics."""
+        self.closed = True
+        self.listener._remove(self)
+        if _stats_path:
+            self._dump_stats(_stats_path)
+
+    def _linger_time(self):
+        """Return how long close() waits for the peer to go quiet.
+
+        The peer backs its timer off exponentially while our ACKs get lost, so
+        a short RTO alone would stop listening before its next retransmission.
+        """
+        return max(TWAIT, TWAIT_RTO * self.rtt.base_rto)
+
+    def _send_fin(self):
+        """Send a FIN carrying the next sequence number.
+
+        Note: it does not catch any exception
+        """
+        _log.debug("rdt: Send FIN %d to %s", self._send_seq_num, self.peer_addr)
+        _udt_send(self.listener.sockd, self.peer_addr, _make_packet(TYPE_FIN, self._send_seq_num, b'', self.version))
+
+    def _wait(self, timeout):
+        """Drive the listener until a packet for this connection arrives.
+
+        Input argument: the max waiting time (None = no limit)
+        Return  -> True if a packet arrived in time, False otherwise
+        Note: it does not catch any exception
+        """
+        end = None if timeout is None else _clock() + timeout
+        while True:
+            remaining = None if end is None else end - _clock()
+            if remaining is not None and remaining <= 0:
+                return False
+            if self in self.listener._poll(remaining):
+                return True
+
+    # Protocol procedures
+    #
+    # The exchanges of several packets - messages, files, path probing and the
+    # closing handshake - are generators that decide what to do next and yield
+    # a step for each send, receive or wait (_STEP_*), then take its outcome.
+    # _run() carries the steps out here, and AsyncRdtSocket._run() awaits them,
+    # so both transports share one implementation of each procedure.
+
+    def _run(self, steps):
+        """Carry out the steps of a protocol procedure until it returns.
+
+        Input argument: the generator of the procedure, such as _sendfile_steps()
+        Return  -> the return value of the procedure
+        Note: an exception raised by a step is raised in the procedure, at the
+        step; the procedure's own exceptions are not caught
+        """
+        outcome, error = None, None
+        while True:
+            try:
+                step = steps.send(outcome) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            try:
+                outcome, error = self._step(step), None
+            except BaseException as err:
+                outcome, error = None, err
+            step = None  # Keeps no slice of the procedure's buffers, which it may release next
+
+    def _step(self, step):
+        """Carry out one step of a protocol procedure and return its outcome.
+
+        Note: it does not catch any exception
+        """
+        kind = step[0]
+        if kind == _STEP_SEND:
+            return self.send(step[1])
+        if kind == _STEP_RECV:
+            return self.recv(MAX_PAYLOAD)  # Whole payloads, whatever the peer's payload size
+        if kind == _STEP_WAIT:
+            return self._wait(step[1])
+        return step[1](*step[2])
+
+    def _sendmsg_steps(self, buf):
+        """Procedure of sendmsg()."""
+        view = memoryview(buf).cast('B')
+        first, sent = _message_start(view, self.payload)
+        if (yield _STEP_SEND, first) < 0:
+            return -1
+        while sent < len(view):
+            osize = yield _STEP_SEND, view[sent:sent + self.payload]
+            if osize < 0:
+                return -1
+            sent += osize
+        return len(view)
+
+    def _recvmsg_steps(self, length):
+        """Procedure of recvmsg()."""
+        rmsg = yield _STEP_RECV,
+        if rmsg == b'':
+            return None
+        try:
+            message = _Message(rmsg, length)
+            self._message = message
+            while not message.complete():
+                if len(self._recv_buffer) == 0:
+                    if self._peer_fin:
+                        return None
+                    yield _STEP_WAIT, None  # _handle_data() fills the message in the meantime
+                    continue
+                rmsg = yield _STEP_RECV,
+                if rmsg == b'':
+                    return None
+                message.add(rmsg)
+            return message.result()
+        except ValueError as err_msg:
+            print("Receive message error: ", err_msg)
+            return None
+        finally:
+            self._message = None
+
+    def _sendfile_steps(self, path, callback):
+        """Procedure of sendfile()."""
+        try:
+            fobj = open(path, 'rb')
+        except OSError as err_msg:
+            print("Open file error: ", err_msg)
+            return -1
+        with fobj:
+            filelength = os.fstat(fobj.fileno()).st_size
+            offer = _codecs
+            if (yield _STEP_SEND, _make_offer(filelength, offer)) < 0 \
+                    or (yield _STEP_SEND, os.path.basename(path).encode('utf-8')) < 0:
+                return -1
+            answer = _parse_answer((yield _STEP_RECV,), filelength, offer)
+            if answer is None:
+                print("Send file error: peer cannot store the file")
+                return -1
+            offset, block, codec = answer
+            try:
+                mapped, view = _map_file(fobj, filelength)
+            except (OSError, ValueError) as err_msg:
+                print("Map file error: ", err_msg)
+                return -1
+            try:
+                sent = 0
+                if offset:
+                    digests = bytearray()
+                    while len(digests) < offset // block * DIGEST_SIZE:
+                        rmsg = yield _STEP_RECV,
+                        if rmsg == b'':
+                            return -1
+                        digests += rmsg
+                    sent = _verified_prefix(view, digests, block)
+                    if (yield _STEP_SEND, b'FROM %d' % sent) < 0:
+                        return -1
+                    _log.info("rdt: Resume %s at byte %d of %d", path, sent, filelength)
+                compressor = _Compressor(codec, self.payload, self.stats) if codec else None
+                while sent < filelength:
+                    if compressor is None:
+                        osize = yield _STEP_SEND, view[sent:sent + self.payload]
+                    else:
+                        chunk, osize = compressor.chunk(view, sent)
+                        if (yield _STEP_SEND, chunk) < 0:
+                            osize = -1
+                    if osize < 0:
+                        return -1
+                    sent += osize
+                    if callback:
+                        callback(sent, filelength)
+            finally:
+                _unmap_file(mapped, view)
+        return filelength
+
+    def _recvfile_steps(self, directory, callback, writer=None):
+        """Procedure of recvfile(), with the optional writer of AsyncRdtSocket.recvfile()."""
+        rmsg = yield _STEP_RECV,
+        offer = _parse_offer(rmsg)
+        if offer is None:
+            print("Receive file error: bad file size", rmsg)
+            return None
+        filelength, codec = offer
+        accept = b' ' + codec.encode('ascii') if codec else b''
+        rmsg = yield _STEP_RECV,
+        if rmsg == b'':
+            return None
+        try:
+            fobj, path, checkpoint = _open_resumable(directory, rmsg.decode('utf-8', 'replace'), filelength)
+            digests = _file_digests(fobj, checkpoint.offset)
+        except OSError as err_msg:
+            print("Open file error: ", err_msg)
+            yield _STEP_SEND, b'ERROR'
+            return None
+        with fobj:
+            received = 0
+            if checkpoint.offset:
+                if (yield _STEP_SEND, b'RESUME %d %d' % (checkpoint.offset, RESUME_BLOCK) + accept) < 0:
+                    return None
+                for index in range(0, len(digests), self.payload):
+                    if (yield _STEP_SEND, digests[index:index + self.payload]) < 0:
+                        return None
+                received = _parse_start((yield _STEP_RECV,), checkpoint.offset)
+                if received is None:
+                    print("Receive file error: peer did not accept the resume offset")
+                    return None
+                _log.info("rdt: Resume %s at byte %d of %d", path, received, filelength)
+            elif (yield _STEP_SEND, b'OKAY' + accept) < 0:
+                return None
+            try:
+                if received < checkpoint.offset:
+                    checkpoint.save(fobj, received)
+                fobj.seek(received)
+                try:
+                    while received < filelength:
+                        rmsg = yield _STEP_RECV,
+                        if rmsg == b'':
+                            return None
+                        if codec:
+                            rmsg = _decompress_chunk(codec, rmsg, self.stats)
+                            if rmsg is None or received + len(rmsg) > filelength:
+                                print("Receive file error: bad compressed chunk")
+                                return None
+                        if writer is None:
+                            received += fobj.write(rmsg)
+                            checkpoint.update(fobj, received)
+                        else:
+                            yield _STEP_CALL, writer.write, (fobj, rmsg, received)
+                            received += len(rmsg)
+                            offset = checkpoint.due(received)
+                            if offset is not None:
+                                # Only what has reached the file may be recorded as stored
+                                yield _STEP_CALL, writer.drain, ()
+                                yield _STEP_CALL, writer.call, (checkpoint.save, fobj, offset)
+                        if callback:
+                            callback(received, filelength)
+                finally:
+                    # The file must not be closed under a pending write
+                    if writer is not None:
+                        yield _STEP_CALL, writer.drain, ()
+            except OSError as err_msg:
+                print("Write file error: ", err_msg)
+                return None
+        checkpoint.remove()
+        return path
+
+    def _probe_payload_steps(self, max_payload):
+        """Procedure of probe_payload()."""
+        fragmentation = self._forbid_fragmentation()
+        good = 0
+        try:
+            # Sizes up to [low] pass (or lie below the search), sizes from [high] do not
+            low, high = min(MIN_PAYLOAD, max_payload) - 1, min(max_payload, MAX_PAYLOAD) + 1
+            size = high - 1
+            while size > low:
+                if (yield from self._probe_steps(size)):
+                    good = low = size
+                else:
+                    high = size
+                if high - low <= PROBE_RESOLUTION:
+                    break
+                size = (low + high) // 2
+        except socket.error as err_msg:
+            print("Probe error: ", err_msg)
+        finally:
+            if fragmentation is not None:
+                self._forbid_fragmentation(fragmentation)
+        if good:
+            self.payload = good
+            _log.info("rdt: Path to %s takes a payload of %d bytes", self.peer_addr, good)
+        else:
+            _log.info("rdt: No probe answered by %s, payload stays %d bytes", self.peer_addr, self.payload)
+        return self.payload
+
+    def _probe_steps(self, size):
+        """Check if a packet with a payload of [size] bytes reaches the peer.
+
+        Return  -> True if the peer answered one of the PROBE_TRIES probes
+        Note: it does not catch any exception other than EMSGSIZE
+        """
+        for _ in range(PROBE_TRIES):
+            probe_id = self._send_probe(size)
+            if probe_id is None:
+                return False
+            end = _clock() + self.rtt.rto
+            while probe_id not in self._probe_acks:
+                remaining = end - _clock()
+                if remaining <= 0 or not (yield _STEP_WAIT, remaining):
+                    break
+            if self._probe_acks.pop(probe_id, None) == size:
+                return True
+        return False
+
+    def _close_steps(self):
+        """Procedure of close(), up to detaching the connection.
+
+        Note: it does not catch any exception
+        """
+        listener = self.listener
+        self._closing = True
+        if self._ack_due is not None and not listener.transport_lost:
+            self._send_ack()
+        # Wait for every pipelined packet to be acknowledged
+        while self._unacked and not listener.transport_lost:
+            yield _STEP_WAIT, None
+        if listener.transport_lost:
+            return
+        if not (yield from self._shutdown_steps()):
+            # Wait for TWAIT time, re-ACK-ing any retransmitted DATA
+            linger = self._linger_time()
+            while not listener.transport_lost and (yield _STEP_WAIT, linger):
+                # The peer is still retransmitting, so our ACKs got lost and its
+                # timer is backing off - listen twice as long for the next one
+                linger = max(linger, min(2 * linger, 2 * MAX_RTO))
+        _log.info("rdt_close(): time to CLOSE!!! %s", self.peer_addr)
+
+    def _shutdown_steps(self):
+        """Exchange FIN and FIN-ACK with the peer once all our DATA is acknowledged.
+
+        Return  -> True if the peer took part, False if it never answered our
+        FIN nor sent its own (a peer that predates them)
+        Note: it does not catch any exception
+        """
+        rto = self.rtt.rto
+        for _ in range(FIN_TRIES):
+            self._send_fin()
+            if (yield from self._wait_for_steps(lambda: self._fin_acked, rto)):
+                break
+            rto = min(2 * rto, MAX_RTO)
+        else:
+            # A peer that sent FIN has nothing left for us to ACK - its answer was lost
+            return self._peer_fin
+        if self._peer_fin:
+            return True
+        # The peer answers FIN, so it will send its own once its DATA is acknowledged -
+        # wait for it while the peer retransmits, however far its timer has backed off
+        linger = max(self._linger_time(), 2 * MAX_RTO)
+        while not self._peer_fin and (yield _STEP_WAIT, linger):
+            pass
+        if self._peer_fin:
+            # We answered the last FIN - stay for a repeat in case the FIN-ACK got lost
+            while (yield _STEP_WAIT, FIN_LINGER_RTO * self.rtt.rto):
+                pass
+        return True
+
+    def _wait_for_steps(self, condition, timeout):
+        """Wait until condition() holds.
+
+        Input arguments: a function without arguments and the max waiting time
+        Return  -> True if the condition holds in time, False otherwise
+        """
+        end = _clock() + timeout
+        while not condition():
+            remaining = end - _clock()
+            if remaining <= 0 or self.listener.transport_lost:
+                return False
+            yield _STEP_WAIT, remaining
+        return True
+
+    def _in_window(self, seq_num, base, size):
+        """Check if a sequence number falls in a window.
+
+        Input arguments: sequence number, window base and window size
+        Return  -> True if seq_num is one of base, base + 1, ..., base + size - 1
+        (modulo the sequence number space)
+        """
+        return (seq_num - base) % self.seq_modulo < size
+
+    def _send_window(self):
+        """Return how many packets may be in flight: the window size, or less if
+        congestion control or the peer's advertised receive window says so."""
+        window = self.window_size if self.cc is None else self.cc.window()
+        if self._peer_window is not None:
+            # Always one packet, whose retransmissions probe a closed window
+            window = min(window, max(1, self._peer_window // self.payload))
+        return window
+
+    def _flow_limited(self):
+        """Check if the peer's advertised receive window, not our own window, holds the sender back."""
+        if self._peer_window is None:
+            return False
+        return self._peer_window // self.payload < (self.window_size if self.cc is None else self.cc.window())
+
+    def _pacing_rate(self):
+        """Return the rate (bytes/s) the pacer lets DATA out at, None when DATA is not paced.
+
+        A window of packets is spread over 1 / PACING_GAIN of the smoothed
+        round trip (1 / PACING_GAIN_SLOW_START in slow start, so that the
+        window can still double). Stop-and-wait is never paced, nor is
+        anything before the first RTT sample.
+        """
+        window = self._send_window()
+        if not _pacing or self.window_size == 1 or window <= 1 or not self.rtt.srtt:
+            return None
+        gain = PACING_GAIN_SLOW_START if self.cc is not None and self.cc.phase == SLOW_START else PACING_GAIN
+        return gain * window * (self.payload + self._header_size) / self.rtt.srtt
+
+    def _pacing_delay(self, nbytes):
+        """Return how long new DATA with [nbytes] of payload must wait for the pacer, 0 to send it now."""
+        rate = self._pacing_rate()
+        if rate is None:
+            return 0.0
+        return self._pacer.delay(nbytes + self._header_size, rate, (self.payload + self._header_size) * PACING_BURST)
+
+    def _update_peer_window(self, window):
+        """Take the receive window an ACK advertises.
+
+        Input argument: the window in bytes, None if the ACK carried none
+        Return  -> True if the window grew
+        """
+        if window is None:
+            return False
+        opened = self._peer_window is not None and window > self._peer_window
+        self._peer_window = window
+        return opened
+
+    def _window_used(self):
+        """Return the number of sequence numbers between send base and next sequence number."""
+        return (self._send_seq_num - self._send_base) % self.seq_modulo
+
+    def _next_deadline(self):
+        """Return the earliest pending retransmission or delayed-ACK deadline, None if there is none."""
+        deadline = self._ack_deadline
+        if self._unacked:
+            if self.mode == GO_BACK_N:
+                retransmit = self._gbn_deadline
+            else:
+                retransmit = min(pending.deadline for pending in self._unacked.values())
+            if deadline is None or (retransmit is not None and retransmit < deadline):
+                deadline = retransmit
+        return deadline
+
+    def _handle_packet(self, pkt):
+        """Process a packet received from the peer.
+
+        Input argument: the _Packet record of the received packet
+        Note: it does not catch any exception
+        """
+        self.stats.packets_received += 1
+        if pkt.corrupt:
+            _log.debug("rdt: Drop corrupted packet")
+            self.stats.corrupt_drops += 1
+            return
+        if pkt.msg_type == TYPE_PROBE:
+            # Report how much of the probe arrived
+            _udt_send(self.listener.sockd, self.peer_addr,
+                      _make_packet(TYPE_PROBE_ACK, pkt.seq_num, len(pkt.payload).to_bytes(4, 'big'), VERSION_2))
+            return
+        if pkt.msg_type == TYPE_PROBE_ACK:
+            self._probe_acks[pkt.seq_num] = int.from_bytes(pkt.payload, 'big')
+            return
+        if pkt.version != self.version:
+            if self.stats.data_sent or self.stats.data_received:
+                _log.debug("rdt: Drop packet of header version %d", pkt.version)
+                return
+            # Nothing exchanged yet - talk the way the peer does
+            _log.info("rdt: Peer %s uses header version %d", self.peer_addr, pkt.version)
+            self._set_version(pkt.version)
+        if pkt.flags & FLAG_WINDOW:
+            self._peer_flow = True
+        if pkt.msg_type == TYPE_ACK:
+            cum_ack, sacked = _parse_sack(pkt.payload, self.seq_modulo)
+            # A window update is no duplicate
+            self._handle_ack(pkt.seq_num, cum_ack, sacked, pure=not self._update_peer_window(pkt.window))
+        elif pkt.msg_type == TYPE_DATA:
+            if pkt.ack is not None:
+                self._update_peer_window(pkt.window)
+                cum_ack, sacked = _parse_sack(pkt.ack[1], self.seq_modulo)
+                self._handle_ack(pkt.ack[0], cum_ack, sacked, pure=False)
+            self._handle_data(pkt.seq_num, pkt.payload)
+        elif pkt.msg_type == TYPE_FIN:
+            # Only a FIN that follows all the peer's DATA ends its stream
+            if pkt.seq_num != self._recv_seq_num:
+                _log.debug("rdt: Drop FIN %d, expecting %d", pkt.seq_num, self._recv_seq_num)
+                return
+            if self._ack_due is not None:
+                self._send_ack()
+            _log.debug("rdt: Received FIN %d, send FIN-ACK", pkt.seq_num)
+            self._peer_fin = True
+            _udt_send(self.listener.sockd, self.peer_addr, _make_packet(TYPE_FIN_ACK, pkt.seq_num, b'', self.version))
+        elif pkt.msg_type == TYPE_FIN_ACK:
+            if pkt.seq_num == self._send_seq_num and not self._unacked:
+                self._fin_acked = True
+        else:
+            _log.debug("rdt: Drop packet of unknown type %d", pkt.msg_type)
+
+    def _handle_ack(self, ack_num, cum_ack=None, sacked=(), pure=True):
+        """Slide the send window on receiving ACK [ack_num].
+
+        Input arguments: the acknowledged sequence number, when the peer
+        sends them, its cumulative ACK and the sequence numbers it holds
+        beyond, and whether the ACK came alone (not piggybacked on DATA)
+        Go-Back-N treats the ACK as cumulative, Selective Repeat as individual
+        and also drops every packet the cumulative and selective ACKs cover.
+        An ACK packet that leaves the send base in place is a duplicate;
+        DUPACK_THRESHOLD duplicates in a row trigger a fast retransmit. As in
+        TCP, piggybacked ACKs never count as duplicates.
+        """
+        self.stats.acks_received += 1
+        old_base = self._send_base
+        outstanding = len(self._unacked)
+        if ack_num in self._unacked:
+            _log.debug("rdt: Received expected ACK [%d]!", ack_num)
+            # Measure RTT, unless the ACK may belong to a retransmission
+            pending = self._unacked[ack_num]
+            if not pending.retransmitted:
+                rtt = _clock() - pending.sent_at
+                self.rtt.sample(rtt)
+                self.stats.record_rtt(rtt)
+            else:
+                self.rtt.on_progress()
+            if self.mode == GO_BACK_N:
+                # Everything up to and including ack_num has arrived
+                while self._send_base != (ack_num + 1) % self.seq_modulo:
+                    self.stats.record_acked(len(self._unacked.pop(self._send_base).packet) - self._header_size)
+                    self._send_base = (self._send_base + 1) % self.seq_modulo
+                # Restart timer for the remaining packets, stop it if none left
+                self._gbn_deadline = _clock() + self.rtt.rto if self._unacked else None
+            else:
+                self.stats.record_acked(len(self._unacked.pop(ack_num).packet) - self._header_size)
+        else:  # Duplicate or stale ACK
+            _log.debug("rdt: Ignore unexpected ACK [%d] | Send window [%d, %d)",
+                       ack_num, self._send_base, self._send_seq_num)
+            self.stats.stale_acks += 1
+
+        if self.mode == SELECTIVE_REPEAT and cum_ack is not None:
+            # Packets the peer already holds never need to be re-sent
+            for seq_num in self._covered(cum_ack, sacked):
+                self.stats.record_acked(len(self._unacked.pop(seq_num).packet) - self._header_size)
+                self.stats.sacked += 1
+        # Move send base to the oldest unacknowledged packet
+        while self._send_base != self._send_seq_num and self._send_base not in self._unacked:
+            self._send_base = (self._send_base + 1) % self.seq_modulo
+
+        if self._send_base != old_base and self.mode == SELECTIVE_REPEAT and self._unacked:
+            # The queue is draining: give the new send base a full timeout from
+            # now (RFC 6298, 5.3), as it may have left long after the burst it went with
+            pending = self._unacked[self._send_base]
+            pending.deadline = max(pending.deadline, _clock() + self.rtt.rto)
+        if self.cc is not None and len(self._unacked) < outstanding:
+            self.cc.on_ack(outstanding - len(self._unacked), self.rtt.srtt)
+
+        # Count duplicate ACKs: the peer is still waiting for the send base
+        if cum_ack is None and self.mode == GO_BACK_N:
+            cum_ack = (ack_num + 1) % self.seq_modulo  # A Go-Back-N ACK is cumulative
+        if self._send_base != old_base or not self._unacked or self.window_size == 1:
+            self._dupacks = 0
+        elif pure and cum_ack == self._send_base:
+            self._dupacks += 1
+            self.stats.duplicate_acks += 1
+            if self._dupacks >= DUPACK_THRESHOLD:
+                self._fast_retransmit(sacked)
+
+    def _covered(self, cum_ack, sacked):
+        """Return the unacknowledged sequence numbers a cumulative and selective ACK cover.
+
+        Input arguments: the cumulative ACK and the sequence numbers held beyond it
+        An ACK whose cumulative ACK lies outside the send window is stale and covers nothing.
+        """
+        below = (cum_ack - self._send_base) % self.seq_modulo
+        if below > self._window_used():
+            return []
+        covered = [(self._send_base + i) % self.seq_modulo for i in range(below)]
+        covered += sacked
+        return [seq_num for seq_num in covered if seq_num in self._unacked]
+
+    def _fast_retransmit(self, sacked):
+        """Re-send the packets that duplicate ACKs show to be lost, without waiting for the timer.
+
+        Input argument: the sequence numbers the peer reported to hold
+        Go-Back-N re-sends the whole window, once per loss. Selective Repeat
+        re-sends the send base and every gap below the highest SACK-ed packet,
+        each at most once; packets lost again are left to the timer. The
+        timeout is not backed off.
+        Note: it does not catch any exception
+        """
+        now = _clock()
+        rto = self.rtt.rto
+        if self.mode == GO_BACK_N:
+            if self._dupacks != DUPACK_THRESHOLD:
+                return
+            lost = [(self._send_base + i) % self.seq_modulo for i in range(self._window_used())]
+            self._gbn_deadline = now + rto
+        else:
+            reach = max([(seq_num - self._send_base) % self.seq_modulo for seq_num in sacked], default=0)
+            lost = [seq_num for seq_num, pending in self._unacked.items() if not pending.retransmitted
+                    and (seq_num == self._send_base or (seq_num - self._send_base) % self.seq_modulo < reach)]
+        if lost:
+            self._congestion_event(self._send_base, timeout=False)
+        self.stats.retransmissions += len(lost)
+        self.stats.fast_retransmissions += len(lost)
+        for seq_num in lost:
+            _log.info("! FAST RETRANSMIT ! Re-send DATA [%d] after %d duplicate ACKs", seq_num, self._dupacks)
+            pending = self._unacked[seq_num]
+            pending.deadline = now + rto
+            pending.retransmitted = True
+            _udt_send(self.listener.sockd, self.peer_addr, pending.packet)
+
+    def _handle_data(self, seq_num, payload):
+        """Accept DATA [seq_num] from the peer and acknowledge it.
+
+        Input arguments: sequence number and payload of the DATA packet
+        In-order payloads are queued in the receive buffer for recv(), or go
+        straight into the message recvmsg() is waiting for once nothing is
+        queued ahead of them. The payload is a view of the datagram buffer,
+        copied only when kept. DATA
+        the receive buffer has no room for is dropped unacknowledged. While
+        the listener reads a batch of datagrams, the ACK of in-order DATA is
+        held back until the batch ends or the next DATA arrives, so one ACK
+        answers two packets; a lost ACK then costs no more than two packets'
+        worth of acknowledgement (like TCP's every-second-segment rule).
+        Version 2 connections may also delay it for outgoing DATA to carry,
+        see _may_delay_ack(). Anything else is acknowledged at once.
+        Note: it does not catch any exception
+        """
+        stats = self.stats
+        buffer = self._recv_buffer
+        stats.data_received += 1
+        if seq_num == self._recv_seq_num:
+            message = self._message
+            if message is not None and len(buffer) == 0 and message.takes(len(payload)):
+                message.add(payload)
+            elif not buffer.has_room(len(payload)):
+                _log.debug("rdt: Receive buffer full, drop DATA [%d]", seq_num)
+                stats.budget_drops += 1
+                return
+            else:
+                buffer.push(bytes(payload))
+            _log.debug("rdt: Received expected DATA [%d] of size %d", seq_num, len(payload))
+            stats.record_delivered(len(payload))
+            # Release any buffered packets that are now in order
+            self._recv_seq_num, released = buffer.release((seq_num + 1) % self.seq_modulo, self.seq_modulo)
+            for data in released:
+                stats.record_delivered(len(data))
+            ack_num = seq_num
+            if self._ack_due is None and (self.listener._defer_acks or self._may_delay_ack()):
+                self._ack_due = ack_num
+                if self.listener._defer_acks:
+                    self.listener._acks_due.append(self)
+                else:
+                    self._ack_deadline = _clock() + DELAYED_ACK
+                return
+        elif self.mode == GO_BACK_N:
+            # Out of order - discard and re-ACK the last in-order packet
+            ack_num = (self._recv_seq_num - 1) % self.seq_modulo
+            _log.debug("rdt: Discard DATA [%d] | Expecting [%d], re-send ACK [%d]",
+                       seq_num, self._recv_seq_num, ack_num)
+            stats.discarded_data += 1
+        elif self._in_window(seq_num, self._recv_seq_num, self.window_size):
+            # Selective Repeat: buffer the out-of-order packet
+            if seq_num in buffer:
+                stats.duplicate_data += 1
+            elif buffer.has_room(len(payload)):
+                _log.debug("rdt: Buffer out-of-order DATA [%d] | Expecting [%d]", seq_num, self._recv_seq_num)
+                buffer.hold(seq_num, bytes(payload))
+                stats.buffered_data += 1
+            else:
+                _log.debug("rdt: Receive buffer full, drop DATA [%d]", seq_num)
+                stats.budget_drops += 1
+                return
+            ack_num = seq_num
+        elif self._in_window(seq_num, self._recv_seq_num - self.window_size, self.window_size):
+            # Already delivered - its ACK must have been lost
+            _log.debug("rdt: Duplicate DATA [%d] | Re-send ACK [%d]", seq_num, seq_num)
+            stats.duplicate_data += 1
+            ack_num = seq_num
+        else:
+            _log.debug("rdt: Ignore DATA [%d] outside receive window", seq_num)
+            stats.discarded_data += 1
+            return
+        if self._ack_due is not None:
+            stats.acks_coalesced += 1  # This ACK reports the held-back one too
+        self._ack_due = ack_num
+        self._send_ack()
+
+    def _send_ack(self):
+        """Send the ACK that is due, carrying the current cumulative and selective ACK.
+
+        Note: it does not catch any exception
+        """
+        ack_num, self._ack_due, self._ack_deadline = self._ack_due, None, None
+        window = self._advertise()
+        _udt_send(self.listener.sockd, self.peer_addr,
+                  _make_ack(ack_num, self._ack_buf if window is None else self._flow_ack_buf, self._current_sack(),
+                            self.version, window))
+        self.stats.acks_sent += 1
+
+    def _take_ack(self):
+        """Return the ACK that is due as a block for outgoing DATA to carry."""
+        ack_num, self._ack_due, self._ack_deadline = self._ack_due, None, None
+        self.stats.acks_piggybacked += 1
+        return _make_ack_block(ack_num, self._current_sack(), self._advertise())
+
+    def _advertise(self):
+        """Return the receive window for the next ACK to carry, None if the peer does not read it."""
+        if not self._peer_flow:
+            return None
+        self._adv_window = self._advertised_window()
+        return self._adv_window
+
+    def _advertised_window(self):
+        """Return how many more payload bytes the peer may have in flight.
+
+        The receive budget bounds what is held for the application, and this
+        connection's share of the kernel receive buffer (SO_RCVBUF) what may
+        arrive at once: beyond either, datagrams would be dropped.
+        """
+        window = self._recv_buffer.budget - self._recv_buffer.used
+        rcvbuf = self.listener.rcvbuf
+        if rcvbuf:
+            window = min(window, rcvbuf // RCVBUF_OVERHEAD // max(1, len(self.listener._conns)))
+        return max(0, window)
+
+    def _window_update(self):
+        """Tell the peer the receive window has opened, after the application took a payload.
+
+        Once the window the peer was last told of is below half of what it can
+        use, and the window now is not, the peer is sent a window update - an
+        ACK of the last in-order DATA - as it may be waiting for nothing else.
+        Note: it does not catch any exception
+        """
+        if self._adv_window is None or self._peer_fin:
+            return
+        threshold = min(self._recv_buffer.budget, self.window_size * self.payload) // 2
+        if self._adv_window < threshold <= self._advertised_window():
+            if self._ack_due is None:
+                self._ack_due = (self._recv_seq_num - 1) % self.seq_modulo
+            self.stats.window_updates += 1
+            self._send_ack()
+
+    def _current_sack(self):
+        """Return the cumulative and selective ACK of the receive window, b'' in stop-and-wait mode."""
+        if not self._sack_len:
+            return b''
+        return _make_sack(self._recv_seq_num, self._recv_buffer.held(), self._sack_len - 1, self.seq_modulo)
+
+    def _may_delay_ack(self):
+        """Check if an ACK may wait up to DELAYED_ACK for outgoing DATA to carry it.
+
+        Only version 2 headers carry ACKs, and only while the application can
+        send: not when the send window is full, recvmsg() is waiting for the
+        rest of a message or the connection is closing. recv() sends the ACK
+        as soon as it has to wait for more DATA.
+        """
+        return DELAYED_ACK > 0 and self.version == VERSION_2 and not self._closing \
+            and self._message is None and self._window_used() < self._send_window()
+
+    def _release_ack(self):
+        """Deal with the ACK held back while the listener read a batch of
+        datagrams: send it now, or leave it to the delayed-ACK timer.
+
+        Note: it does not catch any exception
+        """
+        if self._ack_due is None or self.closed:
+            return
+        if not self._may_delay_ack():
+            self._send_ack()
+        elif self._ack_deadline is None:
+            self._ack_deadline = _clock() + DELAYED_ACK
+
+    def _congestion_event(self, seq_num, timeout):
+        """Tell congestion control that DATA [seq_num] was lost.
+
+        Input arguments: the sequence number and whether its timer expired
+        (otherwise duplicate ACKs reported it)
+        The window shrinks once per flight: losses of packets sent before the
+        last decrease belong to the same congestion event.
+        """
+        if self.cc is None or self._unacked[seq_num].sent_at < self._cc_reduced_at:
+            return
+        self._cc_reduced_at = _clock()
+        if timeout:
+            self.cc.on_timeout()
+        else:
+            self.cc.on_fast_retransmit(self._window_used())
+
+    def _retransmit(self):
+        """Re-send outstanding packets whose retransmission timer has expired,
+        and send a delayed ACK whose time is up.
+
+        Note: it does not catch any exception
+        """
+        now = _clock()
+        if self._ack_deadline is not None and now >= self._ack_deadline:
+            self._send_ack()
+        if self.mode == GO_BACK_N:
+            if self._gbn_deadline is None or now < self._gbn_deadline:
+                return
+            expired = [(self._send_base + i) % self.seq_modulo for i in range(self._window_used())]
+        else:
+            expired = [seq_num for seq_num, pending in self._unacked.items() if now >= pending.deadline]
+        if not expired:
+            return
+
+        # Back off when the oldest packet times out, like TCP's single timer;
+        # other Selective Repeat timers expiring alongside it do not count
+        if self._send_base in expired:
+            self.rtt.on_timeout()
+            self._congestion_event(self._send_base, timeout=True)
+        rto = self.rtt.rto
+        if self.mode == GO_BACK_N:
+            self._gbn_deadline = now + rto
+        self.stats.timeouts += 1
+        self.stats.retransmissions += len(expired)
+        for seq_num in expired:
+            _log.info("! TIMEOUT ! Re-send DATA [%d] | RTO now %.3f s", seq_num, rto)
+            pending = self._unacked[seq_num]
+            pending.deadline = now + rto
+            pending.retransmitted = True
+            _udt_send(self.listener.sockd, self.peer_addr, pending.packet)
+
+
+class RdtListener:
+    """Serve any number of RDT connections on one bound UDP socket.
+
+    Datagrams are demultiplexed by source address. A valid DATA packet from an
+    unknown address opens a new connection, which accept() hands to the
+    application; connect() opens one to a known peer. Whichever connection is
+    blocked in send(), recv() or close() drives the listener, so the timers
+    and incoming packets of every connection keep being served.
+
+    The socket is made non-blocking and watched with a selector (epoll on
+    Linux). Each wakeup reads every queued datagram, up to DRAIN_LIMIT, and
+    the ACKs of in-order DATA in the batch go out once it has been read.
+    Socket buffers are sized by rdt_buffer_init().
+
+    Connections opened by peers get the listener's window size and mode -
+    those set by rdt_window_init() when the listener is created, unless it
+    is given its own. Only DATA within that window can open one.
+    Note: raises ValueError for an invalid window size or mode
+    """
 
-def rdt_send(sockd, byte_msg):
-    """Application calls this function to transmit a message to
-    the remote peer through the RDT socket.
+    def __init__(self, sockd, accept_new=True, window_size=None, mode=None):
+        window_size = _window_size if window_size is None else int(window_size)
+        mode = _arq_mode if mode is None else mode
+        problem = _check_window(window_size, mode)
+        if problem:
+            raise ValueError(problem)
+        self.sockd = sockd
+        self.accept_new = accept_new  # Open connections for unknown peers
+        self.window_size = window_size  # Window size and mode of the connections peers open
+        self.mode = mode
+        self._conns = {}  # {peer address: RdtSocket}
+        self._accept_queue = []  # New connections not yet accept()-ed
+        self._refused = {}  # {peer address: time until which its packets are dropped}
+        self._rx_buf = bytearray(65535)  # Every datagram is received into this - any UDP size fits
+        self._rx_view = memoryview(self._rx_buf)
+        self._defer_acks = False  # Set while a batch of datagrams is read
+        self._acks_due = []  # Connections with an ACK held back for the end of the batch
+        self._selector = None  # Readiness of a real socket - in-memory ones wait by themselves
+        self.transport_lost = False  # The asyncio transport has gone, or abort() was called - nothing more is awaited
+        self.rcvbuf = None  # Kernel receive buffer size granted, None for in-memory sockets
+        if sockd is not None:
+            sockd.setblocking(False)
+            if not hasattr(sockd, 'wait_readable'):
+                self.rcvbuf = _set_buffers(sockd, _rcvbuf, _sndbuf)
+                self._selector = selectors.DefaultSelector()
+                self._selector.register(sockd, selectors.EVENT_READ)
+
+    def connect(self, peer_ip, port, window_size=None, mode=None, congestion=None, version=None, payload=None):
+        """Open a connection to a remote peer.
+
+        Input arguments: peer's IP address and port number, optional window
+        size, mode, congestion control, header version and payload size
+        (defaults are those set by rdt_window_init(), rdt_congestion_init()
+        and rdt_packet_init())
+        Return  -> the RdtSocket object on success, None on error
+        """
+        window_size = _window_size if window_size is None else int(window_size)
+        mode = _arq_mode if mode is None else mode
+        problem = _check_window(window_size, mode) or _check_packet(version, payload)
+        if congestion is not None and congestion not in CONGESTION_CONTROLS:
+            problem = "unknown congestion control %s" % congestion
+        if problem:
+            print("Connect error: " + problem)
+            return None
+        try:
+            peer_addr = _resolve_addr(peer_ip, port)
+        except socket.error as err_msg:
+            print("Connect error: ", err_msg)
+            return None
+        return self._add(peer_addr, window_size, mode, congestion, version, payload)
 
-    Input arguments: RDT socket object and the message bytes object
-    Return  -> size of data sent on success, -1 on error
+    def accept(self, timeout=None):
+        """Wait for a new peer to start a conversation.
 
-    Note: Make sure the data sent is not longer than the maximum PAYLOAD
-    length. Catch any known error and report to the user.
+        Input argument: the max waiting time (None = no limit)
+        Return  -> the new RdtSocket object, None on timeout or error
+        """
+        end = None if timeout is None else _clock() + timeout
+        try:
+            while len(self._accept_queue) == 0:
+                remaining = None if end is None else end - _clock()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._poll(remaining)
+        except socket.error as err_msg:
+            print("Accept error: ", err_msg)
+            return None
+        return self._accept_queue.pop(0)
+
+    def connections(self):
+        """Return the list of open connections."""
+        return list(self._conns.values())
+
+    def close(self):
+        """Close every open connection, then the UDP socket."""
+        for conn in self.connections():
+            conn.close()
+        self._release()
+        try:
+            self.sockd.close()
+        except socket.error as err_msg:
+            print("Socket close error: ", err_msg)
+
+    def abort(self):
+        """Give up every connection - safe to call from another thread.
+
+        A send() waiting for the window to open returns -1, and close() returns
+        without waiting for ACKs or the FIN exchange, at the next packet or
+        retransmission timeout. The UDP socket stays open until close().
+        """
+        self.transport_lost = True
+
+    def _release(self):
+        """Close the selector that waits on the UDP socket, leaving the socket open."""
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+
+    def _add(self, peer_addr, window_size=None, mode=None, congestion=None, version=None, payload=None):
+        """Register a connection for [peer_addr] and return it."""
+        conn = RdtSocket(self, peer_addr, window_size, mode, congestion, version, payload)
+        self._conns[peer_addr] = conn
+        return conn
+
+    def _refuse(self, peer_addr):
+        """Drop the packets of [peer_addr] until it has been quiet for REFUSE_QUIET,
+        so that a peer still sending to a connection forgotten without the
+        closing exchange cannot open a new one with its retransmissions."""
+        now = _clock()
+        self._refused = {addr: until for addr, until in self._refused.items() if until > now}
+        self._refused[peer_addr] = now + REFUSE_QUIET
+
+    def _remove(self, conn):
+        """Forget a closed connection."""
+        if self._conns.get(conn.peer_addr) is conn:
+            del self._conns[conn.peer_addr]
+        if conn in self._accept_queue:
+            self._accept_queue.remove(conn)
+
+    def _poll(self, timeout):
+        """Wait for datagrams and hand them to their connections, then service
+        the retransmission timers of every connection.
+
+        Input argument: the max waiting time (None = no limit)
+        Return  -> the set of connections that received a datagram (empty if
+        nothing arrived)
+        Note: returns early when a retransmission timer expires.
+        It does not catch any exception.
+        """
+        wait = timeout
+        deadlines = [conn._next_deadline() for conn in self._conns.values()]
+        deadlines = [deadline for deadline in deadlines if deadline is not None]
+        if deadlines:
+            wait = max(0.0, min(deadlines) - _clock())
+            if timeout is not None:
+                wait = min(wait, timeout)
+
+        ready = set()
+        if self._wait_readable(wait):
+            ready = self._drain()
+
+        for each in list(self._conns.values()):
+            each._retransmit()
+        return ready
+
+    def _wait_readable(self, timeout):
+        """Wait until a datagram can be received.
+
+        Input argument: the max waiting time (None = no limit)
+        Return  -> True if a datagram is ready, False on timeout
+        Note: it does not catch any exception
+        """
+        if self._selector is None:
+            return _wait_readable(self.sockd, timeout)
+        return bool(self._selector.select(timeout))
+
+    def _drain(self):
+        """Read and dispatch every queued datagram, at most DRAIN_LIMIT, then
+        send the ACKs the batch made due.
+
+        Return  -> the set of connections that received a datagram
+        Note: each datagram is handled before the next is read, so the one
+        receive buffer serves the whole batch. It does not catch any exception.
+        """
+        ready = set()
+        self._defer_acks = True
+        try:
+            for _ in range(DRAIN_LIMIT):
+                try:
+                    nbytes, peer_addr = _udt_recv(self.sockd, self._rx_buf)
+                except BlockingIOError:
+                    break
+                conn = self._dispatch(_parse(self._rx_view[:nbytes]), peer_addr)
+                if conn is not None:
+                    ready.add(conn)
+        finally:
+            self._defer_acks = False
+            acks_due, self._acks_due = self._acks_due, []
+            for conn in acks_due:
+                conn._release_ack()
+        return ready
+
+    def _dispatch(self, pkt, peer_addr):
+        """Hand a parsed datagram to the connection of its sender.
+
+        Return  -> that connection, None if the datagram was dropped
+        """
+        if _tracer is not None:
+            _tracer.received(pkt, peer_addr)
+        conn = self._conns.get(peer_addr)
+        if conn is None:
+            if peer_addr in self._refused:
+                now = _clock()
+                if now < self._refused[peer_addr]:
+                    # Still sending to a dropped connection - refuse it until it gives up
+                    self._refused[peer_addr] = now + REFUSE_QUIET
+                    return None
+                del self._refused[peer_addr]
+            if pkt.msg_type == TYPE_FIN and not pkt.corrupt:
+                # The connection has already closed - our FIN-ACK must have been lost
+                _udt_send(self.sockd, peer_addr, _make_packet(TYPE_FIN_ACK, pkt.seq_num, b'', pkt.version))
+                return None
+            if not (self.accept_new and self._is_opening(pkt)):
+                _log.debug("rdt: Drop packet from unknown peer %s", peer_addr)
+                return None
+            _log.info("rdt: New connection from %s", peer_addr)
+            conn = self._add(peer_addr, self.window_size, self.mode)
+            self._accept_queue.append(conn)
+        conn._handle_packet(pkt)
+        return conn
+
+    def _is_opening(self, pkt):
+        """Check if a packet from an unknown peer can start a conversation:
+        an intact DATA packet from the first window of sequence numbers of the
+        connections this listener accepts, or a path probe sent before it."""
+        if pkt.corrupt:
+            return False
+        return pkt.msg_type == TYPE_PROBE or (pkt.msg_type == TYPE_DATA and pkt.seq_num < self.window_size)
+
+
+def _default_connection(sockd):
+    """Return the connection the rdt_*() functions use on [sockd], creating it on first use.
+
+    It only talks to the peer set by rdt_peer().
+    """
+    global _default_conn
+    if _default_conn is None or _default_conn.listener.sockd is not sockd:
+        _drop_default_connection()
+        _default_conn = RdtListener(sockd, accept_new=False)._add(_peeraddr)
+    return _default_conn
+
+
+def _drop_default_connection():
+    """Forget the connection the rdt_*() functions use, and release the
+    selector of its listener - the socket itself belongs to the application."""
+    global _default_conn
+    if _default_conn is not None:
+        _default_conn.listener._release()
+        _default_conn = None
+
+
+# These are the functions used by application
+
+def rdt_network_init(drop_rate, err_rate, seed=None):
+    """Application calls this function to set properties of underlying network.
+
+    Input arguments: packet drop probability, packet corruption probability and
+    an optional seed that makes the simulated losses reproducible
+    Note: rdt3_channel offers richer simulated channels (delay, reordering, ...)
+    """
+    _rng.seed(seed)
+    global _LOSS_RATE, _ERR_RATE
+    _LOSS_RATE = float(drop_rate)
+    _ERR_RATE = float(err_rate)
+    print("Drop rate:", _LOSS_RATE, "\tError rate:", _ERR_RATE)
+
+
+def rdt_window_init(window_size, mode=SELECTIVE_REPEAT):
+    """Application calls this function to choose the transmission mode.
+
+    Input arguments: window size and pipelining mode (GO_BACK_N or SELECTIVE_REPEAT)
+    Return  -> 0 on success, -1 on error
+
+    Note: a window size of 1 gives the stop-and-wait (alternating-bit) protocol
+    whatever the mode. Both peers must use the same window size and mode.
+    The setting applies to connections created afterwards.
+    """
+    global _window_size, _arq_mode
+    window_size = int(window_size)
+    problem = _check_window(window_size, mode)
+    if problem:
+        print("Window init error: " + problem)
+        return -1
+    _window_size = window_size
+    _arq_mode = mode
+    print("Window size:", _window_size, "\tMode:", _arq_mode if window_size > 1 else "stop-and-wait")
+    return 0
+
+
+def rdt_packet_init(version, payload=None):
+    """Application calls this function to choose the packet format.
+
+    Input arguments: header version (VERSION_1 or VERSION_2) and optional
+    payload size in bytes (at most MAX_PAYLOAD)
+    Return  -> 0 on success, -1 on error
+
+    Note: VERSION_1 is the original header and the default. VERSION_2 numbers
+    packets with 32 bits and puts every field in network byte order; a peer
+    accepting the connection answers in the version it receives. The payload
+    size only bounds what is sent - any peer receives datagrams of any size.
+    The setting applies to connections created afterwards.
+    """
+    global _header_version, PAYLOAD
+    problem = _check_packet(version, payload)
+    if problem:
+        print("Packet init error: " + problem)
+        return -1
+    _header_version = version
+    if payload is not None:
+        PAYLOAD = payload
+    print("Header version:", _header_version, "\tPayload:", PAYLOAD)
+    return 0
+
+
+def rdt_congestion_init(algorithm):
+    """Application calls this function to choose the congestion control of
+    pipelined connections (window size > 1).
+
+    Input argument: 'reno' (the default), 'cubic' or 'none'
+    Return  -> 0 on success, -1 on error
+    """
+    global _cc_algorithm
+    if algorithm not in CONGESTION_CONTROLS:
+        print("Congestion control init error: unknown algorithm %s, choose from %s"
+              % (algorithm, ", ".join(CONGESTION_CONTROLS)))
+        return -1
+    _cc_algorithm = algorithm
+    print("Congestion control:", _cc_algorithm)
+    return 0
+
+
+def rdt_compress_init(codecs):
+    """Application calls this function to compress the files it transfers.
+
+    Input argument: comma-separated codec names in order of preference, from
+    'zlib' and 'lzma', or 'none' (the default)
+    Return  -> 0 on success, -1 on error
+
+    Note: rdt_sendfile() offers these codecs and rdt_recvfile() accepts them;
+    a file is compressed only if the receiver accepts one the sender offers,
+    so both peers must call this. The file is compressed in chunks that fit
+    in one packet, and chunks that do not shrink are sent as they are. Do not
+    offer codecs to a receiver built before compression - it cannot parse the offer.
+    """
+    global _codecs
+    names = [name.strip() for name in str(codecs).split(',') if name.strip() not in ('', 'none')]
+    unknown = [name for name in names if name not in COMPRESSORS]
+    if unknown:
+        print("Compression init error: unknown codec %s, choose from %s"
+              % (", ".join(unknown), ", ".join(COMPRESSORS)))
+        return -1
+    _codecs = tuple(names)
+    print("Compression:", ", ".join(_codecs) or "none")
+    return 0
+
+
+def rdt_buffer_init(rcvbuf, sndbuf=None, budget=None):
+    """Application calls this function to size the kernel buffers of the UDP
+    sockets, so that bursts of datagrams are not dropped before they are read,
+    and the receive buffer of each connection.
+
+    Input arguments: SO_RCVBUF and SO_SNDBUF sizes in bytes (0 = system
+    default; sndbuf defaults to rcvbuf) and the optional max payload bytes a
+    connection holds for the application (default RECV_BUDGET)
+    Return  -> 0 on success, -1 on error
+
+    Note: the socket buffer sizes are requested when a listener takes a
+    socket, and the system may grant less. The default request is
+    SOCK_BUFFER. The budget applies to connections created afterwards.
+    """
+    global _rcvbuf, _sndbuf, _recv_budget
+    sndbuf = rcvbuf if sndbuf is None else sndbuf
+    if rcvbuf < 0 or sndbuf < 0:
+        print("Buffer init error: sizes must not be negative")
+        return -1
+    if budget is not None and budget < 1:
+        print("Buffer init error: the receive budget must be positive")
+        return -1
+    _rcvbuf, _sndbuf = rcvbuf, sndbuf
+    if budget is not None:
+        _recv_budget = budget
+    print("Receive buffer:", _rcvbuf or "default", "\tSend buffer:", _sndbuf or "default",
+          "\tReceive budget:", _recv_budget)
+    return 0
+
+
+def rdt_pacing_init(enabled):
+    """Application calls this function to turn the pacing of pipelined senders on or off.
+
+    Input argument: True to spread each window of DATA over the round trip
+    (the default), False to send as fast as the window allows
+    Note: the advertised receive window is kept either way.
+    """
+    global _pacing
+    _pacing = bool(enabled)
+    print("Pacing:", "on" if _pacing else "off")
+
+
+def rdt_log_init(level=logging.DEBUG):
+    """Application calls this function to see protocol events on stderr.
+
+    Input argument: logging level - logging.DEBUG for every packet,
+    logging.INFO for timeouts and connection events only
+    """
+    _log.setLevel(level)
+    if not any(isinstance(handler, logging.StreamHandler) for handler in _log.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(relativeCreated)10.3f ms  %(message)s'))
+        _log.addHandler(handler)
+
+
+def rdt_stats_init(path):
+    """Application calls this function to have the statistics of every
+    connection appended to a file, one JSON object per line, when it closes.
+
+    Input argument: file path, None to stop dumping
     """
-    global PAYLOAD, __peeraddr, __data_buffer, HEADER_SIZE, __send_seq_num, __last_ack_no
+    global _stats_path
+    _stats_path = path
+
 
-    # Ensure data not longer than max PAYLOAD
-    msg = __cut_msg(byte_msg)
+def rdt_trace_init(path):
+    """Application calls this function to record every packet it sends or
+    receives in a binary trace file, for analyze-trace.py.
 
-    # Make data packet
-    snd_pkt = __make_data(__send_seq_num, msg)  # Make PKT 0
-    # print("rdt_send(): Sending DATA -> " + str(struct.unpack(MSG_FORMAT, snd_pkt)))
+    Input argument: file path - records are appended - or None to stop tracing
+    Return  -> 0 on success, -1 on error
 
-    # Try to send packet
+    Note: each record is TRACE_FORMAT, written through a buffer, so the
+    file is complete once tracing stops or the program exits.
+    """
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+    if path is None:
+        return 0
     try:
-        sent_len = __udt_send(sockd, __peeraddr, snd_pkt)
-    except socket.error as err_msg:
-        print("Socket send error: ", err_msg)
+        _tracer = _Tracer(path)
+    except OSError as err_msg:
+        print("Trace init error: ", err_msg)
         return -1
-    print("rdt_send(): Sent one message [%d] of size %d --> " % (__send_seq_num, sent_len)
-          + str(__unpack_helper(snd_pkt)[0]))
-
-    r_sock_list = [sockd]  # Used in select.select()
-    recv_expected = False  # Received expected response or not
-    while not recv_expected:  # While not received expected ACK
-        # Wait for ACK or timeout
-        r, _, _ = select.select(r_sock_list, [], [], TIMEOUT)
-        if r:  # ACK (or DATA) came
-            for sock in r:
-                # Try to receive ACK (or DATA)
-                try:
-                    recv_msg = __udt_recv(sock, PAYLOAD + HEADER_SIZE)  # Add header size
-                except socket.error as err_msg:
-                    print("__udt_recv error: ", err_msg)
-                    return -1
-                # If corrupted or undesired ACK, keep waiting
-                if __is_corrupt(recv_msg) or __is_ack(recv_msg, 1 - __send_seq_num):
-                    print("rdt_send(): recv [corrupt] OR unexpected [ACK %d] | Keep waiting for ACK [%d]"
-                          % (1-__send_seq_num, __send_seq_num))
-                # Happily received expected ACK
-                elif __is_ack(recv_msg, __send_seq_num):
-                    print("rdt_send(): Received expected ACK [%d]!" % __send_seq_num)
-                    __send_seq_num ^= 1  # Flip sequence number
-                    return sent_len - HEADER_SIZE  # Return size of data sent (payload only)
-                # Received *complete* DATA while waiting for ACK
-                else:
-                    print("rdt_send(): recv DATA ?! -buffer-> " + str(__unpack_helper(recv_msg)[0]))
-                    if recv_msg not in __data_buffer:  # If not in buffer, add msg to buffer
-                        __data_buffer.append(recv_msg)
-                    # Try to ACK the received DATA
-                    (_, data_seq_num, _, _), _ = __unpack_helper(recv_msg)
-                    try:
-                        __udt_send(sockd, __peeraddr, __make_ack(data_seq_num))
-                    except socket.error as err_msg:
-                        print("rdt_send(): Error in sending ACK to received data: " + str(err_msg))
-                        return -1
-                    # Update last ack-ed number
-                    __last_ack_no = data_seq_num
-                    print("rdt_send(): ACK DATA [%d]" % data_seq_num)
+    return 0
 
-        else:  # Timeout
-            print("! TIMEOUT !")
-            # Re-transmit packet
-            try:
-                sent_len = __udt_send(sockd, __peeraddr, snd_pkt)
-            except socket.error as err_msg:
-                print("Socket send error: ", err_msg)
-                return -1
-            (_), payload = __unpack_helper(snd_pkt)
-            # print("rdt_send(): Re-sent one message [%d] of size %d --> " % (__send_seq_num, sent_len) + str(payload))
-            print("rdt_send(): Re-sent one message [%d] of size %d -> " % (__send_seq_num, sent_len)
-                  + str(__unpack_helper(snd_pkt)[0]))
 
+def rdt_clock_init(clock=None):
+    """Application calls this function to run the protocol on another clock,
+    such as the VirtualClock of rdt3_channel.
 
-def __make_ack(seq_num):
-    """Make ACK [seq_num].
+    Input argument: function returning the current time in seconds, None
+    to go back to time.monotonic
+    Note: the protocol only reads the clock; while it waits for packets, the
+    sockets it waits on must let the clock reach its deadlines. A virtual
+    clock is advanced by the in-memory sockets of rdt3_channel.
+    """
+    global _clock
+    _clock = time.monotonic if clock is None else clock
 
-    Input argument: sequence number
-    Return  -> assembled ACK packet
+
+def rdt_socket():
+    """Application calls this function to create the RDT socket.
+
+    Null input.
+    Return the Unix socket object on success, None on error
+
+    Note: Catch any known error and report to the user.
     """
-    global TYPE_ACK, MSG_FORMAT
-    # print("making ACK " + str(seq_num))
+    # Your implementation
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    except socket.error as err_msg:
+        print("Socket creation error: ", err_msg)
+        return None
+    return sock
 
-    # Header
-    # {
-    # __Type        (1 byte)
-    # __Seq num     (1 byte)
-    # __Checksum    (2 bytes)
-    # __Payload len (2 bytes)
-    # __Payload
-    # }
 
-    # Make initial message
-    msg_format = struct.Struct(MSG_FORMAT)
-    checksum = 0  # First set checksum to 0
-    init_msg = msg_format.pack(TYPE_ACK, seq_num, checksum, socket.htons(0)) + b''
+def rdt_bind(sockd, port):
+    """Application calls this function to specify the port number
+    used by itself and assigns them to the RDT socket.
+
+    Input arguments: RDT socket object and port number
+    Return	-> 0 on success, -1 on error
+
+    Note: Catch any known error and report to the user.
+    """
+    # Your implementation
+    try:
+        sockd.bind(("", port))
+    except socket.error as err_msg:
+        print("Socket bind error: ", err_msg)
+        return -1
+    return 0
+
+
+def rdt_peer(peer_ip, port):
+    """Application calls this function to specify the IP address
+    and port number used by remote peer process.
+
+    Input arguments: peer's IP address and port number
+    Return  -> 0 on success, -1 on error
+    """
+    # Your implementation
+    global _peeraddr
+    try:
+        _peeraddr = _resolve_addr(peer_ip, port)
+    except socket.error as err_msg:
+        print("Peer address error: ", err_msg)
+        return -1
+    _drop_default_connection()  # Start a new conversation with this peer
+    return 0
 
-    # Calculate checksum
-    checksum = __int_chksum(bytearray(init_msg))
-    # print("checksum = ", checksum)
 
-    # A complete msg with checksum
-    return msg_format.pack(TYPE_ACK, seq_num, checksum, socket.htons(0)) + b''
+def rdt_send(sockd, byte_msg):
+    """Application calls this function to transmit a message to
+    the remote peer through the RDT socket.
+
+    Input arguments: RDT socket object and the message bytes object
+    Return  -> size of data sent on success, -1 on error
+
+    Note: Make sure the data sent is not longer than the maximum PAYLOAD
+    length - rdt_sendmsg() takes messages of any size. Catch any known
+    error and report to the user.
+    """
+    return _default_connection(sockd).send(byte_msg)
 
 
 def rdt_recv(sockd, length):
@@ -419,114 +3138,118 @@ def rdt_recv(sockd, length):
     the message. Upon receiving a message from the underlying UDT layer,
     the function returns immediately.
 
-    Input arguments: RDT socket object and the size of the message to
-    received.
+    Input arguments: RDT socket object and the max size of the message to
+    be received - the rest of a longer message is returned by the next calls
     Return  -> the received bytes message object on success, b'' on error
 
     Note: Catch any known error and report to the user.
     """
-    global __peeraddr, __data_buffer, __recv_seq_num, HEADER_SIZE, __last_ack_no
+    return _default_connection(sockd).recv(length)
 
-    # Check if something in buffer
-    while len(__data_buffer) > 0:
-        # Pop data in a FIFO manner
-        recv_pkt = __data_buffer.pop(0)  # Guaranteed to be NOT corrupt, and already ACK-ed in rdt_send()
-        print("rdt_recv(): <!> Something in buffer! -> " + str(__unpack_helper(recv_pkt)[0]))
-        if __has_seq(recv_pkt, __recv_seq_num):  # Buffered data has expected seq num, happily accept and return
-            print("rdt_recv(): Received expected buffer DATA [%d] of size %d" % (__recv_seq_num, len(recv_pkt)))
-            __recv_seq_num ^= 1  # Flip seq num
-            return __unpack_helper(recv_pkt)[1]
-
-    recv_expected_data = False
-    while not recv_expected_data:  # Repeat until received expected DATA
-        # Try to receive packet...
-        try:
-            recv_pkt = __udt_recv(sockd, length + HEADER_SIZE)
-        except socket.error as err_msg:
-            print("rdt_recv(): Socket receive error: " + str(err_msg))
-            return b''
 
-        # If packet is corrupt or has wrong seq num, send old ACK
-        if __is_corrupt(recv_pkt) or __has_seq(recv_pkt, 1-__recv_seq_num):
-            print("rdt_recv(): Received [corrupted] or [wrong seq_num (%d)] -> " % (1-__recv_seq_num)
-                  + str(__unpack_helper(recv_pkt)[0]) + "Keep expecting seq [%d]" % __recv_seq_num)
-            print("----corrupt? => " + str(__is_corrupt(recv_pkt)))
-            # Send old ACK
-            snd_ack = __make_ack(1-__recv_seq_num)
-            try:
-                __udt_send(sockd, __peeraddr, snd_ack)
-            except socket.error as err_msg:
-                print("rdt_recv(): Error in ACK-ing corrupt/wrong data packet: " + str(err_msg))
-                return b''
-            __last_ack_no = 1-__recv_seq_num  # Update last ACK-ed number
-            print("rdt_recv(): Sent old ACK [%d]" % (1-__recv_seq_num))
-        # If received DATA with *expected* seq num, send ACK
-        elif __has_seq(recv_pkt, __recv_seq_num):
-            (_), payload = __unpack_helper(recv_pkt)  # Extract payload
-            # print(("rdt_recv(): Received expected DATA [%d] -> " % __recv_seq_num) + str(payload))
-            print(("rdt_recv(): Received expected DATA [%d] of size %d" % (__recv_seq_num, len(recv_pkt))))
-            # Send right ACK
-            try:
-                __udt_send(sockd, __peeraddr, __make_ack(__recv_seq_num))
-            except socket.error as err_msg:
-                print("rdt_recv(): Error in ACK-ing expected data: " + str(err_msg))
-                return b''
-            print("rdt_recv(): Sent expected ACK [%d]" % __recv_seq_num)
-            __last_ack_no = __recv_seq_num  # Record last ACK number
-            __recv_seq_num ^= 1  # Flip seq num
-            return payload
+def rdt_sendmsg(sockd, buf):
+    """Application calls this function to transmit a message of any size
+    to the remote peer, which receives it whole with rdt_recvmsg().
 
+    Input arguments: RDT socket object and the message (bytes-like object)
+    Return  -> size of the message on success, -1 on error
+    """
+    return _default_connection(sockd).sendmsg(buf)
 
-def __is_data(recv_pkt, seq_num):
-    """Check if the received packet is DATA [seq_num]
 
-    Input arguments: the received packet, sequence number
+def rdt_recvmsg(sockd, length):
+    """Application calls this function to wait for a whole message sent by
+    the remote peer with rdt_sendmsg().
 
-    Return  -> True if so; False otherwise.
+    Input arguments: RDT socket object and the size of the largest message
+    accepted
+    Return  -> the message as a bytearray on success, None on error or once
+    the peer has closed
     """
-    global TYPE_DATA
-    (pkt_type, pkt_seq, _, _), _ = __unpack_helper(recv_pkt)
-    return pkt_type == TYPE_DATA and pkt_seq == seq_num
+    return _default_connection(sockd).recvmsg(length)
 
 
-def rdt_close(sockd):
-    """Application calls this function to close the RDT socket.
+def show_progress(label):
+    """Return a progress callback for rdt_sendfile() and rdt_recvfile() that
+    prints at every 10% of the file.
+
+    Input argument: the name printed in front of the progress
+    """
+    shown = [-1]
+
+    def progress(done, total):
+        step = done * 10 // total if total else 10
+        if step != shown[0]:
+            shown[0] = step
+            print("---- %s progress: %d / %d" % (label, done, total))
+    return progress
+
+
+def rdt_sendfile(sockd, path, callback=None):
+    """Application calls this function to transmit a file to the peer's rdt_recvfile().
+
+    Input arguments: RDT socket object, path of the file and an optional
+    progress callback called as callback(bytes sent, file size)
+    Return  -> size of the file on success, -1 on error
+    """
+    return _default_connection(sockd).sendfile(path, callback)
+
+
+def rdt_recvfile(sockd, directory, callback=None):
+    """Application calls this function to receive a file sent by rdt_sendfile().
+
+    Input arguments: RDT socket object, directory to store the file in and an
+    optional progress callback called as callback(bytes received, file size)
+    Return  -> path of the stored file on success, None on error
+    Note: if an earlier transfer of the same file was interrupted, it resumes
+    from the last checkpoint instead of starting again from byte zero.
+    """
+    return _default_connection(sockd).recvfile(directory, callback)
+
+
+def rdt_probe(sockd, max_payload=MAX_PAYLOAD):
+    """Application calls this function to use the largest payload size the
+    path to the peer delivers without IP fragmentation.
+
+    Input arguments: RDT socket object and the largest payload size to try
+    Return  -> the payload size in use afterwards
+
+    Note: call it before sending; see RdtSocket.probe_payload().
+    """
+    return _default_connection(sockd).probe_payload(max_payload)
+
+
+def rdt_rtt(sockd):
+    """Application calls this function to inspect the round-trip time estimate
+    of the RDT socket.
 
     Input argument: RDT socket object
+    Return  -> dictionary with srtt, rttvar, rto (seconds), backoff, samples and timeouts
+    """
+    return _default_connection(sockd).rtt.info()
 
-    Note: (1) Catch any known error and report to the user.
-    (2) Before closing the RDT socket, the reliable layer needs to wait for TWAIT
-    time units before closing the socket.
+
+def rdt_stats(sockd):
+    """Application calls this function to read the statistics of the RDT socket.
+
+    Input argument: RDT socket object
+    Return  -> dictionary of packet counters, ACK round-trip histogram,
+    goodput per GOODPUT_INTERVAL (bytes/s) and the RTT estimate
     """
-    global __last_ack_no
+    return _default_connection(sockd).info()
+
 
-    r_sock_list = [sockd]  # Used in select.select()
+def rdt_close(sockd):
+    """Application calls this function to close the RDT socket.
 
-    ok_to_close = False  # If has been quiet for a while
+    Input argument: RDT socket object
 
-    while not ok_to_close:
-        r, _, _ = select.select(r_sock_list, [], [], TWAIT)  # Wait for TWAIT time
-        if r:  # Incoming activity
-            for sock in r:
-                # Try to receive
-                try:
-                    recv_pkt = __udt_recv(sock, PAYLOAD + HEADER_SIZE)  # Add header size
-                except socket.error as err_msg:
-                    print("rdt_close(): __udt_recv error: ", err_msg)
-                print("rdt_close(): Got activity -> " + str(__unpack_helper(recv_pkt)[0]))
-                # If not corrupt and is DATA [last_ack_num]
-                if not __is_corrupt(recv_pkt) and __is_data(recv_pkt, __last_ack_no):
-                    # Ack the DATA packet
-                    try:
-                        __udt_send(sockd, __peeraddr, __make_ack(__last_ack_no))
-                    except socket.error as err_msg:
-                        print("rdt_close(): Error in ACK-ing data: " + str(err_msg))
-                    print("rdt_close(): Sent last ACK[%d]" % __recv_seq_num)
-        else:  # Timeout!
-            print("rdt_close(): time to CLOSE!!!")
-            ok_to_close = True
-            # Close socket
-            try:
-                sockd.close()
-            except socket.error as err_msg:
-                print("Socket close error: ", err_msg)
+    Note: (1) Catch any known error and report to the user.
+    (2) Before closing the RDT socket, the reliable layer exchanges FIN and
+    FIN-ACK with the peer; only a peer that does not answer FIN makes it wait
+    for TWAIT time units before closing the socket.
+    """
+    global _default_conn
+    # Close the connection, then the selector of its listener and the socket
+    _default_connection(sockd).listener.close()
+    _default_conn = None
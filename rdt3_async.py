@@ -0,0 +1,398 @@
+#!/usr/bin/python3
+"""Asyncio transport for RDT3.0
+
+functions: open_listener()
+classes:   AsyncRdtListener - asyncio DatagramProtocol serving RDT connections on one UDP port
+           AsyncRdtSocket   - one RDT connection with awaitable send(), recv(), sendmsg(),
+                              recvmsg(), sendfile(), recvfile() and close()
+
+Packets, sequence numbers, windows and timeouts are those of rdt3, so an
+asyncio peer talks to a synchronous rdt3 peer unchanged. Settings made with
+rdt3.rdt_network_init() and rdt3.rdt_window_init() apply here as well.
+Instead of blocking in select(), incoming datagrams are handled by the event
+loop as they arrive and each connection keeps one loop timer armed for its
+earliest retransmission deadline, so one thread can run many transfers.
+Messages, files, path probing and the closing handshake run the protocol
+procedures of rdt3.RdtSocket, awaiting each of their steps on the loop.
+
+Example:
+    listener = await open_listener(rdt3.CPORT)
+    conn = await listener.connect('localhost', rdt3.SPORT)
+    await conn.send(b'hello')
+    await conn.close()
+    await listener.close()
+"""
+
+import asyncio
+import socket
+
+import rdt3
+from rdt3 import _log, _parse, _cut_msg, _check_window, _check_packet, _set_buffers, _STEP_SEND, _STEP_RECV, \
+    _STEP_WAIT
+
+
+class _TransportSocket:
+    """Present an asyncio datagram transport as the socket object rdt3 sends through."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def sendto(self, byte_msg, peer_addr):
+        # The transport queues what it cannot send at once and never reports a size
+        self.transport.sendto(byte_msg, peer_addr)
+        return len(byte_msg)
+
+    def getsockopt(self, *args):
+        return self.transport.get_extra_info('socket').getsockopt(*args)
+
+    def setsockopt(self, *args):
+        return self.transport.get_extra_info('socket').setsockopt(*args)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRdtSocket(rdt3.RdtSocket):
+    """One RDT connection driven by the asyncio event loop.
+
+    Create connections with AsyncRdtListener.connect() or AsyncRdtListener.accept().
+    """
+
+    def __init__(self, listener, peer_addr, window_size=None, mode=None, congestion=None, version=None,
+                 payload=None):
+        super().__init__(listener, peer_addr, window_size, mode, congestion, version, payload)
+        self._arrived = asyncio.Event()  # Set whenever a packet for this connection arrives
+        self._timer = None  # Loop timer of the next retransmission deadline
+
+    async def send(self, byte_msg):
+        """Transmit a message to the peer.
+
+        Input argument: the message bytes object
+        Return  -> size of data sent on success, -1 on error
+
+        Note: the message is cut to at most the connection's payload size. The
+        coroutine returns once the send window has room for another message;
+        in stop-and-wait mode that is when the message has been acknowledged.
+        """
+        msg = _cut_msg(byte_msg, self.payload)
+        # Wait for the pacer to let the packet go
+        delay = self._pacing_delay(len(msg))
+        if delay > 0:
+            self.stats.paced_packets += 1
+        while delay > 0:
+            if self.closed:
+                return -1
+            await self._wait_packet(delay)
+            delay = self._pacing_delay(len(msg))
+        try:
+            if self._transmit(msg) < 0:
+                return -1
+        except socket.error as err_msg:
+            print("Socket send error: ", err_msg)
+            return -1
+        self._arm_timer()
+
+        # Wait until the window can take another packet
+        if self._window_used() >= self._send_window() and self._flow_limited():
+            self.stats.window_limited += 1
+        while self._window_used() >= self._send_window():
+            if self.closed:
+                return -1
+            await self._wait_packet()
+        return len(msg)
+
+    async def recv(self, length):
+        """Wait for a message from the peer.
+
+        Input argument: the max size of the message to be received - the rest
+        of a longer payload is returned by the next calls, see rdt3.RdtSocket.recv()
+        Return  -> the received bytes message object on success, b'' on error
+        or once the peer has closed and every message has been collected
+        """
+        if length <= 0:
+            print("Receive error: invalid message size: ", length)
+            return b''
+        while len(self._recv_buffer) == 0:
+            if self.closed or self._peer_fin:
+                return b''
+            if self._ack_due is not None:
+                try:
+                    self._send_ack()  # No DATA is coming from us for it to ride on
+                except socket.error as err_msg:
+                    print("Socket send error: ", err_msg)
+            await self._wait_packet()
+        # Pop data in a FIFO manner
+        payload = self._recv_buffer.pop(length)
+        try:
+            self._window_update()
+        except socket.error as err_msg:
+            print("Socket send error: ", err_msg)
+        return payload
+
+    async def sendmsg(self, buf):
+        """Transmit a message of any size to the peer, like rdt3.RdtSocket.sendmsg().
+
+        Input argument: the message as a bytes-like object
+        Return  -> size of the message on success, -1 on error
+        """
+        return await self._run(self._sendmsg_steps(buf))
+
+    async def recvmsg(self, length):
+        """Wait for a whole message sent by the peer, like rdt3.RdtSocket.recvmsg().
+
+        Input argument: the size of the largest message accepted
+        Return  -> the message as a bytearray on success, None on error or
+        once the peer has closed
+        """
+        return await self._run(self._recvmsg_steps(length))
+
+    async def sendfile(self, path, callback=None):
+        """Transmit a file to the peer, like rdt3.RdtSocket.sendfile().
+
+        Input arguments: path of the file, optional progress callback
+        called as callback(bytes sent, file size) after every packet
+        Return  -> size of the file on success, -1 on error
+        """
+        return await self._run(self._sendfile_steps(path, callback))
+
+    async def recvfile(self, directory, callback=None, writer=None):
+        """Receive a file sent by the peer, like rdt3.RdtSocket.recvfile().
+
+        Input arguments: target directory, optional progress callback
+        called as callback(bytes received, file size) after every packet and
+        an optional writer that takes the disk writes off the event loop
+        Return  -> path of the stored file on success, None on error
+        Note: the writer provides the coroutines write(file object, data,
+        offset), which may return before the data is on disk, drain(), which
+        waits for every write so far, and call(function, *args), which runs a
+        blocking function such as an fsync. Its errors are OSError.
+        """
+        return await self._run(self._recvfile_steps(directory, callback, writer))
+
+    async def probe_payload(self, max_payload=rdt3.MAX_PAYLOAD):
+        """Find the largest payload the path to the peer delivers unfragmented,
+        like rdt3.RdtSocket.probe_payload().
+
+        Input argument: the largest payload size to try
+        Return  -> the payload size of the connection afterwards
+        """
+        return await self._run(self._probe_payload_steps(max_payload))
+
+    async def close(self):
+        """Finish the conversation with the peer.
+
+        Waits for all pipelined packets to be acknowledged, exchanges FIN and
+        FIN-ACK with the peer, or lingers until a peer that does not answer FIN
+        has been quiet, exactly like rdt3.RdtSocket.close().
+        """
+        if self.closed:
+            return
+        try:
+            await self._run(self._close_steps())
+        except socket.error as err_msg:
+            print("rdt_close(): Socket error: ", err_msg)
+        self._cancel_timer()
+        self._finish()
+
+    async def _run(self, steps):
+        """Carry out the steps of a protocol procedure, like rdt3.RdtSocket._run(),
+        awaiting each one on the event loop."""
+        outcome, error = None, None
+        while True:
+            try:
+                step = steps.send(outcome) if error is None else steps.throw(error)
+            except StopIteration as done:
+                return done.value
+            try:
+                outcome, error = await self._step(step), None
+            except BaseException as err:
+                outcome, error = None, err
+            step = None  # Keeps no slice of the procedure's buffers, which it may release next
+
+    async def _step(self, step):
+        """Carry out one step of a protocol procedure and return its outcome."""
+        kind = step[0]
+        if kind == _STEP_SEND:
+            return await self.send(step[1])
+        if kind == _STEP_RECV:
+            return await self.recv(rdt3.MAX_PAYLOAD)
+        if kind == _STEP_WAIT:
+            return await self._wait_packet(step[1])
+        return await step[1](*step[2])
+
+    async def _wait_packet(self, timeout=None):
+        """Wait until a packet for this connection arrives.
+
+        Input argument: the max waiting time (None = no limit)
+        Return  -> True if a packet arrived in time, False otherwise
+        """
+        self._arrived.clear()
+        try:
+            await asyncio.wait_for(self._arrived.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _arm_timer(self):
+        """(Re)schedule the loop timer for the earliest retransmission deadline."""
+        self._cancel_timer()
+        deadline = self._next_deadline()
+        if deadline is not None:
+            self._timer = self.listener.loop.call_later(max(0.0, deadline - rdt3._clock()),
+                                                        self._on_timer)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self):
+        """Retransmission timer callback: re-send expired packets and re-arm."""
+        self._timer = None
+        try:
+            self._retransmit()
+        except socket.error as err_msg:
+            print("Retransmission error: ", err_msg)
+        self._arm_timer()
+
+
+class AsyncRdtListener(rdt3.RdtListener, asyncio.DatagramProtocol):
+    """Serve any number of RDT connections on one UDP port from an asyncio event loop.
+
+    Datagrams are demultiplexed by source address as in rdt3.RdtListener: a
+    valid DATA packet from an unknown address opens a new connection, which
+    accept() hands to the application. Create listeners with open_listener().
+    """
+
+    def __init__(self, accept_new=True, window_size=None, mode=None):
+        # The transport takes the place of the UDP socket once the endpoint is up
+        super().__init__(None, accept_new, window_size, mode)
+        self.loop = asyncio.get_running_loop()
+        self._accepted = asyncio.Event()  # Set whenever a new connection is queued
+
+    async def connect(self, peer_ip, port, window_size=None, mode=None, congestion=None, version=None,
+                      payload=None):
+        """Open a connection to a remote peer.
+
+        Input arguments: peer's IP address and port number, optional window
+        size, mode, congestion control, header version and payload size
+        (defaults are those set by rdt3.rdt_window_init(),
+        rdt3.rdt_congestion_init() and rdt3.rdt_packet_init())
+        Return  -> the AsyncRdtSocket object on success, None on error
+        """
+        window_size = rdt3._window_size if window_size is None else int(window_size)
+        mode = rdt3._arq_mode if mode is None else mode
+        problem = _check_window(window_size, mode) or _check_packet(version, payload)
+        if congestion is not None and congestion not in rdt3.CONGESTION_CONTROLS:
+            problem = "unknown congestion control %s" % congestion
+        if problem:
+            print("Connect error: " + problem)
+            return None
+        try:
+            infos = await self.loop.getaddrinfo(peer_ip, port, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        except socket.error as err_msg:
+            print("Connect error: ", err_msg)
+            return None
+        return self._add(infos[0][4], window_size, mode, congestion, version, payload)
+
+    async def accept(self, timeout=None):
+        """Wait for a new peer to start a conversation.
+
+        Input argument: the max waiting time (None = no limit)
+        Return  -> the new AsyncRdtSocket object, None on timeout
+        """
+        end = None if timeout is None else self.loop.time() + timeout
+        while len(self._accept_queue) == 0:
+            if self.transport_lost:
+                return None
+            remaining = None if end is None else end - self.loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            self._accepted.clear()
+            try:
+                await asyncio.wait_for(self._accepted.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return self._accept_queue.pop(0)
+
+    async def close(self):
+        """Close every open connection, then the UDP endpoint."""
+        await asyncio.gather(*(conn.close() for conn in self.connections()))
+        if self.sockd is not None:
+            self.sockd.close()
+
+    # asyncio.DatagramProtocol callbacks
+
+    def connection_made(self, transport):
+        self.sockd = _TransportSocket(transport)
+        try:
+            self.rcvbuf = _set_buffers(transport.get_extra_info('socket'), rdt3._rcvbuf, rdt3._sndbuf)
+        except OSError as err_msg:
+            print("Socket buffer error: ", err_msg)
+
+    def datagram_received(self, data, addr):
+        queued = len(self._accept_queue)
+        conn = self._dispatch(_parse(memoryview(data)), addr[:2])
+        if len(self._accept_queue) > queued:
+            self._accepted.set()
+        if conn is not None:
+            conn._arrived.set()
+
+    def error_received(self, exc):
+        # UDP is unreliable anyway - the retransmission timers recover
+        _log.debug("rdt: Socket error %s", exc)
+
+    def connection_lost(self, exc):
+        self.transport_lost = True
+        # Wake up every waiting coroutine so that it can give up
+        self._accepted.set()
+        for conn in self.connections():
+            conn._cancel_timer()
+            conn.closed = True
+            conn._arrived.set()
+
+    # Connections
+
+    def _add(self, peer_addr, window_size=None, mode=None, congestion=None, version=None, payload=None):
+        """Register a connection for [peer_addr] and return it."""
+        conn = AsyncRdtSocket(self, peer_addr, window_size, mode, congestion, version, payload)
+        self._conns[peer_addr] = conn
+        return conn
+
+    def _dispatch(self, pkt, peer_addr):
+        """Hand a parsed datagram to the connection of its sender and re-arm its timer.
+
+        Return  -> that connection, None if the datagram was dropped
+        """
+        conn = super()._dispatch(pkt, peer_addr)
+        if conn is not None:
+            conn._arm_timer()
+        return conn
+
+    def _poll(self, timeout):
+        raise RuntimeError("AsyncRdtListener is driven by the event loop")
+
+
+async def open_listener(port=0, host='0.0.0.0', accept_new=True, window_size=None, mode=None):
+    """Application calls this coroutine to open an RDT endpoint on a UDP port.
+
+    Input arguments: port number (0 = any free port), local IP address,
+    whether unknown peers may open connections and the optional window size
+    and mode of those connections (default: set by rdt3.rdt_window_init())
+    Return  -> the AsyncRdtListener object on success, None on error
+    """
+    window_size = rdt3._window_size if window_size is None else int(window_size)
+    mode = rdt3._arq_mode if mode is None else mode
+    problem = _check_window(window_size, mode)
+    if problem:
+        print("Listener error: " + problem)
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        _, listener = await loop.create_datagram_endpoint(
+            lambda: AsyncRdtListener(accept_new, window_size, mode), local_addr=(host, port),
+            family=socket.AF_INET)
+    except socket.error as err_msg:
+        print("Socket bind error: ", err_msg)
+        return None
+    return listener
@@ -0,0 +1,399 @@
+#!/usr/bin/python3
+"""Simulated channels for RDT3.0
+
+functions: channel_pair()
+classes:   Channel        - one direction of a simulated link: delay, jitter, reordering,
+                            duplication, loss, corruption and a bandwidth cap with a queue
+           GilbertElliott - bursty two-state packet loss model
+           ChannelSocket  - in-memory datagram endpoint that rdt3 can use in place of a UDP socket
+           VirtualClock   - discrete-event clock that runs simulated peers faster than real time
+
+channel_pair() returns two connected ChannelSockets, so that both peers can run
+in one process (one thread each) without real sockets. Every random decision
+is drawn from the Channel's own seeded random.Random, so a run with the same
+seed and the same packets sees the same impairments. Use rdt_network_init(0, 0)
+to leave all impairments to the channels.
+
+With a VirtualClock, the endpoints and the protocol's timers run on
+simulated time: when every peer is waiting - for a packet in flight or for
+a timeout - the clock jumps to the earliest moment one of them wakes up, so
+the waiting takes no real time at all.
+
+Example:
+    client, server = channel_pair(Channel(delay=0.01, loss=0.05, seed=1),
+                                  Channel(delay=0.01, seed=2))
+    conn = rdt3.RdtListener(client).connect(*server.getsockname())
+
+    clock = VirtualClock()
+    client, server = channel_pair(Channel(delay=0.01, loss=0.2, seed=1), clock=clock)
+    sent, stored = clock.run(lambda: send_side(client), lambda: receive_side(server))
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+import rdt3
+from rdt3 import _corrupt, _log
+
+UDP_IP_HEADERS = 28  # IPv4 header without options and UDP header
+
+
+class GilbertElliott:
+    """Two-state Markov loss model.
+
+    The channel is either Good or Bad; it switches Good -> Bad with probability
+    p_bad and Bad -> Good with probability p_good before each packet, which is
+    then lost with probability loss_good or loss_bad. The mean burst length in
+    the Bad state is 1/p_good packets.
+    """
+
+    def __init__(self, p_bad=0.01, p_good=0.3, loss_good=0.0, loss_bad=1.0):
+        self.p_bad = p_bad
+        self.p_good = p_good
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    def lost(self, rng):
+        """Advance the state and decide if the next packet is lost.
+
+        Input argument: the random.Random object to draw from
+        Return  -> True if the packet is lost
+        """
+        if self.bad:
+            self.bad = rng.random() >= self.p_good
+        else:
+            self.bad = rng.random() < self.p_bad
+        return rng.random() < (self.loss_bad if self.bad else self.loss_good)
+
+
+class Channel:
+    """One direction of a simulated link.
+
+    Input arguments (all optional):
+      delay       - one-way propagation delay in seconds
+      jitter      - extra delay drawn uniformly from [0, jitter] for each packet
+      reorder     - probability that a packet is held back by reorder_delay
+                    more, so that later packets overtake it
+      reorder_delay - extra delay of a reordered packet (default: delay + 1 ms)
+      duplicate   - probability that a packet is delivered twice
+      loss        - probability that a packet is lost independently
+      burst_loss  - a GilbertElliott model for bursty loss (on top of [loss])
+      corrupt     - probability that one byte of a packet is damaged
+      bandwidth   - link rate in bytes per second (None = unlimited)
+      queue_limit - bytes that may wait for the link; packets beyond are dropped
+                    (None = unlimited)
+      mtu         - largest IP packet of the path; a datagram that does not fit
+                    with its IP and UDP headers is lost (None = unlimited)
+      seed        - seed of the channel's random decisions (None = system entropy)
+
+    Note: stop-and-wait (window size 1) numbers packets 0 and 1 only and relies
+    on the channel keeping packets in order - with jitter, reordering or
+    duplication a stale ACK can be taken for a new one.
+    """
+
+    def __init__(self, delay=0.0, jitter=0.0, reorder=0.0, reorder_delay=None, duplicate=0.0,
+                 loss=0.0, burst_loss=None, corrupt=0.0, bandwidth=None, queue_limit=None, mtu=None, seed=None):
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.reorder_delay = delay + 0.001 if reorder_delay is None else reorder_delay
+        self.duplicate = duplicate
+        self.loss = loss
+        self.burst_loss = burst_loss
+        self.corrupt = corrupt
+        self.bandwidth = bandwidth
+        self.queue_limit = queue_limit
+        self.mtu = mtu
+        self.rng = random.Random(seed)
+        self._link_free = 0.0  # When the link finishes sending the packets queued so far
+        self.counts = dict.fromkeys(('sent', 'lost', 'oversize', 'queue_drops', 'corrupted', 'duplicated',
+                                     'reordered', 'delivered'), 0)
+
+    def transmit(self, byte_msg, now):
+        """Pass a packet through the channel.
+
+        Input arguments: the packet and the time it is sent
+        Return  -> list of (arrival time, packet) pairs - empty if the packet is
+        lost, two entries if it is duplicated
+        """
+        rng = self.rng
+        self.counts['sent'] += 1
+        if self.mtu is not None and len(byte_msg) + UDP_IP_HEADERS > self.mtu:
+            self.counts['oversize'] += 1
+            _log.debug("channel: Packet of %d bytes exceeds the MTU", len(byte_msg))
+            return []
+        if (self.loss and rng.random() < self.loss) \
+                or (self.burst_loss is not None and self.burst_loss.lost(rng)):
+            self.counts['lost'] += 1
+            _log.debug("channel: Packet lost")
+            return []
+
+        # Serialise onto the link - drop at the tail when the queue is full
+        if self.bandwidth:
+            start = max(now, self._link_free)
+            if self.queue_limit is not None and (start - now) * self.bandwidth > self.queue_limit:
+                self.counts['queue_drops'] += 1
+                _log.debug("channel: Queue full, packet dropped")
+                return []
+            self._link_free = start + len(byte_msg) / self.bandwidth
+            now = self._link_free
+
+        if self.corrupt and rng.random() < self.corrupt:
+            self.counts['corrupted'] += 1
+            byte_msg = _corrupt(byte_msg, rng)
+        else:
+            byte_msg = bytes(byte_msg)
+
+        copies = 1
+        if self.duplicate and rng.random() < self.duplicate:
+            self.counts['duplicated'] += 1
+            copies = 2
+        arrivals = []
+        for _ in range(copies):
+            arrival = now + self.delay
+            if self.jitter:
+                arrival += rng.uniform(0.0, self.jitter)
+            if self.reorder and rng.random() < self.reorder:
+                self.counts['reordered'] += 1
+                arrival += self.reorder_delay
+            arrivals.append((arrival, byte_msg))
+        self.counts['delivered'] += copies
+        return arrivals
+
+
+class VirtualClock:
+    """Discrete-event clock shared by simulated peers.
+
+    Each peer runs in a thread started by run(). Time stands still while any
+    of them is working; once all of them wait on their ChannelSockets, the
+    clock jumps to the earliest arrival or timeout they wait for and wakes
+    the peers due then. Call the clock to read the time, like time.monotonic.
+
+    Note: only the threads of run() may use the sockets on this clock - a
+    thread the clock does not know about would be taken as waiting.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self.steps = 0  # Times the clock has jumped
+        self.stalled = False
+        self._cond = threading.Condition()  # Shared with the sockets on this clock
+        self._running = 0  # Peers that are not waiting
+        self._sleepers = []  # [wake-up time or None, socket, woken] of each waiting peer
+
+    def __call__(self):
+        return self.now
+
+    def run(self, *targets):
+        """Run each callable in its own thread on this clock - with the
+        protocol's timers on it too - until all of them have returned.
+
+        Return  -> list of their return values
+        Note: an exception in a callable is raised again here, once all of
+        them have ended. If every peer waits without a timeout and no packet
+        is in flight, the simulation has stalled and RuntimeError is raised
+        in their waits.
+        """
+        results = [None] * len(targets)
+        errors = []
+
+        def body(index, target):
+            try:
+                results[index] = target()
+            except BaseException as err:
+                errors.append(err)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._advance()
+
+        with self._cond:
+            self._running += len(targets)
+        threads = [threading.Thread(target=body, args=(index, target), name="rdt-sim-%d" % index, daemon=True)
+                   for index, target in enumerate(targets)]
+        rdt3.rdt_clock_init(self)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            rdt3.rdt_clock_init()
+        if errors:
+            raise errors[0]
+        return results
+
+    def _sleep(self, wake, sock):
+        """Wait until the clock reaches [wake] (None = no limit) or a packet
+        arrives at [sock]. The caller holds the clock's lock."""
+        sleeper = [wake, sock, False]
+        self._sleepers.append(sleeper)
+        self._running -= 1
+        self._advance()
+        while not sleeper[2]:
+            self._cond.wait()
+        if self.stalled:
+            raise RuntimeError("simulation stalled: every peer waits without a timeout")
+
+    def _wake(self, sleeper):
+        # The woken peer counts as running at once, before its thread gets the lock,
+        # so that the clock cannot move on without it
+        sleeper[2] = True
+        self._sleepers.remove(sleeper)
+        self._running += 1
+
+    def _arrived(self, sock):
+        """Wake the peer waiting on [sock] for a packet that has just been sent to it."""
+        for sleeper in [sleeper for sleeper in self._sleepers if sleeper[1] is sock]:
+            self._wake(sleeper)
+        self._cond.notify_all()
+
+    def _advance(self):
+        """Move the time on once no peer is running."""
+        if self._running > 0 or not self._sleepers:
+            return
+        wakes = [sleeper[0] for sleeper in self._sleepers if sleeper[0] is not None]
+        if not wakes:
+            self.stalled = True
+            due = list(self._sleepers)
+        else:
+            self.now = max(self.now, min(wakes))
+            self.steps += 1
+            due = [sleeper for sleeper in self._sleepers if sleeper[0] is not None and sleeper[0] <= self.now]
+        for sleeper in due:
+            self._wake(sleeper)
+        self._cond.notify_all()
+
+
+class ChannelSocket:
+    """In-memory datagram endpoint with the socket methods rdt3 uses.
+
+    Create connected pairs with channel_pair(). Packets sent to the peer's
+    address pass through the outgoing Channel and are queued at the peer until
+    their arrival time. It is safe to use the two ends from different threads.
+    With a VirtualClock, arrival times and timeouts are on the clock's time.
+    """
+
+    _ticket = itertools.count()  # Keeps equal arrival times in send order
+
+    def __init__(self, addr, channel=None, clock=None):
+        self.addr = addr
+        self.channel = Channel() if channel is None else channel  # Outgoing direction
+        self.clock = clock
+        self.peer = None
+        self.closed = False
+        self.blocking = True
+        self._inbox = []  # Heap of (arrival time, ticket, packet, sender address)
+        self._cond = threading.Condition() if clock is None else clock._cond
+
+    def getsockname(self):
+        return self.addr
+
+    def sendto(self, byte_msg, peer_addr):
+        """Send a datagram to the other end of the pair.
+
+        Return  -> size of the datagram; it is silently discarded if [peer_addr]
+        is not the other end, like a UDP datagram to an unused port
+        """
+        peer = self.peer
+        if peer is not None and tuple(peer_addr) == peer.addr:
+            with peer._cond:
+                now = time.monotonic() if self.clock is None else self.clock.now
+                for arrival, packet in self.channel.transmit(byte_msg, now):
+                    heapq.heappush(peer._inbox, (arrival, next(self._ticket), packet, self.addr))
+                if self.clock is None:
+                    peer._cond.notify_all()
+                else:
+                    self.clock._arrived(peer)
+        return len(byte_msg)
+
+    def wait_readable(self, timeout=None):
+        """Wait until a datagram has arrived.
+
+        Input argument: the max waiting time (None = no limit)
+        Return  -> True if a datagram is ready, False on timeout
+        """
+        if self.clock is not None:
+            return self._wait_virtual(timeout)
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._inbox and self._inbox[0][0] <= now:
+                    return True
+                if self.closed or (end is not None and now >= end):
+                    return False
+                wait = None if end is None else end - now
+                if self._inbox:
+                    wait = self._inbox[0][0] - now if wait is None else min(wait, self._inbox[0][0] - now)
+                self._cond.wait(wait)
+
+    def _wait_virtual(self, timeout):
+        """wait_readable() on the VirtualClock: sleep until the next arrival or the timeout."""
+        clock = self.clock
+        with self._cond:
+            end = None if timeout is None else clock.now + timeout
+            while True:
+                now = clock.now
+                if self._inbox and self._inbox[0][0] <= now:
+                    return True
+                if self.closed or (end is not None and now >= end):
+                    return False
+                wake = end
+                if self._inbox:
+                    wake = self._inbox[0][0] if wake is None else min(wake, self._inbox[0][0])
+                clock._sleep(wake, self)
+
+    def setblocking(self, flag):
+        self.blocking = flag
+
+    def recvfrom_into(self, buf):
+        """Receive the next datagram that has arrived into [buf].
+
+        Return  -> (size of the datagram, sender address)
+        Note: blocks until a datagram arrives, unless setblocking(False) was
+        called - then BlockingIOError is raised if none has arrived yet. The
+        datagram is truncated to the size of [buf] like on a UDP socket.
+        """
+        if not self.wait_readable(None if self.blocking else 0) and not self.blocking:
+            raise BlockingIOError("no datagram has arrived")
+        with self._cond:
+            if not self._inbox:  # Closed
+                return 0, ()
+            _, _, packet, sender = heapq.heappop(self._inbox)
+        nbytes = min(len(packet), len(buf))
+        buf[:nbytes] = packet[:nbytes]
+        return nbytes, sender
+
+    def recvfrom(self, bufsize):
+        buf = bytearray(bufsize)
+        nbytes, sender = self.recvfrom_into(buf)
+        return bytes(buf[:nbytes]), sender
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._inbox.clear()
+            if self.clock is None:
+                self._cond.notify_all()
+            else:
+                self.clock._arrived(self)
+
+
+def channel_pair(forward=None, backward=None, addr_a=('127.0.0.1', rdt3.CPORT),
+                 addr_b=('127.0.0.1', rdt3.SPORT), clock=None):
+    """Create two in-memory endpoints connected by simulated channels.
+
+    Input arguments: the Channel from A to B, the Channel from B to A (both
+    default to a perfect channel), the addresses of A and B and an optional
+    VirtualClock to run them on
+    Return  -> (endpoint A, endpoint B)
+    """
+    end_a = ChannelSocket(tuple(addr_a), forward, clock)
+    end_b = ChannelSocket(tuple(addr_b), backward, clock)
+    end_a.peer, end_b.peer = end_b, end_a
+    return end_a, end_b
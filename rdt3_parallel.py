@@ -0,0 +1,414 @@
+#!/usr/bin/python3
+"""Parallel multi-stream file transfer over RDT3.0
+
+functions: send_parallel(), recv_parallel()
+
+One RDT connection carries a single stream of packets, so a slow path or a
+small window leaves the link idle. send_parallel() splits a file into
+contiguous byte ranges and sends each over its own RDT connection, from its
+own UDP port and thread; recv_parallel() writes every range straight into
+its place in the preallocated target file with os.pwrite().
+
+The two peers agree on the transfer over an existing RDT connection (the
+control connection):
+    sender   -> manifest: {"name", "size", "streams", "sha256"} as JSON
+    receiver -> {"ports": [...]}, one fresh UDP port per stream, or ERROR
+    ... each sender thread connects to its port and sends its range ...
+    receiver -> OKAY once the stored file hashes to the manifest's sha256,
+                otherwise CORRUPT
+Both functions return a report with the throughput of every stream.
+Settings made with rdt3.rdt_network_init(), rdt3.rdt_window_init() and
+rdt3.rdt_congestion_init() apply to every stream; the streams use the
+header version and payload size of the control connection.
+
+Example:
+    listener = rdt3.RdtListener(sockd, accept_new=False)
+    abort.watch(listener)
+    conn = listener.connect('localhost', rdt3.SPORT)
+    report = send_parallel(conn, 'data.pdf', streams=4)
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+import rdt3
+from rdt3 import _log, _map_file, _unmap_file, _open_target
+
+DEFAULT_STREAMS = 4
+MAX_STREAMS = 64
+ACCEPT_TIMEOUT = 30.0  # How long the receiver waits for a stream to open (seconds)
+SERVICE_INTERVAL = 0.05  # While the streams run, the control connection is serviced at least this often (seconds)
+
+
+def _split_ranges(size, streams):
+    """Split [size] bytes into [streams] contiguous ranges of nearly equal length.
+
+    Return  -> list of (offset, length) pairs; the first ranges take the remainder
+    """
+    if streams == 0:
+        return []
+    base, extra = divmod(size, streams)
+    ranges = []
+    offset = 0
+    for index in range(streams):
+        length = base + (1 if index < extra else 0)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
+
+
+def _digest(view):
+    """Return the SHA-256 hex digest of a bytes-like object."""
+    return hashlib.sha256(view).hexdigest()
+
+
+class _Progress:
+    """Sum the progress of all streams and pass it to the application's callback."""
+
+    def __init__(self, total, callback):
+        self.total = total
+        self.done = 0
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def add(self, nbytes):
+        if self.callback is None:
+            return
+        with self._lock:
+            self.done += nbytes
+            self.callback(self.done, self.total)
+
+
+def _stream_report(index, offset, length, port, elapsed, conn):
+    return {'stream': index, 'offset': offset, 'length': length, 'port': port, 'elapsed': elapsed,
+            'goodput': length / elapsed if elapsed > 0 else 0.0,
+            'retransmissions': conn.stats.retransmissions if conn is not None else 0}
+
+
+def _summary(path, size, elapsed, reports):
+    return {'path': path, 'size': size, 'elapsed': elapsed, 'goodput': size / elapsed if elapsed > 0 else 0.0,
+            'streams': reports}
+
+
+class _Abort:
+    """Lets the thread that waits for the streams give them all up.
+
+    Every stream registers its listener; set() aborts the listeners (so a
+    sender stops retransmitting to a peer that is gone) and flags the
+    streams that wait in slices of SERVICE_INTERVAL.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def watch(self, listener):
+        """Register the listener of a stream, aborting it at once if the streams were given up."""
+        with self._lock:
+            self._listeners.append(listener)
+            if self._event.is_set():
+                listener.abort()
+
+    def set(self):
+        with self._lock:
+            self._event.set()
+            for listener in self._listeners:
+                listener.abort()
+
+
+def _join_serving(conn, workers, reports, abort):
+    """Wait for the stream threads while driving the control connection.
+
+    Nothing else drives [conn] while the streams run: without this, a lost
+    control message (the ports) would never be retransmitted and a
+    retransmitted one never ACK-ed, and the peer would wait for it forever.
+    A stream that fails, or the peer speaking on [conn] or closing it before
+    the streams are done (it gave up), aborts the other streams.
+    Input arguments: the control connection, the threads to wait for, their
+    reports (None until a stream succeeds) and their _Abort
+    """
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                conn.listener._poll(SERVICE_INTERVAL)
+                if abort.is_set():
+                    continue
+                failed = any(not each.is_alive() and reports[index] is None for index, each in enumerate(workers))
+                if failed or len(conn._recv_buffer) or conn._peer_fin:
+                    _log.info("parallel: Giving up the streams")
+                    abort.set()
+    except socket.error as err_msg:
+        print("Control connection error: ", err_msg)
+        abort.set()
+    for worker in workers:
+        worker.join()
+
+
+def _send_range(index, peer_ip, port, view, offset, length, control, progress, reports, abort):
+    """Worker thread: send view[offset:offset + length] over a new RDT connection to [port]."""
+    sockd = None
+    try:
+        sockd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sockd.bind(('', 0))
+    except socket.error as err_msg:
+        print("Stream %d socket error: " % index, err_msg)
+        if sockd is not None:
+            sockd.close()
+        return
+    listener = rdt3.RdtListener(sockd, accept_new=False)
+    abort.watch(listener)
+    conn = listener.connect(peer_ip, port, control.window_size, control.mode, version=control.version,
+                            payload=control.payload)
+    if conn is None:
+        listener.close()
+        return
+    starttime = time.monotonic()
+    sent = 0
+    while sent < length:
+        osize = conn.send(view[offset + sent:offset + min(length, sent + conn.payload)])
+        if osize < 0:
+            listener.abort()  # Nothing more to wait for
+            listener.close()
+            return
+        sent += osize
+        progress.add(osize)
+    conn.close()
+    elapsed = time.monotonic() - starttime
+    listener.close()
+    reports[index] = _stream_report(index, offset, length, port, elapsed, conn)
+    _log.info("parallel: Stream %d sent %d bytes in %.3f s", index, length, elapsed)
+
+
+def _recv_range(index, sockd, peer_ip, fileno, offset, length, progress, reports, abort):
+    """Worker thread: accept one RDT connection on [sockd] and write what it
+    carries to the file at [offset], with os.pwrite().
+
+    It waits in slices of SERVICE_INTERVAL, so that it sees [abort] even
+    when the sender has gone quiet.
+    """
+    listener = rdt3.RdtListener(sockd)
+    abort.watch(listener)
+    port = sockd.getsockname()[1]
+    try:
+        end = time.monotonic() + ACCEPT_TIMEOUT
+        while True:
+            conn = listener.accept(SERVICE_INTERVAL)
+            if abort.is_set():
+                return
+            if conn is None:
+                if time.monotonic() < end:
+                    continue
+                print("Stream %d error: the sender did not open it" % index)
+                return
+            if conn.peer_addr[0] == peer_ip:
+                break
+            _log.info("parallel: Stream %d ignores %s", index, conn.peer_addr)
+            listener._remove(conn)
+        listener.accept_new = False
+        starttime = time.monotonic()
+        received = 0
+        while received < length:
+            while len(conn._recv_buffer) == 0 and not conn._peer_fin:
+                if abort.is_set():
+                    return
+                conn._wait(SERVICE_INTERVAL)
+            rmsg = conn.recv(rdt3.MAX_PAYLOAD)
+            if rmsg == b'':
+                return
+            try:
+                os.pwrite(fileno, rmsg, offset + received)
+            except OSError as err_msg:
+                print("Stream %d write error: " % index, err_msg)
+                return
+            received += len(rmsg)
+            progress.add(len(rmsg))
+        elapsed = time.monotonic() - starttime
+        conn.close()
+        reports[index] = _stream_report(index, offset, length, port, elapsed, conn)
+        _log.info("parallel: Stream %d received %d bytes in %.3f s", index, length, elapsed)
+    finally:
+        if reports[index] is None:
+            listener.abort()  # Given up - no need to wait for the sender's FIN
+        listener.close()
+
+
+def send_parallel(conn, path, streams=DEFAULT_STREAMS, callback=None):
+    """Transmit a file to the peer over [streams] parallel RDT connections.
+    The peer receives it with recv_parallel() on its end of [conn].
+
+    Input arguments: the control connection (an rdt3.RdtSocket), path of
+    the file, number of streams and an optional progress callback called as
+    callback(bytes sent, file size) from the stream threads
+    Return  -> report dictionary (path, size, elapsed, goodput and one entry
+    per stream) on success, None on error
+    """
+    if not 1 <= streams <= MAX_STREAMS:
+        print("Send file error: streams must be between 1 and %d" % MAX_STREAMS)
+        return None
+    try:
+        fobj = open(path, 'rb')
+    except OSError as err_msg:
+        print("Open file error: ", err_msg)
+        return None
+    with fobj:
+        filelength = os.fstat(fobj.fileno()).st_size
+        try:
+            mapped, view = _map_file(fobj, filelength)
+        except (OSError, ValueError) as err_msg:
+            print("Map file error: ", err_msg)
+            return None
+        try:
+            return _send_view(conn, path, view, filelength, streams, callback)
+        finally:
+            _unmap_file(mapped, view)
+
+
+def _send_view(conn, path, view, filelength, streams, callback):
+    """Run the sender's side of a parallel transfer of [view]."""
+    # Never more streams than bytes - an empty file takes none
+    streams = min(streams, filelength)
+    manifest = json.dumps({'name': os.path.basename(path), 'size': filelength, 'streams': streams,
+                           'sha256': _digest(view)}).encode('utf-8')
+    if len(manifest) > conn.payload:
+        print("Send file error: the manifest does not fit in a packet of %d bytes" % conn.payload)
+        return None
+    if conn.send(manifest) < 0:
+        return None
+    response = conn.recv(rdt3.MAX_PAYLOAD)
+    try:
+        ports = json.loads(response)['ports']
+    except (ValueError, KeyError, TypeError):
+        ports = None
+    if not (isinstance(ports, list) and len(ports) == streams and all(isinstance(port, int) for port in ports)):
+        print("Send file error: peer cannot store the file")
+        return None
+
+    progress = _Progress(filelength, callback)
+    reports = [None] * streams
+    abort = _Abort()
+    starttime = time.monotonic()
+    workers = [threading.Thread(target=_send_range, name="rdt-send-%d" % index,
+                                args=(index, conn.peer_addr[0], ports[index], view, offset, length, conn,
+                                      progress, reports, abort))
+               for index, (offset, length) in enumerate(_split_ranges(filelength, streams))]
+    for worker in workers:
+        worker.start()
+    _join_serving(conn, workers, reports, abort)
+    elapsed = time.monotonic() - starttime
+    if None in reports:
+        print("Send file error: %d of %d streams failed" % (reports.count(None), streams))
+        return None
+
+    verdict = conn.recv(rdt3.MAX_PAYLOAD)
+    if verdict != b'OKAY':
+        print("Send file error: peer reports the file as", verdict.decode('ascii', 'replace') or "lost")
+        return None
+    return _summary(path, filelength, elapsed, reports)
+
+
+def recv_parallel(conn, directory, callback=None):
+    """Receive a file sent by the peer's send_parallel() and store it in a directory.
+
+    Input arguments: the control connection (an rdt3.RdtSocket), target
+    directory and an optional progress callback called as
+    callback(bytes received, file size) from the stream threads
+    Return  -> report dictionary (path, size, elapsed, goodput and one entry
+    per stream) on success, None on error
+    Note: the file is allocated at its full size before any data arrives and
+    is checked against the sender's SHA-256 digest at the end.
+    """
+    rmsg = conn.recv(rdt3.MAX_PAYLOAD)
+    try:
+        manifest = json.loads(rmsg)
+        name, filelength, streams, digest = \
+            manifest['name'], int(manifest['size']), int(manifest['streams']), manifest['sha256']
+    except (ValueError, KeyError, TypeError):
+        print("Receive file error: bad manifest", rmsg)
+        return None
+    if not (1 if filelength else 0) <= streams <= MAX_STREAMS:
+        print("Receive file error: bad number of streams", streams)
+        conn.send(b'ERROR')
+        return None
+    try:
+        fobj, path = _open_target(directory, name, filelength)
+    except OSError as err_msg:
+        print("Open file error: ", err_msg)
+        conn.send(b'ERROR')
+        return None
+    with fobj:
+        result = _recv_streams(conn, fobj, filelength, streams, callback)
+    if result is None:
+        return None
+    reports, elapsed = result
+
+    # Check what reached the disk against the sender's digest
+    try:
+        with open(path, 'rb') as fobj:
+            mapped, view = _map_file(fobj, filelength)
+            try:
+                intact = _digest(view) == digest
+            finally:
+                _unmap_file(mapped, view)
+    except (OSError, ValueError) as err_msg:
+        print("Verify file error: ", err_msg)
+        conn.send(b'ERROR')
+        return None
+    if conn.send(b'OKAY' if intact else b'CORRUPT') < 0:
+        return None
+    if not intact:
+        print("Receive file error: %s does not match the sender's digest" % path)
+        return None
+    return _summary(path, filelength, elapsed, reports)
+
+
+def _recv_streams(conn, fobj, filelength, streams, callback):
+    """Open one UDP port per stream, tell the sender and receive every range into [fobj].
+
+    Return  -> (list of per-stream reports, elapsed time), None on error
+    """
+    host = conn.listener.sockd.getsockname()[0]
+    sockets = []
+    try:
+        for _ in range(streams):
+            sockd = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sockets.append(sockd)
+            sockd.bind((host, 0))
+    except socket.error as err_msg:
+        print("Socket bind error: ", err_msg)
+        for sockd in sockets:
+            sockd.close()
+        conn.send(b'ERROR')
+        return None
+
+    # The streams must be ready before the sender learns their ports
+    progress = _Progress(filelength, callback)
+    reports = [None] * streams
+    abort = _Abort()
+    workers = [threading.Thread(target=_recv_range, name="rdt-recv-%d" % index,
+                                args=(index, sockets[index], conn.peer_addr[0], fobj.fileno(), offset, length,
+                                      progress, reports, abort))
+               for index, (offset, length) in enumerate(_split_ranges(filelength, streams))]
+    starttime = time.monotonic()
+    for worker in workers:
+        worker.start()
+    if conn.send(json.dumps({'ports': [sockd.getsockname()[1] for sockd in sockets]}).encode('ascii')) < 0:
+        # The workers close their sockets as they give up
+        abort.set()
+        for worker in workers:
+            worker.join()
+        return None
+    _join_serving(conn, workers, reports, abort)
+    elapsed = time.monotonic() - starttime
+    if None in reports:
+        print("Receive file error: %d of %d streams failed" % (reports.count(None), streams))
+        conn.send(b'ERROR')
+        return None
+    return reports, elapsed
@@ -0,0 +1,319 @@
+#!/usr/bin/python3
+"""Multi-client upload server over RDT3.0
+
+classes:   ByteLimit    - bytes in flight held against a limit
+           UploadServer - long-running server receiving files from many clients on one port
+
+The server runs on the asyncio transport of rdt3_async: every client that
+opens a connection on the server's port gets a session, which receives one
+file with AsyncRdtSocket.recvfile() into <directory>/<client IP>_<client port>.
+  * At most [workers] sessions run at once; the others wait for a free worker
+    with a receive budget of only WAITING_BUDGET bytes, so that the receive
+    window holds their senders back and the memory they take stays bounded.
+  * Disk writes (os.pwrite) and fsyncs are done by a pool of [io_threads]
+    threads, so that a slow disk does not hold up the event loop.
+  * Bytes received but not yet written count against a limit per client IP
+    address and against a limit of the whole server. A session that reaches
+    either stops reading from its connection, so its sender is held back by
+    the receive window until the writes catch up.
+  * A session that makes no progress for [idle_timeout] seconds is dropped,
+    and its client is refused until it stops sending to it.
+The aggregate ingest throughput - file bytes written per second - is
+printed every [report_interval] seconds and returned by serve().
+
+Example:
+    server = UploadServer('./Store', workers=8)
+    report = asyncio.run(server.serve(rdt3.SPORT))
+"""
+
+import asyncio
+import collections
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import rdt3
+import rdt3_async
+from rdt3 import _log
+
+DEFAULT_WORKERS = 8
+DEFAULT_IO_THREADS = 4
+DEFAULT_CLIENT_LIMIT = 4 * 1024 * 1024  # Bytes in flight per client IP address
+DEFAULT_SERVER_LIMIT = 32 * 1024 * 1024  # Bytes in flight in the whole server
+IDLE_TIMEOUT = 60.0  # Drop a session that makes no progress for this long (seconds)
+REPORT_INTERVAL = 5.0  # Seconds between throughput reports
+WATCH_INTERVAL = 1.0  # Seconds between checks for idle sessions
+WAITING_BUDGET = 64 * 1024  # Receive budget of a session waiting for a worker (bytes)
+
+
+def _pwrite_all(fileno, data, offset):
+    """Write all of [data] to the file at [offset].
+
+    Note: it does not catch any exception
+    """
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fileno, view, offset)
+        view = view[written:]
+        offset += written
+
+
+class ByteLimit:
+    """Bytes in flight held against a limit.
+
+    acquire() waits until the bytes fit under the limit; it is always granted
+    when nothing is in flight, so a limit below the payload size cannot stall.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.waits = 0  # Times a caller had to wait for room
+        self._waiters = collections.deque()
+
+    async def acquire(self, nbytes):
+        if self.used and self.used + nbytes > self.limit:
+            self.waits += 1
+        while self.used and self.used + nbytes > self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+        self.used += nbytes
+        self.peak = max(self.peak, self.used)
+
+    def release(self, nbytes):
+        self.used -= nbytes
+        # Every waiter checks again whether its bytes fit now
+        waiters, self._waiters = self._waiters, collections.deque()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class _SessionWriter:
+    """Writer for AsyncRdtSocket.recvfile() that hands the writes of one
+    session to the server's thread pool, within the in-flight limits."""
+
+    def __init__(self, server, session):
+        self.server = server
+        self.session = session
+        self.pending = set()
+        self.error = None  # First failed write
+
+    async def write(self, fobj, data, offset):
+        if self.error is not None:
+            raise self.error
+        nbytes = len(data)
+        client_limit = self.session.client_limit
+        await client_limit.acquire(nbytes)
+        try:
+            await self.server.limit.acquire(nbytes)
+        except BaseException:
+            client_limit.release(nbytes)
+            raise
+        future = self.server.loop.run_in_executor(self.server.executor, _pwrite_all, fobj.fileno(), data, offset)
+        self.pending.add(future)
+        future.add_done_callback(lambda done: self._written(done, nbytes))
+
+    def _written(self, future, nbytes):
+        self.pending.discard(future)
+        self.session.client_limit.release(nbytes)
+        self.server.limit.release(nbytes)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if self.error is None:
+                self.error = future.exception()
+        else:
+            self.server.written += nbytes
+
+    async def drain(self):
+        if self.pending:
+            await asyncio.wait(set(self.pending))
+        if self.error is not None:
+            raise self.error
+
+    async def call(self, function, *args):
+        return await self.server.loop.run_in_executor(self.server.executor, function, *args)
+
+
+class _Session:
+    """One client's upload."""
+
+    def __init__(self, conn, client_limit):
+        self.conn = conn
+        self.client_limit = client_limit
+        self.budget = conn._recv_buffer.budget  # Receive budget once it holds a worker
+        self.task = None
+        self.active = False  # Holds a worker
+        self.timed_out = False
+        self.last = time.monotonic()  # Time of the last progress
+        self.received = 0
+        self.size = 0
+
+    def progress(self, received, size):
+        self.last = time.monotonic()
+        self.received = received
+        self.size = size
+
+
+class UploadServer:
+    """Receive files from any number of clients on one UDP port.
+
+    Input arguments: target directory and optionally the number of workers
+    (sessions served at once), the number of threads writing to disk, the
+    limits of bytes in flight per client IP address and in the whole server,
+    the idle timeout of a session (seconds) and the interval of throughput
+    reports (seconds, 0 = none)
+    """
+
+    def __init__(self, directory, workers=DEFAULT_WORKERS, io_threads=DEFAULT_IO_THREADS,
+                 client_limit=DEFAULT_CLIENT_LIMIT, server_limit=DEFAULT_SERVER_LIMIT, idle_timeout=IDLE_TIMEOUT,
+                 report_interval=REPORT_INTERVAL):
+        self.directory = directory
+        self.workers = workers
+        self.io_threads = io_threads
+        self.client_limit = client_limit
+        self.limit = ByteLimit(server_limit)
+        self.idle_timeout = idle_timeout
+        self.report_interval = report_interval
+        self.sessions = {}  # {connection: _Session}
+        self.clients = {}  # {client IP address: [ByteLimit, number of sessions]}
+        self.files = 0
+        self.failed = 0
+        self.written = 0  # File bytes written to disk
+        self.started = None
+        self.loop = None
+        self.executor = None
+        self.listener = None
+        self._slots = None
+
+    async def serve(self, port=rdt3.SPORT, host='0.0.0.0', duration=None):
+        """Accept and serve uploads until cancelled, or for [duration] seconds -
+        then no new client is accepted and the uploads under way are finished.
+
+        Input arguments: port number, local IP address and the optional run time
+        Return  -> the final report dictionary (see report()), None if the port
+        cannot be opened
+        """
+        self.loop = asyncio.get_running_loop()
+        self.listener = await rdt3_async.open_listener(port, host)
+        if self.listener is None:
+            return None
+        self._slots = asyncio.Semaphore(self.workers)
+        self.executor = ThreadPoolExecutor(self.io_threads, thread_name_prefix='rdt-write')
+        self.started = time.monotonic()
+        watcher = asyncio.ensure_future(self._watch())
+        try:
+            await self._accept(duration)
+            self.listener.accept_new = False
+            await asyncio.gather(*(session.task for session in list(self.sessions.values())),
+                                 return_exceptions=True)
+        finally:
+            watcher.cancel()
+            tasks = [session.task for session in self.sessions.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.listener.close()
+            self.executor.shutdown(wait=True)
+        return self.report()
+
+    def report(self):
+        """Return the aggregate statistics as a dictionary: run time, files
+        stored and failed, sessions active and waiting for a worker, bytes
+        written, ingest throughput (bytes/s), bytes in flight and their peak."""
+        elapsed = time.monotonic() - self.started
+        active = sum(1 for session in self.sessions.values() if session.active)
+        return {'elapsed': elapsed, 'files': self.files, 'failed': self.failed, 'active': active,
+                'waiting': len(self.sessions) - active, 'bytes': self.written,
+                'throughput': self.written / elapsed if elapsed > 0 else 0.0, 'in_flight': self.limit.used,
+                'peak_in_flight': self.limit.peak, 'limit_waits': self.limit.waits}
+
+    async def _accept(self, duration):
+        """Start a session for every new connection until [duration] has passed."""
+        end = None if duration is None else self.loop.time() + duration
+        while not self.listener.transport_lost:
+            remaining = None if end is None else end - self.loop.time()
+            if remaining is not None and remaining <= 0:
+                return
+            conn = await self.listener.accept(remaining)
+            if conn is None:
+                continue
+            client = self.clients.get(conn.peer_addr[0])
+            if client is None:
+                client = self.clients[conn.peer_addr[0]] = [ByteLimit(self.client_limit), 0]
+            client[1] += 1
+            session = self.sessions[conn] = _Session(conn, client[0])
+            conn._recv_buffer.budget = min(session.budget, WAITING_BUDGET)
+            session.task = asyncio.ensure_future(self._session(session))
+            _log.info("server: Session from %s:%d", *conn.peer_addr)
+
+    async def _session(self, session):
+        """Receive one file from the session's client once a worker is free."""
+        conn = session.conn
+        peer = "%s:%d" % conn.peer_addr
+        try:
+            async with self._slots:
+                session.active = True
+                session.last = time.monotonic()
+                # Open the receive window to the full budget, and tell the sender
+                conn._recv_buffer.budget = session.budget
+                conn._window_update()
+                directory = os.path.join(self.directory, "%s_%d" % conn.peer_addr)
+                try:
+                    os.makedirs(directory, exist_ok=True)
+                except OSError as err_msg:
+                    print("Directory error: ", err_msg)
+                    self.failed += 1
+                    return
+                starttime = time.monotonic()
+                path = await conn.recvfile(directory, session.progress, _SessionWriter(self, session))
+                lapsed = time.monotonic() - starttime
+                if path is None:
+                    print("Upload from %s failed" % peer)
+                    self.failed += 1
+                else:
+                    self.files += 1
+                    print("Stored %s from %s: %d bytes in %.3f s\tThroughtput: %.2f KB/s"
+                          % (path, peer, session.size, lapsed, session.size / lapsed / 1000.0 if lapsed > 0 else 0.0))
+                await conn.close()
+        except asyncio.CancelledError:
+            if not session.timed_out:
+                raise
+            print("Upload from %s timed out" % peer)
+            self.failed += 1
+        finally:
+            if not conn.closed:
+                # Dropped - forget the connection without the closing exchange, and
+                # refuse the client while it keeps sending to it
+                self.listener._refuse(conn.peer_addr)
+                conn._cancel_timer()
+                conn._finish()
+            del self.sessions[conn]
+            client = self.clients[conn.peer_addr[0]]
+            client[1] -= 1
+            if client[1] == 0:
+                del self.clients[conn.peer_addr[0]]
+
+    async def _watch(self):
+        """Drop idle sessions and print the throughput every report interval."""
+        last_report = time.monotonic()
+        last_written = self.written
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if session.active and not session.timed_out and now - session.last > self.idle_timeout:
+                    session.timed_out = True
+                    session.task.cancel()
+            if self.report_interval and now - last_report >= self.report_interval:
+                report = self.report()
+                print("---- Ingest: %.2f KB/s now, %.2f KB/s overall | %d active, %d waiting | "
+                      "%d files stored, %d failed | %d bytes in flight"
+                      % ((self.written - last_written) / (now - last_report) / 1000.0,
+                         report['throughput'] / 1000.0, report['active'], report['waiting'], report['files'],
+                         report['failed'], report['in_flight']))
+                last_report = now
+                last_written = self.written
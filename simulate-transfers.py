@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+"""Simulated RDT3.0 transfers on a virtual clock
+
+Runs many transfers between two peers in this process over the simulated
+channels of rdt3_channel. On the VirtualClock the retransmission timeouts,
+delays and closing waits take no real time, so a run reports in seconds of
+CPU time what would take minutes on a real network; the same seeds give the
+same packets, losses and results every time. --real runs the same transfers
+on the real clock for comparison.
+
+Usage:  python3 simulate-transfers.py  [--transfers 100]  [--size 100000]  [--loss 0.1]
+            [--corrupt 0.0]  [--delay 0.01]  [--bandwidth BYTES/S]  [--window 16]  [--mode SR]
+            [--version 1]  [--message BYTES]  [--seed 0]  [--real]  [--json FILE]
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+import threading
+
+import rdt3 as rdt
+from rdt3_channel import Channel, VirtualClock, channel_pair
+
+
+def sender(end, peer_addr, data, args):
+    """Send [data] over a new connection and close it.
+
+    Return  -> the connection's statistics dictionary
+    """
+    listener = rdt.RdtListener(end, accept_new=False)
+    conn = listener.connect(*peer_addr, window_size=args.window, mode=args.mode, version=args.version)
+    if conn is None:
+        raise RuntimeError("cannot connect")
+    view = memoryview(data)
+    sent = 0
+    while sent < len(data):
+        if args.message:
+            osize = conn.sendmsg(view[sent:sent + args.message])
+        else:
+            osize = conn.send(view[sent:sent + conn.payload])
+        if osize < 0:
+            raise RuntimeError("send failed")
+        sent += osize
+    conn.close()
+    listener.close()
+    return conn.stats.to_dict()
+
+
+def receiver(end, size, args):
+    """Accept one connection and receive [size] bytes from it.
+
+    Return  -> the received bytes
+    """
+    listener = rdt.RdtListener(end)
+    conn = listener.accept(None)
+    received = bytearray()
+    while len(received) < size:
+        if args.message:
+            rmsg = conn.recvmsg(args.message)
+            if rmsg is None:
+                break
+        else:
+            rmsg = conn.recv(conn.payload)
+            if rmsg == b'':
+                break
+        received += rmsg
+    conn.close()
+    listener.close()
+    return bytes(received)
+
+
+def transfer(seed, data, args):
+    """Run one transfer with the channels seeded from [seed].
+
+    Return  -> result dictionary: seed, duration (virtual or real seconds),
+    whether the data arrived intact, retransmissions and clock steps
+    """
+    clock = None if args.real else VirtualClock()
+    forward = Channel(delay=args.delay, loss=args.loss, corrupt=args.corrupt, bandwidth=args.bandwidth,
+                      seed=2 * seed)
+    backward = Channel(delay=args.delay, loss=args.loss, corrupt=args.corrupt, seed=2 * seed + 1)
+    end_a, end_b = channel_pair(forward, backward, clock=clock)
+    peer_addr = end_b.getsockname()
+    if clock is not None:
+        stats, received = clock.run(lambda: sender(end_a, peer_addr, data, args),
+                                    lambda: receiver(end_b, len(data), args))
+        duration, steps = clock.now, clock.steps
+    else:
+        results = {}
+        thread = threading.Thread(target=lambda: results.setdefault('received', receiver(end_b, len(data), args)))
+        thread.start()
+        starttime = time.monotonic()
+        stats = sender(end_a, peer_addr, data, args)
+        thread.join()
+        duration, steps = time.monotonic() - starttime, 0
+        received = results.get('received')
+    return {'seed': seed, 'duration': duration, 'intact': received == data,
+            'retransmissions': stats['retransmissions'], 'steps': steps}
+
+
+def summary(values):
+    return "min %.3f  mean %.3f  median %.3f  max %.3f" % (min(values), statistics.mean(values),
+                                                           statistics.median(values), max(values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated RDT3.0 transfers on a virtual clock")
+    parser.add_argument('--transfers', type=int, default=100, help="number of transfers")
+    parser.add_argument('--size', type=int, default=100000, help="bytes per transfer")
+    parser.add_argument('--loss', type=float, default=0.1, help="packet loss probability of each direction")
+    parser.add_argument('--corrupt', type=float, default=0.0, help="packet corruption probability")
+    parser.add_argument('--delay', type=float, default=0.01, help="one-way delay (seconds)")
+    parser.add_argument('--bandwidth', type=float, help="link rate of the data direction (bytes/s)")
+    parser.add_argument('--window', type=int, default=16, help="window size (1 = stop-and-wait)")
+    parser.add_argument('--mode', default=rdt.SELECTIVE_REPEAT, help="GBN or SR")
+    parser.add_argument('--version', type=int, default=rdt.VERSION_1, help="header version")
+    parser.add_argument('--message', type=int, help="send the data as messages of this size with sendmsg()")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first transfer")
+    parser.add_argument('--real', action='store_true', help="run on the real clock instead")
+    parser.add_argument('--json', help="write every transfer's result to this JSON file")
+    args = parser.parse_args()
+
+    # The channels make every impairment; the window also decides which peers may open connections
+    rdt.rdt_network_init(0, 0)
+    if rdt.rdt_window_init(args.window, args.mode) == -1:
+        sys.exit(1)
+    data = random.Random(args.seed).randbytes(args.size)
+
+    starttime = time.monotonic()
+    cputime = time.process_time()
+    results = [transfer(seed, data, args) for seed in range(args.seed, args.seed + args.transfers)]
+    wall = time.monotonic() - starttime
+    cputime = time.process_time() - cputime
+
+    durations = [result['duration'] for result in results]
+    print("%d transfers of %d bytes, loss %g, delay %g s, window %d %s on the %s clock"
+          % (args.transfers, args.size, args.loss, args.delay, args.window, args.mode,
+             "real" if args.real else "virtual"))
+    print("Intact: %d of %d" % (sum(result['intact'] for result in results), len(results)))
+    print("Transfer time (s):  " + summary(durations))
+    print("Retransmissions:    " + summary([result['retransmissions'] for result in results]))
+    print("Simulated %.3f s in %.3f s wall time, %.3f s CPU time (%.1fx real time)"
+          % (sum(durations), wall, cputime, sum(durations) / wall if wall > 0 else 0.0))
+    if args.json:
+        with open(args.json, 'w') as fobj:
+            json.dump(results, fobj, indent=1)
+
+
+if __name__ == "__main__":
+    main()
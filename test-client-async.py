@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""File transfer client program on the asyncio transport
+
+This is for testing of the asyncio RDT3.0 layer against test-server2.py.
+
+"""
+
+import sys
+import os
+import time
+import asyncio
+import rdt3 as rdt
+import rdt3_async
+
+
+async def main():
+    # Check the number of input arguments
+    if len(sys.argv) not in (5, 6, 7):
+        print("Usage:  " + sys.argv[0] + "  <server IP>  <filename>  <drop rate>  <error rate>  [window size]  [GBN|SR]")
+        sys.exit(0)
+    # Get the filename
+    filename = sys.argv[2]
+
+    # check the file
+    try:
+        filelength = os.path.getsize(filename)
+    except OSError as emsg:
+        print("Open file error: ", emsg)
+        sys.exit(0)
+    print("File bytes are ", filelength)
+
+    # set up the RDT simulation
+    rdt.rdt_network_init(sys.argv[3], sys.argv[4])
+    if len(sys.argv) > 5:
+        mode = sys.argv[6] if len(sys.argv) > 6 else rdt.SELECTIVE_REPEAT
+        if rdt.rdt_window_init(sys.argv[5], mode) == -1:
+            sys.exit(0)
+
+    # open the RDT endpoint on my own port and connect to the server
+    listener = await rdt3_async.open_listener(rdt.CPORT, accept_new=False)
+    if listener is None:
+        sys.exit(0)
+    conn = await listener.connect(sys.argv[1], rdt.SPORT)
+    if conn is None:
+        sys.exit(0)
+
+    # send the file - the size and name are sent first, then the server responds
+    print("Start the file transfer . . .")
+    starttime = time.monotonic()  # record start time
+    if await conn.sendfile(filename, rdt.show_progress("Client")) < 0:
+        print("File transfer failed.\nProgram terminated.")
+        sys.exit(0)
+
+    endtime = time.monotonic()  # record end time
+    print("Completed the file transfer.")
+    lapsed = endtime - starttime
+    print("Total elapse time: %.3f s\tThroughtput: %.2f KB/s" % (lapsed, filelength / lapsed / 1000.0))
+
+    # Closing
+    await listener.close()
+    print("Client program terminated")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""Parallel file transfer client program
+
+This is for testing of the multi-stream transfer of the RDT3.0 layer
+against test-server-parallel.py.
+
+"""
+
+import sys
+import os
+import rdt3 as rdt
+import rdt3_parallel
+
+
+def main():
+    # Check the number of input arguments
+    if len(sys.argv) not in (5, 6, 7, 8):
+        print("Usage:  " + sys.argv[0] + "  <server IP>  <filename>  <drop rate>  <error rate>  [streams]"
+              "  [window size]  [GBN|SR]")
+        sys.exit(0)
+    # Get the filename
+    filename = sys.argv[2]
+
+    # check the file
+    try:
+        filelength = os.path.getsize(filename)
+    except OSError as emsg:
+        print("Open file error: ", emsg)
+        sys.exit(0)
+    print("File bytes are ", filelength)
+
+    # set up the RDT simulation
+    rdt.rdt_network_init(sys.argv[3], sys.argv[4])
+    streams = int(sys.argv[5]) if len(sys.argv) > 5 else rdt3_parallel.DEFAULT_STREAMS
+    if len(sys.argv) > 6:
+        mode = sys.argv[7] if len(sys.argv) > 7 else rdt.SELECTIVE_REPEAT
+        if rdt.rdt_window_init(sys.argv[6], mode) == -1:
+            sys.exit(0)
+
+    # create RDT socket on my own port and open the control connection to the server
+    sockfd = rdt.rdt_socket()
+    if sockfd == None:
+        sys.exit(0)
+    if rdt.rdt_bind(sockfd, rdt.CPORT) == -1:
+        sys.exit(0)
+    listener = rdt.RdtListener(sockfd, accept_new=False)
+    conn = listener.connect(sys.argv[1], rdt.SPORT)
+    if conn is None:
+        sys.exit(0)
+
+    # send the file in byte ranges over parallel streams
+    print("Start the file transfer over %d streams . . ." % streams)
+    report = rdt3_parallel.send_parallel(conn, filename, streams, rdt.show_progress("Client"))
+    if report is None:
+        print("File transfer failed.\nProgram terminated.")
+        sys.exit(0)
+
+    print("Completed the file transfer.")
+    for stream in report['streams']:
+        print("Stream %d: %d bytes at offset %d in %.3f s\tThroughtput: %.2f KB/s\tRetransmissions: %d"
+              % (stream['stream'], stream['length'], stream['offset'], stream['elapsed'],
+                 stream['goodput'] / 1000.0, stream['retransmissions']))
+    print("Total elapse time: %.3f s\tThroughtput: %.2f KB/s" % (report['elapsed'], report['goodput'] / 1000.0))
+
+    # Closing
+    listener.close()
+    print("Client program terminated")
+
+
+if __name__ == "__main__":
+    main()
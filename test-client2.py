@@ -12,29 +12,29 @@ import rdt3 as rdt
 
 
 def main():
-    MSG_LEN = rdt.PAYLOAD  # get the system payload limit
-
     # Check the number of input arguments
-    if len(sys.argv) != 5:
-        print("Usage:  " + sys.argv[0] + "  <server IP>  <filename>  <drop rate>  <error rate>")
+    if len(sys.argv) not in (5, 6, 7, 8):
+        print("Usage:  " + sys.argv[0] + "  <server IP>  <filename>  <drop rate>  <error rate>  [window size]  [GBN|SR]  [zlib|lzma|none]")
         sys.exit(0)
     # Get the filename
     filename = sys.argv[2]
 
-    # open file
+    # check the file
     try:
-        fobj = open(filename, 'rb')
+        filelength = os.path.getsize(filename)
     except OSError as emsg:
         print("Open file error: ", emsg)
         sys.exit(0)
-    print("Open file successfully")
-
-    # get the file size
-    filelength = os.path.getsize(filename)
     print("File bytes are ", filelength)
 
     # set up the RDT simulation
     rdt.rdt_network_init(sys.argv[3], sys.argv[4])
+    if len(sys.argv) > 5:
+        mode = sys.argv[6] if len(sys.argv) > 6 else rdt.SELECTIVE_REPEAT
+        if rdt.rdt_window_init(sys.argv[5], mode) == -1:
+            sys.exit(0)
+    if len(sys.argv) > 7 and rdt.rdt_compress_init(sys.argv[7]) == -1:
+        sys.exit(0)
 
     # create RDT socket
     sockfd = rdt.rdt_socket()
@@ -50,51 +50,23 @@ def main():
     if rdt.rdt_peer(sys.argv[1], rdt.SPORT) == -1:
         sys.exit(0)
 
-    # implement a simple handshaking protocol at the application layer
-    # first send the size of the file to server
-    osize = rdt.rdt_send(sockfd, str(filelength).encode("ascii"))
-    if osize < 0:
-        print("Cannot send message1")
-        sys.exit(0)
-    # then send the filename to server
-    osize = rdt.rdt_send(sockfd, filename.encode("ascii"))
-    if osize < 0:
-        print("Cannot send message2")
-        sys.exit(0)
-    # now wait for server response
-    rmsg = rdt.rdt_recv(sockfd, MSG_LEN)
-    if rmsg == b'':
-        sys.exit(0)
-    elif rmsg == b'ERROR':
-        print("Server experienced file creation error.\nProgram terminated.")
-        sys.exit(0)
-    else:
-        print("Received server positive response")
-
-    # start the data transfer
+    # send the file - the size and name are sent first, then the server responds
     print("Start the file transfer . . .")
     starttime = time.monotonic()  # record start time
-    sent = 0
-    while sent < filelength:
-        print("---- Client progress: %d / %d" % (sent, filelength))
-        smsg = fobj.read(MSG_LEN)
-        if smsg == b'':
-            print("EOF is reached!!")
-            sys.exit(0)
-        osize = rdt.rdt_send(sockfd, smsg)
-        if osize > 0:
-            sent += osize
-        else:
-            print("Experienced sending error! Has sent", sent, "bytes of message so far.")
-            sys.exit(0)
+    if rdt.rdt_sendfile(sockfd, filename, rdt.show_progress("Client")) < 0:
+        print("File transfer failed.\nProgram terminated.")
+        sys.exit(0)
 
     endtime = time.monotonic()  # record end time
     print("Completed the file transfer.")
     lapsed = endtime - starttime
     print("Total elapse time: %.3f s\tThroughtput: %.2f KB/s" % (lapsed, filelength / lapsed / 1000.0))
+    stats = rdt.rdt_stats(sockfd)
+    if stats['compression_ratio'] is not None:
+        print("Compression ratio: %.2f\tCPU time: %.3f s\tRaw chunks: %d" % (
+            stats['compression_ratio'], stats['codec_cpu'], stats['raw_chunks']))
 
     # Closing
-    fobj.close()
     rdt.rdt_close(sockfd)
     print("Client program terminated")
 
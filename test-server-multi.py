@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Multi-client upload server program
+
+This is for testing of the RDT3.0 layer with many clients uploading at once
+with test-client2.py or test-client-async.py. Those clients all bind
+rdt3.CPORT, so each one needs a host of its own - or CPORT set to another
+port - for the uploads to run at once. The server runs until interrupted with
+Ctrl-C, or for [run time] seconds, and stores every client's files in
+./Store/<client IP>_<client port>.
+
+"""
+
+import sys
+import os
+import asyncio
+import rdt3 as rdt
+import rdt3_server
+
+
+def main():
+    # Check the number of input arguments
+    if len(sys.argv) not in range(3, 10):
+        print("Usage:  " + sys.argv[0] + "  <drop rate>  <error rate>  [window size]  [GBN|SR]  [workers]  "
+              "[client limit KB]  [server limit KB]  [run time]")
+        sys.exit(0)
+
+    # check whether the folder exists
+    try:
+        os.stat("./Store")
+    except OSError as emsg:
+        print("Directory './Store' does not exist!!")
+        print("Please create the directory before starting up the server")
+        sys.exit(0)
+
+    # set up the RDT simulation
+    rdt.rdt_network_init(sys.argv[1], sys.argv[2])
+    if len(sys.argv) > 3:
+        mode = sys.argv[4] if len(sys.argv) > 4 else rdt.SELECTIVE_REPEAT
+        if rdt.rdt_window_init(sys.argv[3], mode) == -1:
+            sys.exit(0)
+    try:
+        workers = int(sys.argv[5]) if len(sys.argv) > 5 else rdt3_server.DEFAULT_WORKERS
+        client_limit = int(sys.argv[6]) * 1024 if len(sys.argv) > 6 else rdt3_server.DEFAULT_CLIENT_LIMIT
+        server_limit = int(sys.argv[7]) * 1024 if len(sys.argv) > 7 else rdt3_server.DEFAULT_SERVER_LIMIT
+        duration = float(sys.argv[8]) if len(sys.argv) > 8 else None
+    except ValueError as emsg:
+        print("Argument error: ", emsg)
+        sys.exit(0)
+    if workers < 1 or client_limit < 1 or server_limit < 1:
+        print("Argument error: workers and limits must be positive")
+        sys.exit(0)
+
+    # serve the clients on my own port until interrupted
+    print("Start receiving files on port %d with %d workers . . ." % (rdt.SPORT, workers))
+    server = rdt3_server.UploadServer("./Store", workers, client_limit=client_limit, server_limit=server_limit)
+    try:
+        report = asyncio.run(server.serve(rdt.SPORT, duration=duration))
+    except KeyboardInterrupt:  # The server has shut down
+        report = server.report() if server.started is not None else None
+    if report is None:
+        sys.exit(0)
+
+    print("Stored %d files, %d failed" % (report['files'], report['failed']))
+    print("Total elapse time: %.3f s\tIngest throughtput: %.2f KB/s\tPeak bytes in flight: %d"
+          % (report['elapsed'], report['throughput'] / 1000.0, report['peak_in_flight']))
+    print("Server program terminated")
+
+
+if __name__ == "__main__":
+    main()
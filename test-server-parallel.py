@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""Parallel file transfer server program
+
+This is for testing of the multi-stream transfer of the RDT3.0 layer
+against test-client-parallel.py.
+
+"""
+
+import sys
+import os
+import rdt3 as rdt
+import rdt3_parallel
+
+
+def main():
+    # Check the number of input arguments
+    if len(sys.argv) not in (4, 5, 6):
+        print("Usage:  " + sys.argv[0] + "  <client IP>  <drop rate>  <error rate>  [window size]  [GBN|SR]")
+        sys.exit(0)
+
+    # check whether the folder exists
+    try:
+        os.stat("./Store")
+    except OSError as emsg:
+        print("Directory './Store' does not exist!!")
+        print("Please create the directory before starting up the server")
+        sys.exit(0)
+
+    # set up the RDT simulation
+    rdt.rdt_network_init(sys.argv[2], sys.argv[3])
+    if len(sys.argv) > 4:
+        mode = sys.argv[5] if len(sys.argv) > 5 else rdt.SELECTIVE_REPEAT
+        if rdt.rdt_window_init(sys.argv[4], mode) == -1:
+            sys.exit(0)
+
+    # create RDT socket on my own port for the control connection from the client
+    sockfd = rdt.rdt_socket()
+    if sockfd == None:
+        sys.exit(0)
+    if rdt.rdt_bind(sockfd, rdt.SPORT) == -1:
+        sys.exit(0)
+    listener = rdt.RdtListener(sockfd, accept_new=False)
+    conn = listener.connect(sys.argv[1], rdt.CPORT)
+    if conn is None:
+        sys.exit(0)
+
+    # receive the file - the client tells its size, name and number of streams first
+    print("Start receiving the file . . .")
+    report = rdt3_parallel.recv_parallel(conn, "./Store", rdt.show_progress("Server"))
+    if report is None:
+        print("Encountered receive error!")
+        sys.exit(0)
+    print("Stored the file as", report['path'])
+    for stream in report['streams']:
+        print("Stream %d: %d bytes at offset %d in %.3f s\tThroughtput: %.2f KB/s"
+              % (stream['stream'], stream['length'], stream['offset'], stream['elapsed'],
+                 stream['goodput'] / 1000.0))
+
+    # Closing
+    listener.close()
+    print("Completed the file transfer.")
+    print("Server program terminated")
+
+
+if __name__ == "__main__":
+    main()
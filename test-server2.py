@@ -11,11 +11,9 @@ import rdt3 as rdt
 
 
 def main():
-    MSG_LEN = rdt.PAYLOAD
-
     # Check the number of input arguments
-    if len(sys.argv) != 4:
-        print("Usage:  " + sys.argv[0] + "  <client IP>  <drop rate>  <error rate>")
+    if len(sys.argv) not in (4, 5, 6, 7):
+        print("Usage:  " + sys.argv[0] + "  <client IP>  <drop rate>  <error rate>  [window size]  [GBN|SR]  [zlib|lzma|none]")
         sys.exit(0)
 
     # check whether the folder exists
@@ -28,6 +26,12 @@ def main():
 
     # set up the RDT simulation
     rdt.rdt_network_init(sys.argv[2], sys.argv[3])
+    if len(sys.argv) > 4:
+        mode = sys.argv[5] if len(sys.argv) > 5 else rdt.SELECTIVE_REPEAT
+        if rdt.rdt_window_init(sys.argv[4], mode) == -1:
+            sys.exit(0)
+    if len(sys.argv) > 6 and rdt.rdt_compress_init(sys.argv[6]) == -1:
+        sys.exit(0)
 
     # create RDT socket
     sockfd = rdt.rdt_socket()
@@ -43,51 +47,15 @@ def main():
     if rdt.rdt_peer(sys.argv[1], rdt.CPORT) == -1:
         sys.exit(0)
 
-    # implement a simple handshaking protocol at the application layer
-    # First wait for client 1st message
-    rmsg = rdt.rdt_recv(sockfd, MSG_LEN)
-    if rmsg == b'':
-        sys.exit(0)
-    else:
-        filelength = int(rmsg)
-        print("Received client request: file size =", filelength)
-    # then wait for client 2nd message
-    rmsg = rdt.rdt_recv(sockfd, MSG_LEN)
-    if rmsg == b'':
-        sys.exit(0)
-    else:
-        filename = "./Store/" + rmsg.decode("ascii")
-        # open file
-        try:
-            fobj = open(filename, 'wb')
-        except OSError as emsg:
-            print("Open file error: ", emsg)
-        if fobj:
-            print("Open file", filename, "for writing successfully")
-            osize = rdt.rdt_send(sockfd, b'OKAY')
-            if osize < 0:
-                print("Cannot send response message")
-                sys.exit(0)
-        else:
-            print("Cannot open the target file", filename, "for writing")
-            osize = rdt.rdt_send(sockfd, b'ERROR')
-            sys.exit(0)
-
-    # start the data transfer
+    # receive the file - its size and name come first
     print("Start receiving the file . . .")
-    received = 0
-    while received < filelength:
-        print("---- Server progress: %d / %d" % (received, filelength))
-        rmsg = rdt.rdt_recv(sockfd, MSG_LEN)
-        if rmsg == b'':
-            print("Encountered receive error! Has received", received, "so far.")
-            sys.exit(0)
-        else:
-            wsize = fobj.write(rmsg)
-            received += wsize
+    filename = rdt.rdt_recvfile(sockfd, "./Store", rdt.show_progress("Server"))
+    if filename is None:
+        print("Encountered receive error!")
+        sys.exit(0)
+    print("Stored the file as", filename)
 
     # Closing
-    fobj.close()
     rdt.rdt_close(sockfd)
     print("Completed the file transfer.")
     print("Server program terminated")
@@ -0,0 +1,25 @@
+"""Shared fixtures of the RDT3.0 tests
+
+The modules live in the repository root next to the scripts, so the root is
+put on the import path here. rdt3 keeps its settings in module globals; the
+settings fixture restores them after every test.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rdt3  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    """Leave all impairments to the simulated channels, and restore rdt3's
+    module globals - the settings of the rdt_*_init() functions - after the test."""
+    saved = dict(vars(rdt3))
+    rdt3.rdt_network_init(0, 0, seed=0)
+    yield
+    vars(rdt3).update(saved)
@@ -0,0 +1,204 @@
+"""The asyncio transport of rdt3_async, on localhost"""
+
+import asyncio
+import random
+import threading
+
+import pytest
+
+import rdt3
+import rdt3_async
+
+TIMEOUT = 60.0  # Seconds a test may take before it is taken as hung
+
+
+def port_of(listener):
+    return listener.sockd.transport.get_extra_info('sockname')[1]
+
+
+class Relay(asyncio.DatagramProtocol):
+    """Pass datagrams between a client and [target] after [delay] seconds,
+    so that the path has a round trip."""
+
+    def __init__(self, target, delay):
+        self.target = target
+        self.delay = delay
+        self.client = None
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if addr == self.target:
+            dest = self.client
+        else:
+            self.client, dest = addr, self.target
+        asyncio.get_running_loop().call_later(self.delay, self.transport.sendto, data, dest)
+
+
+async def transfer(data, consume=None, delay=0.0, **options):
+    """Send [data] from one asyncio listener to another with send() and recv().
+
+    Input arguments: the data, an optional coroutine awaited after every
+    payload the receiver takes, the one-way delay of the path and the
+    options of connect()
+    Return  -> (the sender, the receiver, the data received)
+    """
+    server = await rdt3_async.open_listener(0, '127.0.0.1')
+    client = await rdt3_async.open_listener(0, '127.0.0.1', accept_new=False)
+    relay = None
+    port = port_of(server)
+    if delay:
+        relay, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: Relay(('127.0.0.1', port), delay), local_addr=('127.0.0.1', 0))
+        port = relay.get_extra_info('sockname')[1]
+    conn = await client.connect('127.0.0.1', port, **options)
+
+    async def send_side():
+        view = memoryview(data)
+        sent = 0
+        while sent < len(data):
+            osize = await conn.send(view[sent:sent + conn.payload])
+            assert osize > 0
+            sent += osize
+        await conn.close()
+
+    async def recv_side():
+        peer = await server.accept(TIMEOUT)
+        received = bytearray()
+        while True:
+            rmsg = await peer.recv(rdt3.MAX_PAYLOAD)
+            if rmsg == b'':
+                break
+            received += rmsg
+            if consume is not None:
+                await consume()
+        await peer.close()
+        return peer, bytes(received)
+
+    _, (peer, received) = await asyncio.wait_for(asyncio.gather(send_side(), recv_side()), TIMEOUT)
+    await client.close()
+    await server.close()
+    if relay is not None:
+        relay.close()
+    return conn, peer, received
+
+
+@pytest.mark.parametrize('window, mode, version', [(1, rdt3.SELECTIVE_REPEAT, rdt3.VERSION_1),
+                                                   (8, rdt3.GO_BACK_N, rdt3.VERSION_1),
+                                                   (8, rdt3.SELECTIVE_REPEAT, rdt3.VERSION_2)])
+def test_lossy_transfer(window, mode, version):
+    assert rdt3.rdt_window_init(window, mode) == 0
+    rdt3.rdt_network_init(0.05, 0.02, seed=7)
+    data = random.Random(7).randbytes(60000)
+    conn, _, received = asyncio.run(transfer(data, version=version))
+    assert received == data
+    assert conn.stats.retransmissions > 0
+
+
+def test_messages():
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    rdt3.rdt_network_init(0.05, 0.0, seed=8)
+    rng = random.Random(8)
+    messages = [b'', b'x', rng.randbytes(25000), rng.randbytes(4321)]
+
+    async def main():
+        server = await rdt3_async.open_listener(0, '127.0.0.1')
+        client = await rdt3_async.open_listener(0, '127.0.0.1', accept_new=False)
+        conn = await client.connect('127.0.0.1', port_of(server))
+
+        async def send_side():
+            for message in messages:
+                assert await conn.sendmsg(message) == len(message)
+            await conn.close()
+
+        async def recv_side():
+            peer = await server.accept(TIMEOUT)
+            received = []
+            while True:
+                message = await peer.recvmsg(30000)
+                if message is None:
+                    break
+                received.append(bytes(message))
+            await peer.close()
+            return received
+
+        _, received = await asyncio.wait_for(asyncio.gather(send_side(), recv_side()), TIMEOUT)
+        await client.close()
+        await server.close()
+        return received
+
+    assert asyncio.run(main()) == messages
+
+
+def test_sendfile_to_sync_peer(tmp_path):
+    """An asyncio sender and a synchronous rdt3 receiver speak the same protocol."""
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    rdt3.rdt_network_init(0.05, 0.02, seed=9)
+    path = tmp_path / 'file.bin'
+    path.write_bytes(random.Random(9).randbytes(150000))
+    target = tmp_path / 'target'
+    target.mkdir()
+    sockd = rdt3.rdt_socket()
+    sockd.bind(('127.0.0.1', 0))
+    port = sockd.getsockname()[1]
+    stored = []
+
+    def recv_side():
+        listener = rdt3.RdtListener(sockd)
+        conn = listener.accept(TIMEOUT)
+        stored.append(conn.recvfile(str(target)))
+        conn.close()
+        listener.close()
+
+    async def send_side():
+        client = await rdt3_async.open_listener(0, '127.0.0.1', accept_new=False)
+        conn = await client.connect('127.0.0.1', port)
+        sent = await conn.sendfile(str(path))
+        await conn.close()
+        await client.close()
+        return sent
+
+    thread = threading.Thread(target=recv_side, daemon=True)
+    thread.start()
+    assert asyncio.run(asyncio.wait_for(send_side(), TIMEOUT)) == path.stat().st_size
+    thread.join(TIMEOUT)
+    assert stored == [str(target / 'file.bin')]
+    assert (target / 'file.bin').read_bytes() == path.read_bytes()
+
+
+def test_flow_control():
+    """A receiver that reads slowly holds the sender back with its advertised
+    window instead of dropping what its buffer cannot take."""
+    budget = 8 * rdt3.PAYLOAD
+    assert rdt3.rdt_window_init(32, rdt3.SELECTIVE_REPEAT) == 0
+    assert rdt3.rdt_buffer_init(0, budget=budget) == 0
+    data = random.Random(10).randbytes(150000)
+
+    async def consume():
+        await asyncio.sleep(0.001)
+
+    conn, peer, received = asyncio.run(transfer(data, consume, version=rdt3.VERSION_2))
+    assert received == data
+    assert conn.stats.window_limited > 0
+    assert peer.stats.window_updates > 0
+    assert peer._recv_buffer.peak <= budget
+    # Only the first window goes out before the sender hears of the receive window
+    assert peer.stats.budget_drops < 32
+
+
+@pytest.mark.parametrize('pacing', [True, False])
+def test_pacing(pacing):
+    """Once the round trip is measured, a full window is spread over it
+    rather than sent in one burst."""
+    rdt3.rdt_pacing_init(pacing)
+    assert rdt3.rdt_window_init(32, rdt3.SELECTIVE_REPEAT) == 0
+    data = random.Random(11).randbytes(300000)
+    conn, _, received = asyncio.run(transfer(data, delay=0.01, version=rdt3.VERSION_2))
+    assert received == data
+    assert conn.rtt.srtt >= 0.02
+    if pacing:
+        assert conn.stats.paced_packets > 0
+    else:
+        assert conn.stats.paced_packets == 0
@@ -0,0 +1,71 @@
+"""The simulated channels of rdt3_channel"""
+
+import time
+
+import pytest
+
+from rdt3_channel import Channel, ChannelSocket, GilbertElliott, channel_pair
+
+
+def pattern(channel, count=200, size=100):
+    """Pass [count] packets through [channel] at time 0 and return the arrivals."""
+    return [channel.transmit(bytes([index % 256]) * size, 0.0) for index in range(count)]
+
+
+def test_same_seed_same_impairments():
+    options = dict(delay=0.01, jitter=0.005, reorder=0.1, duplicate=0.1, loss=0.1, corrupt=0.1)
+    assert pattern(Channel(seed=7, **options)) == pattern(Channel(seed=7, **options))
+    assert pattern(Channel(seed=7, **options)) != pattern(Channel(seed=8, **options))
+
+
+def test_loss_and_duplication():
+    assert all(arrivals == [] for arrivals in pattern(Channel(loss=1.0)))
+    assert all(len(arrivals) == 2 for arrivals in pattern(Channel(duplicate=1.0)))
+    channel = Channel(loss=0.2, seed=1)
+    pattern(channel, count=1000)
+    assert 150 < channel.counts['lost'] < 250
+    assert channel.counts['sent'] == 1000
+    assert channel.counts['delivered'] == 1000 - channel.counts['lost']
+
+
+def test_delay_and_corruption():
+    arrivals = Channel(delay=0.25).transmit(b'abc', 1.0)
+    assert arrivals == [(1.25, b'abc')]
+    channel = Channel(corrupt=1.0, seed=3)
+    assert all(arrivals[0][1] != bytes([index % 256]) * 100 for index, arrivals in enumerate(pattern(channel)))
+
+
+def test_bandwidth_and_queue_limit():
+    channel = Channel(bandwidth=1000.0, queue_limit=250)
+    arrivals = [channel.transmit(b'x' * 100, 0.0) for _ in range(5)]
+    # Each packet waits for the ones before it to leave the link
+    assert [each[0][0] for each in arrivals[:3]] == pytest.approx([0.1, 0.2, 0.3])
+    assert arrivals[3:] == [[], []]
+    assert channel.counts['queue_drops'] == 2
+
+
+def test_burst_loss():
+    channel = Channel(burst_loss=GilbertElliott(p_bad=0.05, p_good=0.2), seed=4)
+    lost = [not arrivals for arrivals in pattern(channel, count=2000)]
+    bursts = [index for index in range(1, len(lost)) if lost[index] and not lost[index - 1]]
+    # Losses come in runs, several packets long on average
+    assert sum(lost) / len(bursts) > 2
+
+
+def test_channel_pair():
+    end_a, end_b = channel_pair(Channel(delay=0.01), Channel())
+    assert end_a.sendto(b'hello', end_b.getsockname()) == 5
+    assert end_a.sendto(b'nowhere', ('127.0.0.1', 1)) == 7  # Discarded, like UDP to an unused port
+    starttime = time.monotonic()
+    assert end_b.wait_readable(1.0)
+    assert time.monotonic() - starttime >= 0.009
+    assert end_b.recvfrom(100) == (b'hello', end_a.getsockname())
+    assert not end_b.wait_readable(0.02)
+    end_b.sendto(b'x' * 10, end_a.getsockname())
+    assert end_a.recvfrom(4) == (b'xxxx', end_b.getsockname())  # Truncated to the buffer
+
+
+def test_closed_socket():
+    sock = ChannelSocket(('127.0.0.1', 1))
+    sock.close()
+    assert not sock.wait_readable(None)
@@ -0,0 +1,50 @@
+"""Internet Checksum of rdt3
+
+The fast checksum and the one-pass verification must agree with the
+original word-at-a-time loop, kept as _int_chksum_reference().
+"""
+
+import random
+
+import pytest
+
+import rdt3
+
+EDGE_CASES = [
+    b'',
+    b'\x00',
+    b'\xff',
+    b'\xab\xcd\xef',
+    b'\x00' * 8,
+    b'\xff' * 8,
+    b'\xff' * 9,
+    b'\xff' * 1500,
+    b'\xff\xff\x00\x00',
+    b'\xfe\xff\x01\x00',
+]
+
+
+@pytest.mark.parametrize('data', EDGE_CASES, ids=lambda data: '%d-bytes' % len(data))
+def test_edge_cases(data):
+    assert rdt3._int_chksum(data) == rdt3._int_chksum_reference(data)
+
+
+def test_random_inputs():
+    rand = random.Random(4)
+    for size in list(range(0, 66)) + [rdt3.PAYLOAD - 1, rdt3.PAYLOAD, 1472, 9000, 65507]:
+        for _ in range(5):
+            data = rand.randbytes(size)
+            assert rdt3._int_chksum(data) == rdt3._int_chksum_reference(data), size
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, 99, rdt3.PAYLOAD])
+def test_packets_verify(size):
+    """A packet made by the sender verifies; one with a flipped bit does not."""
+    pkt = rdt3._make_data(1, random.Random(size).randbytes(size))
+    assert rdt3._chksum_ok(pkt)
+    assert rdt3._int_chksum_reference(pkt) == 0
+    for pos in (0, len(pkt) // 2, len(pkt) - 1):
+        bad = bytearray(pkt)
+        bad[pos] ^= 0x10
+        assert not rdt3._chksum_ok(bytes(bad))
+        assert rdt3._int_chksum_reference(bytes(bad)) != 0
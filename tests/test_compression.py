@@ -0,0 +1,170 @@
+"""Compressed file chunks of rdt3: _Compressor and the negotiated codec"""
+
+import random
+
+import pytest
+
+import rdt3
+from rdt3_channel import Channel, VirtualClock, channel_pair
+
+PAYLOAD = 1000
+
+
+def text(size, seed=1):
+    """Return [size] bytes of compressible data."""
+    rng = random.Random(seed)
+    words = [b'reliable', b'data', b'transfer', b'packet', b'window', b'ack', b'timeout', b'sequence']
+    data = bytearray()
+    while len(data) < size:
+        data += rng.choice(words) + b' '
+    return bytes(data[:size])
+
+
+def chunks_of(data, codec):
+    """Cut [data] into chunks and return them with the stats of the sender."""
+    stats = rdt3.RdtStats()
+    compressor = rdt3._Compressor(codec, PAYLOAD, stats)
+    view = memoryview(data)
+    chunks = []
+    offset = 0
+    while offset < len(data):
+        chunk, size = compressor.chunk(view, offset)
+        assert 0 < size and len(chunk) <= PAYLOAD
+        chunks.append(bytes(chunk))
+        offset += size
+    assert offset == len(data)
+    return chunks, stats
+
+
+def restore(chunks, codec):
+    stats = rdt3.RdtStats()
+    parts = [rdt3._decompress_chunk(codec, chunk, stats) for chunk in chunks]
+    assert None not in parts
+    return b''.join(parts), stats
+
+
+@pytest.mark.parametrize('codec', sorted(rdt3.COMPRESSORS))
+def test_compressible_round_trip(codec):
+    data = text(200000)
+    chunks, stats = chunks_of(data, codec)
+    assert all(chunk[0] == rdt3.CHUNK_COMPRESSED for chunk in chunks)
+    assert len(chunks) < len(data) // PAYLOAD // 2
+    assert stats.raw_bytes == len(data)
+    assert stats.coded_bytes == sum(map(len, chunks))
+    restored, restored_stats = restore(chunks, codec)
+    assert restored == data
+    assert restored_stats.raw_bytes == len(data) and restored_stats.raw_chunks == 0
+
+
+@pytest.mark.parametrize('codec', sorted(rdt3.COMPRESSORS))
+def test_incompressible_round_trip(codec):
+    """Random data goes raw, and the compressor tries ever less often."""
+    data = random.Random(2).randbytes(300000)
+    chunks, stats = chunks_of(data, codec)
+    assert all(chunk[0] == rdt3.CHUNK_RAW for chunk in chunks)
+    assert len(chunks) == -(-len(data) // (PAYLOAD - 1))
+    assert stats.raw_chunks == len(chunks)
+    assert restore(chunks, codec)[0] == data
+
+
+def test_raw_chunks_back_off():
+    """After a chunk that does not shrink, 1, 2, 4, ... chunks go raw
+    without trying, up to MAX_SKIP."""
+    tried = []
+    compressor = rdt3._Compressor('zlib', PAYLOAD, rdt3.RdtStats())
+    compress = compressor.compress
+
+    def counting(data):
+        tried.append(len(data))
+        return compress(data)
+
+    compressor.compress = counting
+    view = memoryview(random.Random(3).randbytes(400 * PAYLOAD))
+    attempts = []
+    for index in range(300):
+        before = len(tried)
+        compressor.chunk(view, index * (PAYLOAD - 1))
+        if len(tried) > before:
+            attempts.append(index)
+    gaps = [later - earlier - 1 for earlier, later in zip(attempts, attempts[1:])]
+    assert gaps[:7] == [1, 2, 4, 8, 16, 32, 64]
+    assert set(gaps[7:]) == {rdt3.MAX_SKIP}
+
+
+@pytest.mark.parametrize('codec', sorted(rdt3.COMPRESSORS))
+def test_mixed_round_trip(codec):
+    """Data that turns compressible after a random stretch is compressed again."""
+    data = random.Random(4).randbytes(20000) + text(100000) + random.Random(5).randbytes(5000) + text(50000, 6)
+    chunks, _ = chunks_of(data, codec)
+    kinds = {chunk[0] for chunk in chunks}
+    assert kinds == {rdt3.CHUNK_RAW, rdt3.CHUNK_COMPRESSED}
+    assert restore(chunks, codec)[0] == data
+
+
+def test_damaged_chunks():
+    stats = rdt3.RdtStats()
+    coded = rdt3._Compressor('zlib', PAYLOAD, stats).chunk(memoryview(text(5000)), 0)[0]
+    assert rdt3._decompress_chunk('zlib', coded[:-10] + b'\xff' * 10, stats) is None
+    assert rdt3._decompress_chunk('lzma', b'\x01garbage', stats) is None
+    assert rdt3._decompress_chunk('zlib', b'\x07data', stats) is None
+    assert rdt3._decompress_chunk('zlib', b'', stats) is None
+    assert rdt3._decompress_chunk('zlib', b'\x00', stats) == b''
+
+
+def test_offer():
+    assert rdt3.rdt_compress_init('lzma, zlib') == 0
+    assert rdt3._make_offer(123, ()) == b'123'
+    assert rdt3._parse_offer(rdt3._make_offer(123, ('zlib', 'lzma'))) == (123, 'zlib')
+    assert rdt3._parse_offer(b'123 brotli,lzma') == (123, 'lzma')
+    assert rdt3._parse_offer(b'123 brotli') == (123, None)
+    assert rdt3._parse_offer(b'123') == (123, None)
+    assert rdt3._parse_offer(b'abc') is None
+    assert rdt3.rdt_compress_init('snappy') == -1
+
+
+@pytest.mark.parametrize('receiver_codecs, compressed', [('zlib', True), ('none', False)])
+def test_compressed_sendfile(tmp_path, monkeypatch, receiver_codecs, compressed):
+    """A file is compressed only when the receiver accepts the codec offered."""
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    data = text(150000, 7)
+    path = tmp_path / 'file.txt'
+    path.write_bytes(data)
+    target = tmp_path / 'target'
+    target.mkdir()
+    clock = VirtualClock()
+    end_a, end_b = channel_pair(Channel(delay=0.01, loss=0.05, seed=20), Channel(delay=0.01, loss=0.05, seed=21),
+                                clock=clock)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = rdt3.RdtListener(end_a, accept_new=False).connect(*peer_addr, window_size=8)
+        sent = conn.sendfile(str(path))
+        conn.close()
+        conn.listener.close()
+        return sent, conn.stats.to_dict()
+
+    def recv_side():
+        conn = rdt3.RdtListener(end_b).accept(60.0)
+        stored = conn.recvfile(str(target))
+        conn.close()
+        conn.listener.close()
+        return stored
+
+    # Both peers share rdt3's settings: let the receiver's codecs take effect once the offer is made
+    assert rdt3.rdt_compress_init('zlib') == 0
+    accept = rdt3._parse_offer
+
+    def parse_offer(rmsg):
+        rdt3.rdt_compress_init(receiver_codecs)
+        return accept(rmsg)
+
+    monkeypatch.setattr(rdt3, '_parse_offer', parse_offer)
+    (sent, stats), stored = clock.run(send_side, recv_side)
+    assert sent == len(data)
+    assert (target / 'file.txt').read_bytes() == data
+    if compressed:
+        assert stats['compression_ratio'] > 2
+        assert stats['data_sent'] < len(data) // PAYLOAD
+    else:
+        assert stats['compression_ratio'] is None
+        assert stats['data_sent'] > len(data) // PAYLOAD
@@ -0,0 +1,140 @@
+"""Congestion windows of rdt3: RenoControl and CubicControl
+
+The controls read the time from rdt3._clock, which the tests replace with
+a clock they move by hand.
+"""
+
+import pytest
+
+import rdt3
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    manual = ManualClock()
+    monkeypatch.setattr(rdt3, '_clock', manual)
+    return manual
+
+
+def test_reno_slow_start(clock):
+    cc = rdt3.RenoControl(64)
+    assert cc.window() == rdt3.INITIAL_CWND
+    assert cc.phase == rdt3.SLOW_START
+    cc.on_ack(cc.window(), 0.1)  # One round trip doubles the window
+    assert cc.window() == 2 * rdt3.INITIAL_CWND
+    cc.on_ack(100, 0.1)
+    assert cc.window() == 64  # Never beyond the configured window
+    assert cc.phase == rdt3.CONGESTION_AVOIDANCE
+
+
+def test_reno_congestion_avoidance(clock):
+    """After a loss the window halves, then grows by one packet per window
+    of acknowledged packets."""
+    cc = rdt3.RenoControl(64)
+    cc.on_ack(28, 0.1)
+    assert cc.cwnd == 32
+    cc.on_timeout()
+    assert (cc.cwnd, cc.ssthresh, cc.phase) == (1.0, 16.0, rdt3.SLOW_START)
+    cc.on_ack(15, 0.1)
+    assert (cc.cwnd, cc.phase) == (16.0, rdt3.CONGESTION_AVOIDANCE)
+    for _ in range(16):
+        cc.on_ack(1, 0.1)
+    assert cc.cwnd == pytest.approx(17.0, abs=0.05)
+    assert cc.losses == 1
+
+
+def test_reno_fast_recovery(clock):
+    cc = rdt3.RenoControl(64)
+    cc.on_ack(16, 0.1)
+    assert cc.cwnd == 20
+    cc.on_fast_retransmit(20)
+    assert (cc.cwnd, cc.ssthresh, cc.phase) == (10.0, 10.0, rdt3.FAST_RECOVERY)
+    cc.on_fast_retransmit(20)  # One decrease per window of data
+    assert cc.cwnd == 10.0 and cc.losses == 1
+    cc.on_ack(19, 0.1)  # Recovery lasts until the window in flight is acknowledged
+    assert (cc.cwnd, cc.phase) == (10.0, rdt3.FAST_RECOVERY)
+    cc.on_ack(1, 0.1)
+    assert (cc.cwnd, cc.phase) == (10.0, rdt3.CONGESTION_AVOIDANCE)
+    assert [transition[1] for transition in cc.transitions] == [rdt3.FAST_RECOVERY, rdt3.CONGESTION_AVOIDANCE]
+
+
+def test_reno_floor(clock):
+    cc = rdt3.RenoControl(64)
+    for _ in range(5):
+        cc.on_timeout()
+    assert cc.ssthresh == 2.0
+    assert cc.window() == 1
+
+
+def cubic_after_loss(clock, w_max):
+    """Return a CubicControl that has just lost a packet at a window of [w_max]."""
+    cc = rdt3.CubicControl(1000)
+    cc.on_ack(w_max - rdt3.INITIAL_CWND, 0.1)
+    cc.on_timeout()  # Leaves slow start for good at the next ACK
+    cc.on_ack(cc.ssthresh - cc.cwnd, 0.1)
+    assert cc.phase == rdt3.CONGESTION_AVOIDANCE
+    return cc
+
+
+def grow(clock, cc, seconds, rtt=0.1):
+    """Acknowledge a window of packets every round trip for [seconds]."""
+    end = clock.now + seconds
+    while clock.now < end:
+        clock.now += rtt
+        for _ in range(cc.window()):
+            cc.on_ack(1, rtt)
+    return cc.cwnd
+
+
+def test_cubic_decrease(clock):
+    cc = cubic_after_loss(clock, 100)
+    assert cc.cwnd == pytest.approx(100 * cc.BETA)
+    assert cc._w_max == 100
+
+
+def test_cubic_concave_then_convex(clock):
+    """The window climbs back fast, flattens out around W_max, then probes
+    ever faster beyond it."""
+    cc = cubic_after_loss(clock, 100)
+    cc.on_ack(1, 0.1)  # Starts the growth curve
+    k = cc._k
+    assert k == pytest.approx(((100 - 70) / cc.C) ** (1 / 3), rel=0.05)
+
+    first = grow(clock, cc, k / 2) - 70
+    second = grow(clock, cc, k / 2) - 70 - first
+    assert first > second > 0  # Concave: the growth slows down towards W_max
+    assert cc.cwnd == pytest.approx(100, abs=3)
+    third = grow(clock, cc, k / 2) - cc._w_max
+    fourth = grow(clock, cc, k / 2) - cc._w_max - third
+    assert fourth > third > 0  # Convex: it speeds up again beyond W_max
+
+
+def test_cubic_is_tcp_friendly(clock):
+    """On a path short enough for Reno to grow faster, CUBIC keeps up with it."""
+    cc = cubic_after_loss(clock, 20)
+    reno = rdt3.RenoControl(1000)
+    reno.cwnd, reno.ssthresh, reno.phase = cc.cwnd, cc.ssthresh, rdt3.CONGESTION_AVOIDANCE
+    start = cc.cwnd
+    for _ in range(20):
+        clock.now += 0.001
+        for _ in range(int(reno.cwnd)):
+            reno.on_ack(1, 0.001)
+            cc.on_ack(1, 0.001)
+    # Its Reno estimate grows 3 (1 - BETA) / (1 + BETA) as fast as Reno does
+    assert cc.cwnd - start >= 0.5 * (reno.cwnd - start) > 0
+
+
+def test_cubic_fast_convergence(clock):
+    """A loss below the previous W_max lowers W_max further."""
+    cc = cubic_after_loss(clock, 100)
+    cc.on_timeout()
+    cc.on_ack(cc.ssthresh - cc.cwnd, 0.1)
+    assert cc._w_max == pytest.approx(70 * (1 + cc.BETA) / 2)
@@ -0,0 +1,118 @@
+"""Parallel transfers of rdt3_parallel
+
+The control connection runs over simulated channels, so that its packets
+can be lost at will; the streams use real UDP sockets on localhost.
+"""
+
+import os
+import random
+import threading
+
+import rdt3
+import rdt3_parallel
+from rdt3_channel import Channel, channel_pair
+
+TIMEOUT = 60.0  # Seconds a transfer may take before it is taken as hung
+
+
+class DropFirst(Channel):
+    """Channel that loses the first packet carrying [marker]."""
+
+    def __init__(self, marker, **kwargs):
+        super().__init__(**kwargs)
+        self.marker = marker
+        self.dropped = 0
+
+    def transmit(self, byte_msg, now):
+        if not self.dropped and self.marker in bytes(byte_msg):
+            self.dropped += 1
+            return []
+        return super().transmit(byte_msg, now)
+
+
+def run_parallel(tmp_path, backward, streams=3, size=300000):
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    data = random.Random(9).randbytes(size)
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    target = tmp_path / 'target'
+    target.mkdir()
+    end_a, end_b = channel_pair(Channel(delay=0.005, seed=1), backward)
+    results = {}
+
+    def send_side():
+        conn = rdt3.RdtListener(end_a, accept_new=False).connect(*end_b.getsockname())
+        results['sent'] = rdt3_parallel.send_parallel(conn, str(path), streams)
+        conn.close()
+
+    def recv_side():
+        conn = rdt3.RdtListener(end_b).accept(TIMEOUT)
+        results['stored'] = rdt3_parallel.recv_parallel(conn, str(target))
+        conn.close()
+
+    threads = [threading.Thread(target=send_side, daemon=True), threading.Thread(target=recv_side, daemon=True)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads), "the transfer hung"
+    assert results['sent'] is not None and results['stored'] is not None
+    assert (target / 'file.bin').read_bytes() == data
+    return results
+
+
+def test_parallel_transfer(tmp_path):
+    results = run_parallel(tmp_path, Channel(delay=0.005, seed=2))
+    assert len(results['stored']['streams']) == 3
+
+
+def test_lost_ports_are_retransmitted(tmp_path):
+    """The receiver keeps driving the control connection while its streams
+    wait, so the ports message is sent again when it is lost."""
+    backward = DropFirst(b'"ports"', delay=0.005, seed=2)
+    run_parallel(tmp_path, backward)
+    assert backward.dropped == 1
+
+
+def test_failed_stream_stops_the_others(tmp_path, monkeypatch):
+    """A stream the receiver gives up on makes both peers abort the transfer,
+    instead of the sender retransmitting to a closed port forever."""
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    # The stream that fails stops ACK-ing once this much is held for it
+    assert rdt3.rdt_buffer_init(0, budget=20000) == 0
+    data = random.Random(9).randbytes(300000)
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    target = tmp_path / 'target'
+    target.mkdir()
+    writes = []
+    pwrite = os.pwrite
+
+    def failing_pwrite(fileno, rmsg, offset):
+        writes.append(offset)
+        if len(writes) == 1:
+            raise OSError(28, "No space left on device")
+        return pwrite(fileno, rmsg, offset)
+
+    monkeypatch.setattr(os, 'pwrite', failing_pwrite)
+    end_a, end_b = channel_pair(Channel(delay=0.005, seed=1), Channel(delay=0.005, seed=2))
+    results = {}
+
+    def send_side():
+        conn = rdt3.RdtListener(end_a, accept_new=False).connect(*end_b.getsockname())
+        results['sent'] = rdt3_parallel.send_parallel(conn, str(path), 3)
+        conn.close()
+
+    def recv_side():
+        conn = rdt3.RdtListener(end_b).accept(TIMEOUT)
+        results['stored'] = rdt3_parallel.recv_parallel(conn, str(target))
+        conn.close()
+
+    threads = [threading.Thread(target=send_side, daemon=True), threading.Thread(target=recv_side, daemon=True)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads), "the transfer hung"
+    assert results == {'sent': None, 'stored': None}
+    assert not any(thread.name.startswith('rdt-') for thread in threading.enumerate())
@@ -0,0 +1,115 @@
+"""Retransmission timeout of rdt3: the RttEstimator and Karn's rule"""
+
+import pytest
+
+import rdt3
+from rdt3_channel import Channel, VirtualClock, channel_pair
+
+
+def test_first_sample():
+    rtt = rdt3.RttEstimator(initial_rto=1.0, min_rto=0.01, max_rto=10.0)
+    assert rtt.rto == 1.0 and rtt.srtt is None
+    rtt.sample(0.2)
+    assert rtt.srtt == pytest.approx(0.2)
+    assert rtt.rttvar == pytest.approx(0.1)
+    assert rtt.rto == pytest.approx(0.2 + 4 * 0.1)
+
+
+def test_smoothing():
+    rtt = rdt3.RttEstimator(min_rto=0.0, max_rto=10.0)
+    rtt.sample(0.2)
+    rtt.sample(0.4)
+    # RFC 6298: RTTVAR is updated with the old SRTT, then SRTT
+    rttvar = 0.75 * 0.1 + 0.25 * abs(0.2 - 0.4)
+    srtt = 0.875 * 0.2 + 0.125 * 0.4
+    assert rtt.rttvar == pytest.approx(rttvar)
+    assert rtt.srtt == pytest.approx(srtt)
+    assert rtt.rto == pytest.approx(srtt + 4 * rttvar)
+    assert rtt.samples == 2
+
+
+def test_steady_samples_converge():
+    rtt = rdt3.RttEstimator(min_rto=0.0, max_rto=10.0)
+    for _ in range(200):
+        rtt.sample(0.05)
+    assert rtt.srtt == pytest.approx(0.05)
+    assert rtt.rto == pytest.approx(0.05, abs=1e-6)
+
+
+def test_clamped():
+    rtt = rdt3.RttEstimator(min_rto=0.1, max_rto=2.0)
+    rtt.sample(0.001)
+    assert rtt.rto == 0.1
+    rtt.sample(50.0)
+    assert rtt.rto == 2.0
+
+
+def test_backoff():
+    """Every timeout doubles the RTO, at most MAX_BACKOFF times and up to
+    max_rto; a sample or progress ends the backoff."""
+    rtt = rdt3.RttEstimator(initial_rto=0.1, min_rto=0.01, max_rto=100.0)
+    for backoff in range(1, rdt3.MAX_BACKOFF + 3):
+        rtt.on_timeout()
+        assert rtt.rto == pytest.approx(0.1 * 2 ** min(backoff, rdt3.MAX_BACKOFF))
+    assert rtt.timeouts == rdt3.MAX_BACKOFF + 2
+    rtt.on_progress()
+    assert rtt.rto == pytest.approx(0.1)
+
+    rtt.on_timeout()
+    rtt.sample(0.02)
+    assert rtt.backoff == 0
+    assert rtt.rto == pytest.approx(0.02 + 4 * 0.01)
+
+    capped = rdt3.RttEstimator(initial_rto=1.0, min_rto=0.01, max_rto=3.0)
+    for _ in range(rdt3.MAX_BACKOFF):
+        capped.on_timeout()
+    assert capped.rto == 3.0
+    assert capped.backoff == 2  # No further doubling once max_rto is reached
+
+
+class DropFirstData(Channel):
+    """Channel that loses the first DATA packet it carries."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.dropped = 0
+
+    def transmit(self, byte_msg, now):
+        if not self.dropped and byte_msg[0] == rdt3.TYPE_DATA:
+            self.dropped += 1
+            return []
+        return super().transmit(byte_msg, now)
+
+
+def test_karn():
+    """The ACK of a retransmitted packet gives no RTT sample, so the time
+    spent waiting for the timeout does not inflate the estimate."""
+    assert rdt3.rdt_window_init(1, rdt3.SELECTIVE_REPEAT) == 0
+    payloads = [b'%d' % i * 100 for i in range(5)]
+    clock = VirtualClock()
+    forward = DropFirstData(delay=0.01)
+    end_a, end_b = channel_pair(forward, Channel(delay=0.01), clock=clock)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = rdt3.RdtListener(end_a, accept_new=False).connect(*peer_addr)
+        for payload in payloads:
+            assert conn.send(payload) == len(payload)
+        info = conn.rtt.info()
+        conn.close()
+        conn.listener.close()
+        return info
+
+    def recv_side():
+        conn = rdt3.RdtListener(end_b).accept(60.0)
+        received = [conn.recv(conn.payload) for _ in payloads]
+        conn.close()
+        conn.listener.close()
+        return received
+
+    info, received = clock.run(send_side, recv_side)
+    assert received == payloads
+    assert forward.dropped == 1
+    assert info['timeouts'] == 1
+    assert info['samples'] == len(payloads) - 1
+    assert info['srtt'] == pytest.approx(0.02)
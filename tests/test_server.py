@@ -0,0 +1,139 @@
+"""The multi-client upload server of rdt3_server, on localhost"""
+
+import asyncio
+import random
+import threading
+import time
+
+import rdt3
+import rdt3_async
+import rdt3_server
+
+TIMEOUT = 60.0  # Seconds a test may take before it is taken as hung
+
+
+def test_byte_limit():
+    """acquire() holds callers back while their bytes do not fit, and
+    release() lets them through in turn."""
+    async def main():
+        limit = rdt3_server.ByteLimit(1000)
+        await limit.acquire(600)
+        order = []
+
+        async def take(name, nbytes):
+            await limit.acquire(nbytes)
+            order.append(name)
+
+        first = asyncio.ensure_future(take('first', 500))
+        second = asyncio.ensure_future(take('second', 300))
+        await asyncio.sleep(0.01)
+        assert order == ['second'] and limit.used == 900 and limit.waits == 1
+        limit.release(600)
+        await asyncio.sleep(0.01)
+        assert order == ['second', 'first'] and limit.used == 800
+        limit.release(500)
+        limit.release(300)
+        assert limit.used == 0 and limit.peak == 900
+        # Bytes beyond the limit are granted when nothing else is in flight
+        await asyncio.wait_for(limit.acquire(5000), 1.0)
+        await asyncio.gather(first, second)
+
+    asyncio.run(main())
+
+
+def test_concurrent_uploads(tmp_path):
+    """More clients than workers upload at once; every file is stored intact."""
+    assert rdt3.rdt_window_init(16, rdt3.SELECTIVE_REPEAT) == 0
+    rdt3.rdt_network_init(0.02, 0.01, seed=3)
+    source = tmp_path / 'source'
+    source.mkdir()
+    store = tmp_path / 'store'
+    store.mkdir()
+    files = []
+    for index in range(6):
+        path = source / ('file%d.bin' % index)
+        path.write_bytes(random.Random(index).randbytes(100000 + 7919 * index))
+        files.append(path)
+
+    async def upload(path, port):
+        listener = await rdt3_async.open_listener(0, '127.0.0.1', accept_new=False)
+        conn = await listener.connect('127.0.0.1', port)
+        sent = await conn.sendfile(str(path))
+        await conn.close()
+        await listener.close()
+        return listener.sockd.transport.get_extra_info('sockname')[1], sent
+
+    async def main():
+        server = rdt3_server.UploadServer(str(store), workers=2, io_threads=2, client_limit=20000,
+                                          server_limit=30000, report_interval=0)
+        serving = asyncio.ensure_future(server.serve(0, '127.0.0.1', duration=1.0))
+        while server.listener is None:
+            await asyncio.sleep(0.01)
+        port = server.listener.sockd.transport.get_extra_info('sockname')[1]
+        uploads = await asyncio.wait_for(asyncio.gather(*(upload(path, port) for path in files)), TIMEOUT)
+        return uploads, await asyncio.wait_for(serving, TIMEOUT), server
+
+    uploads, report, server = asyncio.run(main())
+    assert report['files'] == len(files) and report['failed'] == 0
+    assert report['bytes'] == sum(path.stat().st_size for path in files)
+    assert report['in_flight'] == 0 and report['peak_in_flight'] <= 30000 + rdt3.PAYLOAD
+    assert server.clients == {} and server.sessions == {}
+    for (client_port, sent), path in zip(uploads, files):
+        assert sent == path.stat().st_size
+        stored = store / ('127.0.0.1_%d' % client_port) / path.name
+        assert stored.read_bytes() == path.read_bytes()
+
+
+def test_dropped_session_refuses_its_client(tmp_path, monkeypatch):
+    """A client whose session timed out cannot open a new one with the
+    DATA it keeps sending."""
+    monkeypatch.setattr(rdt3_server, 'WATCH_INTERVAL', 0.05)
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    path = tmp_path / 'file.bin'
+    path.write_bytes(random.Random(1).randbytes(200000))
+    store = tmp_path / 'store'
+    store.mkdir()
+    state = {}
+
+    def client(port):
+        def stall(sent, size):
+            if not state.get('stalled'):
+                state['stalled'] = True
+                time.sleep(1.0)  # Long enough for the server to drop the session
+        sockd = rdt3.rdt_socket()
+        sockd.bind(('127.0.0.1', 0))
+        state['addr'] = sockd.getsockname()
+        listener = state['listener'] = rdt3.RdtListener(sockd, accept_new=False)
+        conn = listener.connect('127.0.0.1', port, window_size=8)
+        state['sent'] = conn.sendfile(str(path), stall)
+        listener.close()
+
+    async def main():
+        server = rdt3_server.UploadServer(str(store), idle_timeout=0.3, report_interval=0)
+        serving = asyncio.ensure_future(server.serve(0, '127.0.0.1'))
+        while server.listener is None:
+            await asyncio.sleep(0.01)
+        port = server.listener.sockd.transport.get_extra_info('sockname')[1]
+        thread = threading.Thread(target=client, args=(port,), daemon=True)
+        thread.start()
+        while not (state.get('stalled') and server.failed):
+            await asyncio.sleep(0.05)
+        # The client wakes up and keeps sending its window
+        await asyncio.sleep(1.5)
+        refused = dict(server.listener._refused)
+        sessions = len(server.sessions)
+        state['listener'].abort()
+        while thread.is_alive():
+            await asyncio.sleep(0.05)
+        serving.cancel()
+        try:
+            await serving
+        except asyncio.CancelledError:
+            pass
+        return server, refused, sessions
+
+    server, refused, sessions = asyncio.run(asyncio.wait_for(main(), TIMEOUT))
+    assert state['sent'] == -1
+    assert server.failed == 1 and server.files == 0
+    assert sessions == 0
+    assert list(refused) == [state['addr']]
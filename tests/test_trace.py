@@ -0,0 +1,130 @@
+"""Packet traces of rdt3 and their analysis by analyze-trace.py"""
+
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+import rdt3
+from rdt3_channel import Channel, VirtualClock, channel_pair
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZE = 50000
+
+
+def load_analyzer():
+    spec = importlib.util.spec_from_file_location('analyze_trace', os.path.join(ROOT, 'analyze-trace.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return load_analyzer()
+
+
+def traced_transfer(path, window, version):
+    """Run a transfer with loss and corruption in udt_send, tracing every packet
+    to [path]; return the sender's stats, its port and the receiver's port."""
+    assert rdt3.rdt_window_init(window, rdt3.SELECTIVE_REPEAT) == 0
+    rdt3.rdt_network_init(0.05, 0.02, seed=5)
+    assert rdt3.rdt_trace_init(str(path)) == 0
+    data = random.Random(5).randbytes(SIZE)
+    clock = VirtualClock()
+    end_a, end_b = channel_pair(Channel(delay=0.01, seed=30), Channel(delay=0.01, seed=31), clock=clock)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = rdt3.RdtListener(end_a, accept_new=False).connect(*peer_addr, window_size=window, version=version)
+        sent = 0
+        while sent < len(data):
+            sent += conn.send(data[sent:sent + conn.payload])
+        conn.close()
+        conn.listener.close()
+        return conn.stats.to_dict()
+
+    def recv_side():
+        conn = rdt3.RdtListener(end_b).accept(60.0)
+        received = bytearray()
+        while True:
+            rmsg = conn.recv(conn.payload)
+            if rmsg == b'':
+                break
+            received += rmsg
+        conn.close()
+        conn.listener.close()
+        return bytes(received)
+
+    stats, received = clock.run(send_side, recv_side)
+    assert rdt3.rdt_trace_init(None) == 0
+    assert received == data
+    return stats, end_a.getsockname()[1], peer_addr[1]
+
+
+@pytest.mark.parametrize('window, version', [(1, rdt3.VERSION_1), (8, rdt3.VERSION_1), (8, rdt3.VERSION_2)])
+def test_trace_matches_stats(tmp_path, analyzer, window, version):
+    path = tmp_path / 'run.trace'
+    stats, sender_port, receiver_port = traced_transfer(path, window, version)
+    records = analyzer.read_trace(str(path))
+    assert path.read_bytes().startswith(rdt3.TRACE_MAGIC)
+    assert len(path.read_bytes()) == len(rdt3.TRACE_MAGIC) + len(records) * rdt3._TRACE_RECORD.size
+
+    # Both peers ran in this process: the sender's packets are those to the receiver's port
+    trace = analyzer.PeerTrace(str(path), receiver_port)
+    trace.records = [rec for rec in records if rec[8] == receiver_port]
+    report, tseq = trace.analyze(10)
+    counts = report['counts']
+    outgoing = [rec for rec in trace.records if rec[1] == rdt3.TRACE_OUT and rec[4] == rdt3.TYPE_DATA]
+    assert len(outgoing) == stats['data_sent'] + stats['retransmissions']
+    assert counts['lost'] + counts['corrupted'] > 0
+    assert report['data_packets'] == -(-SIZE // rdt3.PAYLOAD)
+    assert report['retransmissions'] == stats['retransmissions']
+    assert report['seq_modulo'] == {(1, rdt3.VERSION_1): 2, (8, rdt3.VERSION_1): rdt3.SEQ_SPACE,
+                                    (8, rdt3.VERSION_2): rdt3.SEQ_SPACE_V2}[(window, version)]
+    # Karn's rule: samples only from packets sent once, each at least the path's round trip
+    assert 0 < report['rtt']['samples'] <= report['data_packets']
+    assert report['rtt']['min'] >= 0.02 - 1e-9
+    assert len(report['retransmission_timeline']) == min(10, report['retransmissions'])
+    assert {kind for _, _, kind in tseq} == {'data', 'retransmission', 'ack'}
+
+    # The channel loses nothing: the receiver read every packet udt_send let go, damaged or not
+    incoming = [rec for rec in records if rec[8] == sender_port and rec[1] == rdt3.TRACE_IN]
+    assert len(incoming) == counts['sent'] + counts['corrupted']
+    assert sum(1 for rec in incoming if not rec[5]) == counts['corrupted']
+
+
+def test_truncated_trace(tmp_path, analyzer):
+    """A record cut short by a crash is skipped."""
+    path = tmp_path / 'run.trace'
+    traced_transfer(path, 8, rdt3.VERSION_1)
+    whole = analyzer.read_trace(str(path))
+    with open(path, 'ab') as fobj:
+        fobj.write(b'\x00' * (rdt3._TRACE_RECORD.size - 1))
+    assert analyzer.read_trace(str(path)) == whole
+
+
+def test_analyzer_script(tmp_path):
+    path = tmp_path / 'run.trace'
+    _, _, receiver_port = traced_transfer(path, 8, rdt3.VERSION_2)
+    report_path = tmp_path / 'report.json'
+    tseq_path = tmp_path / 'tseq.csv'
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'analyze-trace.py'), str(path),
+                             '--json', str(report_path), '--tseq', str(tseq_path), '--gap', '0.04'],
+                            capture_output=True, text=True, cwd=str(tmp_path), timeout=60)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "peer port %d" % receiver_port in result.stdout
+    report = json.loads(report_path.read_text())
+    assert sorted(peer['peer_port'] for peer in report['peers']) == sorted(
+        {peer['peer_port'] for peer in report['peers']})
+    assert any(peer['retransmissions'] for peer in report['peers'])
+    assert tseq_path.read_text().startswith('time,peer_port,seq,kind')
+
+    (tmp_path / 'other').write_bytes(b'not a trace')
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'analyze-trace.py'), str(tmp_path / 'other')],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1
@@ -0,0 +1,440 @@
+"""Seeded lossy transfers between two peers on the VirtualClock
+
+Every test runs both peers in this process over the simulated channels of
+rdt3_channel, so the losses are the same on every run and the timeouts take
+no real time.
+"""
+
+import os
+import random
+import threading
+import time
+
+import pytest
+
+import rdt3
+from rdt3_channel import Channel, UDP_IP_HEADERS, VirtualClock, channel_pair
+
+SIZE = 60000  # Bytes per transfer
+TIMEOUT = 60.0  # Seconds a peer waits for a connection
+
+
+def lossy_pair(seed, clock, loss=0.1, corrupt=0.02):
+    """Return two endpoints on [clock] joined by lossy channels seeded from [seed]."""
+    forward = Channel(delay=0.01, loss=loss, corrupt=corrupt, seed=2 * seed)
+    backward = Channel(delay=0.01, loss=loss, corrupt=corrupt, seed=2 * seed + 1)
+    return channel_pair(forward, backward, clock=clock)
+
+
+def connect(end, peer_addr, **options):
+    listener = rdt3.RdtListener(end, accept_new=False)
+    conn = listener.connect(*peer_addr, **options)
+    assert conn is not None
+    return conn
+
+
+def accept(end):
+    listener = rdt3.RdtListener(end)
+    conn = listener.accept(TIMEOUT)
+    assert conn is not None
+    return conn
+
+
+def send_all(conn, data):
+    view = memoryview(data)
+    sent = 0
+    while sent < len(data):
+        osize = conn.send(view[sent:sent + conn.payload])
+        assert osize > 0
+        sent += osize
+    conn.close()
+    conn.listener.close()
+    return conn.stats.to_dict()
+
+
+def recv_all(conn, size):
+    received = bytearray()
+    while len(received) < size:
+        rmsg = conn.recv(conn.payload)
+        assert rmsg != b''
+        received += rmsg
+    conn.close()
+    conn.listener.close()
+    return bytes(received)
+
+
+@pytest.mark.parametrize('window, mode, version', [
+    (1, rdt3.SELECTIVE_REPEAT, rdt3.VERSION_1),
+    (8, rdt3.GO_BACK_N, rdt3.VERSION_1),
+    (16, rdt3.SELECTIVE_REPEAT, rdt3.VERSION_1),
+    (1, rdt3.SELECTIVE_REPEAT, rdt3.VERSION_2),
+    (8, rdt3.GO_BACK_N, rdt3.VERSION_2),
+    (16, rdt3.SELECTIVE_REPEAT, rdt3.VERSION_2),
+])
+@pytest.mark.parametrize('seed', [1, 2])
+def test_lossy_transfer(window, mode, version, seed):
+    assert rdt3.rdt_window_init(window, mode) == 0
+    data = random.Random(seed).randbytes(SIZE)
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(seed, clock)
+    peer_addr = end_b.getsockname()
+
+    stats, received = clock.run(
+        lambda: send_all(connect(end_a, peer_addr, window_size=window, mode=mode, version=version), data),
+        lambda: recv_all(accept(end_b), len(data)))
+    assert received == data
+    assert stats['retransmissions'] > 0
+
+
+def test_virtual_clock_repeats():
+    """The same seeds give the same transfer, packet for packet, in less
+    real time than the simulated time it takes."""
+    assert rdt3.rdt_window_init(16, rdt3.SELECTIVE_REPEAT) == 0
+    data = random.Random(9).randbytes(SIZE)
+    runs = []
+    for _ in range(2):
+        rdt3.rdt_network_init(0, 0, seed=0)
+        clock = VirtualClock()
+        end_a, end_b = lossy_pair(9, clock)
+        starttime = time.monotonic()
+        stats, received = clock.run(lambda: send_all(connect(end_a, end_b.getsockname(), window_size=16), data),
+                                    lambda: recv_all(accept(end_b), len(data)))
+        assert received == data
+        assert time.monotonic() - starttime < clock.now
+        runs.append((clock.now, clock.steps, stats['data_sent'], stats['retransmissions']))
+    assert runs[0] == runs[1]
+
+
+def test_large_payload():
+    """Version 2 connections carry payloads of any size up to MAX_PAYLOAD."""
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    data = random.Random(4).randbytes(10 * SIZE)
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(4, clock)
+    peer_addr = end_b.getsockname()
+
+    stats, received = clock.run(
+        lambda: send_all(connect(end_a, peer_addr, window_size=8, version=rdt3.VERSION_2, payload=8000), data),
+        lambda: recv_all(accept(end_b), len(data)))
+    assert received == data
+    assert stats['data_sent'] < 2 * len(data) // 8000
+
+
+def test_probe_payload():
+    """A path probe finds the largest payload that fits the path MTU."""
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    rdt3.rdt_packet_init(rdt3.VERSION_2)
+    data = random.Random(5).randbytes(SIZE)
+    clock = VirtualClock()
+    end_a, end_b = channel_pair(Channel(delay=0.01, mtu=1500, seed=10), Channel(delay=0.01, mtu=1500, seed=11),
+                                clock=clock)
+    peer_addr = end_b.getsockname()
+    fits = 1500 - UDP_IP_HEADERS - rdt3.HEADER_SIZE_V2
+
+    def send_side():
+        conn = connect(end_a, peer_addr, window_size=8)
+        payload = conn.probe_payload(8000)
+        send_all(conn, data)
+        return payload
+
+    payload, received = clock.run(send_side, lambda: recv_all(accept(end_b), len(data)))
+    assert fits - rdt3.PROBE_RESOLUTION <= payload <= fits
+    assert received == data
+
+
+def test_sendfile(tmp_path):
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    data = random.Random(3).randbytes(5 * SIZE + 123)
+    path = tmp_path / 'file.bin'
+    path.write_bytes(data)
+    target = tmp_path / 'target'
+    target.mkdir()
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(3, clock)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = connect(end_a, peer_addr, window_size=8)
+        sent = conn.sendfile(str(path))
+        conn.close()
+        conn.listener.close()
+        return sent
+
+    def recv_side():
+        conn = accept(end_b)
+        stored = conn.recvfile(str(target))
+        conn.close()
+        conn.listener.close()
+        return stored
+
+    sent, stored = clock.run(send_side, recv_side)
+    assert sent == len(data)
+    assert stored == str(target / 'file.bin')
+    assert (target / 'file.bin').read_bytes() == data
+
+
+@pytest.mark.parametrize('window', [1, 16])
+def test_fin_close(window):
+    """The receiver sees the end of the data when the sender closes, and
+    both peers close as soon as the FINs are answered - well before the
+    TimeWait linger a lost FIN-ACK would cost."""
+    assert rdt3.rdt_window_init(window, rdt3.SELECTIVE_REPEAT) == 0
+    data = random.Random(6).randbytes(5000)
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(6, clock)
+    peer_addr = end_b.getsockname()
+    conns = []
+
+    def send_side():
+        conn = connect(end_a, peer_addr, window_size=window)
+        conns.append(conn)
+        return send_all(conn, data)
+
+    def recv_side():
+        conn = accept(end_b)
+        conns.append(conn)
+        received = bytearray()
+        while True:
+            rmsg = conn.recv(conn.payload)
+            if rmsg == b'':
+                break
+            received += rmsg
+        conn.close()
+        conn.listener.close()
+        return bytes(received)
+
+    _, received = clock.run(send_side, recv_side)
+    assert received == data
+    assert all(conn.closed for conn in conns)
+    assert clock.now < 4 * rdt3.MAX_RTO
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_resume(tmp_path):
+    """A transfer interrupted after a checkpoint resumes from it, and the
+    stored file matches the original."""
+    assert rdt3.rdt_window_init(16, rdt3.SELECTIVE_REPEAT) == 0
+    rdt3.CHECKPOINT_BYTES = rdt3.RESUME_BLOCK
+    size = 2 * rdt3.RESUME_BLOCK + 12345
+    source = tmp_path / 'source'
+    source.mkdir()
+    target = tmp_path / 'target'
+    target.mkdir()
+    path = source / 'file.bin'
+    data = random.Random(7).randbytes(size)
+    path.write_bytes(data)
+
+    def send_side(end, peer_addr, aborted, stopped):
+        def progress(sent, filelength):
+            if aborted.is_set():
+                raise Interrupted()
+        conn = connect(end, peer_addr, window_size=16, version=rdt3.VERSION_2)
+        try:
+            assert conn.sendfile(str(path), progress) == size
+        finally:
+            stopped.set()
+        conn.close()
+        conn.listener.close()
+        return conn.stats.to_dict()
+
+    def recv_side(end, stop_at, aborted, stopped):
+        def progress(received, filelength):
+            if received >= stop_at:
+                aborted.set()
+                raise Interrupted()
+        conn = accept(end)
+        try:
+            stored = conn.recvfile(str(target), progress)
+        except Interrupted:
+            # Keep acknowledging until the sender has given up as well
+            while not stopped.is_set():
+                conn.listener._poll(0.01)
+            raise
+        conn.close()
+        conn.listener.close()
+        return stored
+
+    # Both sides give up after the first checkpoint
+    aborted, stopped = threading.Event(), threading.Event()
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(7, clock, loss=0.02, corrupt=0.0)
+    with pytest.raises(Interrupted):
+        clock.run(lambda: send_side(end_a, end_b.getsockname(), aborted, stopped),
+                  lambda: recv_side(end_b, rdt3.RESUME_BLOCK + size // 4, aborted, stopped))
+    assert os.path.exists(str(target / 'file.bin') + rdt3.CHECKPOINT_SUFFIX)
+
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(8, clock, loss=0.02, corrupt=0.0)
+    stats, stored = clock.run(lambda: send_side(end_a, end_b.getsockname(), threading.Event(), threading.Event()),
+                              lambda: recv_side(end_b, size + 1, threading.Event(), threading.Event()))
+    assert stored == str(target / 'file.bin')
+    assert (target / 'file.bin').read_bytes() == data
+    assert not os.path.exists(stored + rdt3.CHECKPOINT_SUFFIX)
+    assert stats['bytes_sent'] < size
+
+
+@pytest.mark.parametrize('version', [rdt3.VERSION_1, rdt3.VERSION_2])
+def test_messages(version):
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    rng = random.Random(10)
+    messages = [b'', b'x', rng.randbytes(999), rng.randbytes(1000), rng.randbytes(25000), rng.randbytes(4321)]
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(10, clock)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = connect(end_a, peer_addr, window_size=8, version=version)
+        for message in messages:
+            assert conn.sendmsg(message) == len(message)
+        conn.close()
+        conn.listener.close()
+
+    def recv_side():
+        conn = accept(end_b)
+        received = []
+        while True:
+            message = conn.recvmsg(30000)
+            if message is None:
+                break
+            received.append(bytes(message))
+        conn.close()
+        conn.listener.close()
+        return received
+
+    _, received = clock.run(send_side, recv_side)
+    assert received == messages
+
+
+def test_message_fragments_skip_the_receive_buffer(monkeypatch):
+    """Once recvmsg() waits for a message, its in-order fragments are copied
+    straight into it rather than queued in the receive buffer."""
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    message = random.Random(14).randbytes(200000)
+    queued = []
+    push = rdt3.ReorderBuffer.push
+
+    def counting(self, payload):
+        queued.append(len(payload))
+        push(self, payload)
+
+    monkeypatch.setattr(rdt3.ReorderBuffer, 'push', counting)
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(14, clock, loss=0.05, corrupt=0.0)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = connect(end_a, peer_addr, window_size=8)
+        assert conn.sendmsg(message) == len(message)
+        conn.close()
+        conn.listener.close()
+
+    def recv_side():
+        conn = accept(end_b)
+        received = conn.recvmsg(len(message))
+        conn.close()
+        conn.listener.close()
+        return received
+
+    _, received = clock.run(send_side, recv_side)
+    assert received == message
+    assert len(queued) < 10 and sum(queued) < len(message) // 20
+
+
+def test_oversized_message_is_dropped():
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(11, clock)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = connect(end_a, peer_addr, window_size=8)
+        conn.sendmsg(b'y' * 5000)
+        conn.sendmsg(b'small')
+        conn.close()
+        conn.listener.close()
+
+    def recv_side():
+        conn = accept(end_b)
+        first, second = conn.recvmsg(4000), conn.recvmsg(4000)
+        conn.close()
+        conn.listener.close()
+        return first, second
+
+    _, (first, second) = clock.run(send_side, recv_side)
+    assert first is None
+    assert second == b'small'
+
+
+def test_listener_window():
+    """A listener opens connections with its own window, whatever
+    rdt_window_init() set."""
+    assert rdt3.rdt_window_init(1) == 0
+    data = random.Random(12).randbytes(SIZE)
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(12, clock)
+    peer_addr = end_b.getsockname()
+
+    def recv_side():
+        conn = rdt3.RdtListener(end_b, window_size=8, mode=rdt3.GO_BACK_N).accept(None)
+        return conn.window_size, conn.mode, recv_all(conn, len(data))
+
+    _, (window, mode, received) = clock.run(
+        lambda: send_all(connect(end_a, peer_addr, window_size=8, mode=rdt3.GO_BACK_N), data), recv_side)
+    assert (window, mode) == (8, rdt3.GO_BACK_N)
+    assert received == data
+
+
+def test_listener_rejects_bad_window():
+    with pytest.raises(ValueError):
+        rdt3.RdtListener(None, window_size=0)
+
+
+def test_recv_length_is_a_limit():
+    """recv() hands out each payload as it was sent, in pieces of at most
+    the length asked for."""
+    assert rdt3.rdt_window_init(8, rdt3.SELECTIVE_REPEAT) == 0
+    payloads = [b'a' * 1000, b'b' * 10, b'c' * 500]
+    clock = VirtualClock()
+    end_a, end_b = lossy_pair(13, clock)
+    peer_addr = end_b.getsockname()
+
+    def send_side():
+        conn = connect(end_a, peer_addr, window_size=8)
+        for payload in payloads:
+            assert conn.send(payload) == len(payload)
+        conn.close()
+        conn.listener.close()
+
+    def recv_side():
+        conn = accept(end_b)
+        received = []
+        while True:
+            rmsg = conn.recv(300)
+            if rmsg == b'':
+                break
+            received.append(rmsg)
+        conn.close()
+        conn.listener.close()
+        return received
+
+    _, received = clock.run(send_side, recv_side)
+    assert received == [b'a' * 300] * 3 + [b'a' * 100, b'b' * 10, b'c' * 300, b'c' * 200]
+
+
+def test_default_connection_releases_selectors():
+    """The rdt_*() functions close the selector of every listener they drop."""
+    sockd = rdt3.rdt_socket()
+    assert rdt3.rdt_bind(sockd, 0) == 0
+    assert rdt3.rdt_peer('localhost', sockd.getsockname()[1]) == 0
+    first = rdt3._default_connection(sockd).listener
+    assert first._selector is not None
+    assert rdt3.rdt_peer('localhost', sockd.getsockname()[1]) == 0
+    assert first._selector is None
+    second = rdt3._default_connection(sockd).listener
+    assert second is not first
+    rdt3.rdt_close(sockd)
+    assert second._selector is None
+    assert sockd.fileno() == -1